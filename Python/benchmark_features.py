@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Benchmark feature extraction kernels on synthetic epochs.
+
+Usage:
+    python benchmark_features.py [--epochs 1000] [--channels 2] [--only <benchmark>]
+
+Example:
+    python benchmark_features.py --epochs 1000 --channels 5 --only complexity
+    python benchmark_features.py --hours 10 --only events
+"""
+
+import argparse
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from src import feature_extraction as fe
+from src import sleep_events as se
+
+
+def _best_time(func, repeats):
+    """Return (best wall time in seconds, last result) over several runs."""
+    best, result = float('inf'), None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def _report(name, seconds, n_signals):
+    print(f"  {name:<28} {seconds * 1000:>10.1f} ms   {seconds * 1000 / n_signals:>10.3f} ms per epoch*channel")
+
+
+def bench_complexity(x, args):
+    """Compare the NumPy and Numba complexity kernels."""
+    rows = x.reshape(-1, x.shape[-1])
+    t_numpy, ref = _best_time(lambda: fe.compute_complexity_features(rows, 'numpy'), args.repeats)
+    _report('complexity (numpy)', t_numpy, len(rows))
+
+    if not fe.HAS_NUMBA:
+        print("  complexity (numba)           skipped - numba not installed")
+        return
+    fe.compute_complexity_features(rows[:2], 'numba')  # JIT compilation
+    t_numba, out = _best_time(lambda: fe.compute_complexity_features(rows, 'numba'), args.repeats)
+    _report('complexity (numba)', t_numba, len(rows))
+    max_diff = np.max(np.abs(out - ref) / np.maximum(np.abs(ref), 1e-12))
+    print(f"  speedup: {t_numpy / t_numba:.1f}x, max relative difference: {max_diff:.2e}")
+
+
+def _sample_entropy_naive(row, m, r):
+    """O(n^2) reference: compare every pair of templates."""
+    templates = np.lib.stride_tricks.sliding_window_view(row, m + 1)
+    dist = np.max(np.abs(templates[:, np.newaxis, :] - templates[np.newaxis, :, :]), axis=2)
+    n_pairs_m = np.sum(np.max(np.abs(templates[:, np.newaxis, :m] - templates[np.newaxis, :, :m]), axis=2) <= r)
+    n_pairs_m1 = np.sum(dist <= r)
+    return -np.log((n_pairs_m1 - len(templates)) / (n_pairs_m - len(templates)))
+
+
+def bench_entropy(x, args):
+    """Time permutation entropy and the sample entropy backends against an O(n^2) reference."""
+    rows = x.reshape(-1, x.shape[-1])
+    t_pe, _ = _best_time(lambda: fe.permutation_entropy(rows, order=3), args.repeats)
+    _report('permutation entropy (m=3)', t_pe, len(rows))
+
+    subset = rows[:min(len(rows), 20)]
+    t_naive, _ = _best_time(lambda: [_sample_entropy_naive(row, 2, 0.2 * np.std(row)) for row in subset[:2]], 1)
+    _report('sample entropy (naive)', t_naive, 2)
+    t_tree, ref = _best_time(lambda: fe.compute_sample_entropy(subset, backend='numpy'), 1)
+    _report('sample entropy (kd-tree)', t_tree, len(subset))
+
+    if not fe.HAS_NUMBA:
+        print("  sample entropy (numba)       skipped - numba not installed")
+        return
+    fe.compute_sample_entropy(subset[:1], backend='numba')  # JIT compilation
+    t_numba, _ = _best_time(lambda: fe.compute_sample_entropy(rows, backend='numba'), args.repeats)
+    _report('sample entropy (numba)', t_numba, len(rows))
+    out = fe.compute_sample_entropy(subset, backend='numba')
+    print(f"  max difference numba vs kd-tree: {np.max(np.abs(out - ref)):.2e}")
+
+
+def bench_wavelet(x, args):
+    """Compare the batched wavelet family with the time-domain family."""
+    config = SimpleNamespace(WAVELET='db4', WAVELET_LEVEL=5)
+    t_time, _ = _best_time(lambda: fe.time_domain_feature_family(x, 125, config), args.repeats)
+    _report('time-domain family', t_time, x.shape[0] * x.shape[1])
+    t_wav, _ = _best_time(lambda: fe.wavelet_feature_family(x, 125, config), args.repeats)
+    _report('wavelet family (db4, 5 lvl)', t_wav, x.shape[0] * x.shape[1])
+    print(f"  wavelet / time-domain: {t_wav / t_time:.2f}x")
+
+
+def bench_spectral(x, args):
+    """Compare multitaper (cached tapers, batched rfft) with per-epoch tapers and Welch."""
+    from scipy.signal.windows import dpss
+
+    rows = x.reshape(-1, x.shape[-1])
+    fs = 125
+    fe.multitaper_psd(rows[:1], fs)  # Fill the taper cache
+    t_mt, _ = _best_time(lambda: fe.multitaper_psd(rows, fs), args.repeats)
+    _report('multitaper (cached, batched)', t_mt, len(rows))
+
+    def per_epoch(subset):
+        for row in subset:
+            tapers = dpss(len(row), 4.0, 7, sym=False)
+            np.mean(np.abs(np.fft.rfft(tapers * (row - row.mean()), axis=-1))**2, axis=0)
+    subset = rows[:min(len(rows), 50)]
+    t_loop, _ = _best_time(lambda: per_epoch(subset), 1)
+    _report('multitaper (per-epoch tapers)', t_loop, len(subset))
+
+    config = SimpleNamespace(SPECTRAL_METHOD='welch')
+    t_welch, _ = _best_time(lambda: fe.compute_psd(rows, fs, config), args.repeats)
+    _report('welch (4 s segments)', t_welch, len(rows))
+
+
+def bench_events(x, args):
+    """Whole-night spindle and K-complex detection vs detecting epoch by epoch."""
+    fs = 125
+    rng = np.random.default_rng(0)
+    night = rng.standard_normal((args.channels, int(args.hours * 3600 * fs)))
+    n_epochs = night.shape[1] // (30 * fs)
+    print(f"  continuous EEG: {args.hours:g} h x {args.channels} channels ({n_epochs} epochs)")
+
+    for name, detect in (('spindles', se.detect_spindles), ('k-complexes', se.detect_kcomplexes)):
+        t_night, _ = _best_time(lambda: detect(night, fs), 1)
+        print(f"  {name + ' (whole night)':<28} {t_night:>10.2f} s    {args.hours * 3600 / t_night:>10.0f}x real time")
+
+        epochs = night[:, :n_epochs * 30 * fs].reshape(args.channels, n_epochs, 30 * fs)
+        subset = min(n_epochs, 100)
+        t_loop, _ = _best_time(lambda: [detect(epochs[:, i], fs) for i in range(subset)], 1)
+        t_loop *= n_epochs / subset
+        print(f"  {name + ' (epoch loop, est.)':<28} {t_loop:>10.2f} s    speedup {t_loop / t_night:.1f}x")
+
+
+BENCHMARKS = {
+    'complexity': bench_complexity,
+    'entropy': bench_entropy,
+    'wavelet': bench_wavelet,
+    'spectral': bench_spectral,
+    'events': bench_events,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark feature extraction kernels')
+    parser.add_argument('--epochs', type=int, default=1000, help='Number of epochs (default: 1000)')
+    parser.add_argument('--channels', type=int, default=2, help='Number of channels (default: 2)')
+    parser.add_argument('--samples', type=int, default=3750, help='Samples per epoch (default: 3750 = 30 s at 125 Hz)')
+    parser.add_argument('--hours', type=float, default=10.0, help='Recording length for the events benchmark (default: 10)')
+    parser.add_argument('--repeats', type=int, default=3, help='Timing repeats, best is reported (default: 3)')
+    parser.add_argument('--only', choices=sorted(BENCHMARKS), help='Run a single benchmark')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    x = rng.standard_normal((args.epochs, args.channels, args.samples))
+    print(f"Synthetic data: {args.epochs} epochs x {args.channels} channels x {args.samples} samples")
+
+    for name, bench in BENCHMARKS.items():
+        if args.only and name != args.only:
+            continue
+        print(f"\n[{name}]")
+        bench(x, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -26,19 +26,160 @@ if not os.path.exists(CACHE_DIR):
 LOW_PASS_FILTER_FREQ = 40  # Hz
 
 # -- Feature Extraction --
-# (Add feature-specific parameters here)
+# Feature families per modality, e.g. {'eeg': ['time', 'complexity']}.
+# None uses the iteration defaults in src/feature_extraction.py.
+FEATURE_FAMILIES = None
+# Kernel backend for complexity features: 'auto' (Numba if installed), 'numba' or 'numpy'
+FEATURE_BACKEND = 'auto'
+# Permutation entropy embedding (pattern length and delay in samples)
+ENTROPY_ORDER = 3
+ENTROPY_DELAY = 1
+# Sample/approximate entropy ('sample_entropy' family): template length and
+# tolerance as a fraction of the epoch standard deviation
+SAMPEN_M = 2
+SAMPEN_R = 0.2
+# Discrete wavelet features ('wavelet' family): wavelet name and number of levels
+# (5 levels of a 125 Hz EEG epoch: d1 31-62 Hz ... d5 2-4 Hz, a5 0-2 Hz)
+WAVELET = 'db4'
+WAVELET_LEVEL = 5
+# Spectral features ('spectral' family): PSD method ('multitaper' or 'welch'),
+# multitaper time-halfbandwidth product and taper count (None = 2*NW - 1), and
+# frequency bands in Hz (None = delta/theta/alpha/sigma/beta defaults)
+SPECTRAL_METHOD = 'multitaper'
+MULTITAPER_NW = 4.0
+MULTITAPER_TAPERS = None
+SPECTRAL_BANDS = None
+# Sleep event detectors on the continuous EEG: spindle band (Hz) and threshold
+# (multiple of the median RMS envelope); K-complex band (Hz) and trough depth
+# (robust standard deviations)
+SPINDLE_BAND = (11.0, 16.0)
+SPINDLE_THRESHOLD = 2.5
+KCOMPLEX_BAND = (0.5, 4.0)
+KCOMPLEX_THRESHOLD = 4.0
+# Conjugate eye movement detector on EOG left/right: band-pass (Hz) and
+# velocity threshold (robust standard deviations) for rapid and slow movements
+REM_BAND = (0.3, 5.0)
+REM_THRESHOLD = 3.0
+SEM_BAND = (0.1, 1.0)
+SEM_THRESHOLD = 2.0
+# EMG tone: rolling RMS window (s), atonia level (multiple of the recording's
+# 10th percentile envelope) and twitch burst/baseline RMS ratio
+EMG_TONE_WINDOW = 1.0
+EMG_ATONIA_FACTOR = 1.5
+EMG_TWITCH_THRESHOLD = 4.0
+# Context features from neighbouring epochs: window half-width k (0 = off),
+# which context features to add ('lag', 'mean', 'std', 'delta') and which base
+# columns to use (None = all)
+CONTEXT_WINDOW = 0
+CONTEXT_FEATURES = ('lag', 'mean', 'std', 'delta')
+CONTEXT_COLUMNS = None
+# Worker processes for multi-channel feature extraction (1 = in-process, -1 = all cores)
+FEATURE_N_JOBS = 1
+# Directory of the incremental feature store (None = off). Stored features are
+# reused per recording and feature family until the signals, the family's
+# implementation version or its settings change.
+FEATURE_STORE_DIR = None
+# Feature normalization fitted in train_classifier and reapplied at inference:
+# None (off), 'zscore' (mean/std) or 'robust' (median/IQR); scope 'dataset'
+# (training-set statistics) or 'recording' (each recording's own statistics)
+FEATURE_NORMALIZATION = None
+FEATURE_NORMALIZATION_SCOPE = 'dataset'
+
+# -- Feature Selection --
+# Iteration 3 keeps the SELECTION_K best columns by SELECTION_SCORE: 'f_score'
+# (ANOVA F), 'mutual_info', 'correlation' (correlation ratio) or 'rank' (mean
+# rank of all three). Scores are cached in CACHE_DIR when SELECTION_CACHE is on.
+SELECTION_K = 30
+SELECTION_SCORE = 'mutual_info'
+SELECTION_MI_BINS = 16
+SELECTION_CACHE = True
+# Before selecting (iterations 3-4), drop columns whose absolute correlation
+# with a better column is at least SELECTION_REDUNDANCY_THRESHOLD (None to
+# disable). The correlation matrix is accumulated in SELECTION_CHUNK_ROWS-row
+# chunks, so memory-mapped feature matrices are never loaded whole (None:
+# as many rows as fit in 64 MB, e.g. about 6600 rows for 1270 columns).
+SELECTION_REDUNDANCY_THRESHOLD = None
+SELECTION_CHUNK_ROWS = None
+# Iteration 4 uses model-based selection: 'rfe' or 'permutation', scored by
+# Cohen's kappa over SELECTION_CV_FOLDS folds (by recording when known) fitted
+# in parallel on SELECTION_N_JOBS cores with SELECTION_RF_TREES-tree forests.
+# RFE drops SELECTION_RFE_FRACTION of the remaining features per round; both
+# stop after SELECTION_PATIENCE rounds without improvement.
+SELECTION_METHOD = 'rfe'
+SELECTION_CV_FOLDS = 3
+SELECTION_N_JOBS = -1
+SELECTION_RF_TREES = 100
+SELECTION_RFE_FRACTION = 0.2
+SELECTION_PATIENCE = 2
+SELECTION_MIN_FEATURES = 5
+SELECTION_PERMUTATION_REPEATS = 3
 
 # -- Classification --
+# train_classifier evaluates with CV_FOLDS-fold cross-validation (grouped by
+# recording when record ids are known), fitting folds in parallel on CV_N_JOBS
+# cores, then refits the final model on all data.
+CV_FOLDS = 5
+CV_N_JOBS = -1
+# With HYPERPARAMETER_SEARCH, train_classifier first tunes the classifier by
+# successive halving (SEARCH_SPACES in classification.py): each round keeps
+# the best 1/SEARCH_FACTOR candidates and multiplies the budget (trees for
+# Random Forest, training epochs for k-NN/SVM) by SEARCH_FACTOR. Finished
+# rounds are saved in CACHE_DIR, so a rerun resumes.
+HYPERPARAMETER_SEARCH = False
+SEARCH_FACTOR = 3
+SEARCH_N_JOBS = -1
+SEARCH_MIN_TREES = 10
+SEARCH_MIN_EPOCHS = 1000
+# Out-of-core training (train_incremental): an SGD classifier with
+# INCREMENTAL_LOSS and L2 penalty INCREMENTAL_ALPHA, trained on chunks of
+# INCREMENTAL_CHUNK_ROWS rows for INCREMENTAL_EPOCHS passes. With
+# INCREMENTAL_TRAINING, main.py trains it instead of CLASSIFIER_TYPE, reading
+# the selected features back in chunks from a memory-mapped file in CACHE_DIR.
+INCREMENTAL_TRAINING = False
+INCREMENTAL_LOSS = 'log_loss'
+INCREMENTAL_ALPHA = 1e-4
+INCREMENTAL_EPOCHS = 5
+INCREMENTAL_CHUNK_ROWS = 65536
+# Also export Random Forests as a compact, memory-mappable file that
+# run_inference.py loads instead of the pickled model (compact_forest.py).
+COMPACT_FOREST = True
+# Cascade inference (inference.build_cascade): a CASCADE_CHEAP_TREES-tree,
+# depth-CASCADE_CHEAP_DEPTH forest predicts every epoch and epochs where its
+# confidence is below CASCADE_THRESHOLD go to the full model
+# (tune_cascade_threshold picks the threshold by kappa on validation data).
+# With CASCADE_INFERENCE, main.py also trains the cheap model on all but one
+# grouped fold and tunes the threshold on that fold (kappa at most
+# CASCADE_MAX_KAPPA_LOSS below the full model); run_inference.py predicts
+# through the cascade with the tuned threshold (CASCADE_THRESHOLD if none).
+CASCADE_INFERENCE = False
+CASCADE_THRESHOLD = 0.9
+CASCADE_MAX_KAPPA_LOSS = 0.01
+CASCADE_CHEAP_TREES = 10
+CASCADE_CHEAP_DEPTH = 8
 # Iteration-specific parameters - students should modify these based on current iteration
 if CURRENT_ITERATION == 1:
     # Iteration 1: Basic pipeline with k-NN
     CLASSIFIER_TYPE = 'knn'
     KNN_N_NEIGHBORS = 5
+    KNN_WEIGHTS = 'uniform'
+    # Standardized k-NN with an explicit index saved with the model: 'auto'
+    # (KD-tree, ball tree or brute force by number of features), 'kd_tree',
+    # 'ball_tree' or 'brute'. None uses a plain KNeighborsClassifier. Queries
+    # run in KNN_BATCH_SIZE-row batches on KNN_N_JOBS threads.
+    KNN_INDEX = None
+    KNN_BATCH_SIZE = 4096
+    KNN_N_JOBS = -1
 elif CURRENT_ITERATION == 2:
     # Iteration 2: Enhanced EEG processing with SVM
     CLASSIFIER_TYPE = 'svm'
     SVM_C = 1.0
     SVM_KERNEL = 'rbf'
+    SVM_GAMMA = 'scale'
+    # For large training sets, approximate the RBF kernel: 'nystroem' or 'rff'
+    # (random Fourier features) with SVM_N_COMPONENTS features and a linear
+    # SVM on standardized inputs. None uses the exact SVC.
+    SVM_APPROXIMATION = None
+    SVM_N_COMPONENTS = 500
 elif CURRENT_ITERATION == 3:
     # Iteration 3: Multi-signal processing with Random Forest
     CLASSIFIER_TYPE = 'random_forest'
@@ -2,11 +2,15 @@ import config
 from src.data_loader import load_training_data
 from src.preprocessing import preprocess
 from src.feature_extraction import extract_features
+from src.feature_matrix import FeatureMatrix
 from src.feature_selection import select_features
-from src.classification import train_classifier
+from src.classification import feature_chunks, train_classifier, train_incremental
+from src.compact_forest import export_forest
+from src.inference import train_cascade
 from src.visualization import visualize_results
 from src.report import generate_report
 from src.utils import save_cache, load_cache
+from sklearn.ensemble import RandomForestClassifier
 import os
 import sys
 import io
@@ -92,8 +96,35 @@ def main():
     # 5. Classification
     print("\n=== STEP 5: CLASSIFICATION ===")
     if selected_features.shape[1] > 0:
-        model = train_classifier(selected_features, labels, config)
-        print(f"Trained {config.CLASSIFIER_TYPE} classifier")
+        if getattr(config, 'INCREMENTAL_TRAINING', False):
+            # Out-of-core mode: a FeatureMatrix is written once and every pass
+            # reads the memory-mapped file chunk by chunk
+            chunk_source = selected_features
+            if isinstance(selected_features, FeatureMatrix):
+                os.makedirs(config.CACHE_DIR, exist_ok=True)
+                chunk_source = os.path.join(config.CACHE_DIR, f"selected_features_iter{config.CURRENT_ITERATION}.fmat")
+                selected_features.save(chunk_source)
+            chunk_rows = getattr(config, 'INCREMENTAL_CHUNK_ROWS', 65536)
+            model = train_incremental(lambda: feature_chunks(chunk_source, labels, chunk_rows), config)
+            print("Trained incremental SGD classifier")
+        else:
+            model = train_classifier(selected_features, labels, config)
+            print(f"Trained {config.CLASSIFIER_TYPE} classifier")
+
+        # Saved for run_inference.py; forests also as a compact, memory-mappable file
+        save_cache(model, f"model_iter{config.CURRENT_ITERATION}.joblib", config.CACHE_DIR)
+        forest_path = os.path.join(config.CACHE_DIR, f"model_iter{config.CURRENT_ITERATION}.forest")
+        if getattr(config, 'COMPACT_FOREST', True) and isinstance(model, RandomForestClassifier):
+            export_forest(model, forest_path)
+        elif os.path.exists(forest_path):
+            os.remove(forest_path)
+        if getattr(config, 'CASCADE_INFERENCE', False):
+            # Cheap stage and threshold tuned on a held-out split; run_inference.py
+            # pairs them with the full model
+            cascade, cascade_report = train_cascade(model, selected_features, labels, config)
+            save_cache(cascade.cheap, f"cascade_cheap_iter{config.CURRENT_ITERATION}.joblib", config.CACHE_DIR)
+            save_cache({'threshold': cascade.threshold, 'report': cascade_report},
+                       f"cascade_threshold_iter{config.CURRENT_ITERATION}.joblib", config.CACHE_DIR)
     else:
         print("⚠️  WARNING: Cannot train classifier - no features available!")
         print("Students must implement feature extraction first.")
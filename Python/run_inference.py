@@ -2,7 +2,9 @@ import config
 from src.data_loader import load_holdout_data
 from src.preprocessing import preprocess
 from src.feature_extraction import extract_features
-from src.inference import make_inference, generate_submission_file
+from src.feature_selection import apply_saved_feature_mask
+from src.inference import CascadeClassifier, make_inference, generate_submission_file
+from src.compact_forest import load_compact_forest
 from src.utils import save_cache, load_cache
 import os
 import joblib
@@ -10,17 +12,33 @@ import joblib
 def run_inference():
     print(f"--- Sleep Scoring Inference - Iteration {config.CURRENT_ITERATION} ---")
 
-    # Load the trained model (assuming it was saved during training)
-    model_filename = f"model_iter{config.CURRENT_ITERATION}.joblib"
-    model = load_cache(model_filename, config.CACHE_DIR)
+    # Load the trained model (assuming it was saved during training); a
+    # compact forest export is memory-mapped instead of unpickling the forest
+    forest_path = os.path.join(config.CACHE_DIR, f"model_iter{config.CURRENT_ITERATION}.forest")
+    if os.path.exists(forest_path):
+        print(f"Loading compact forest: {forest_path}")
+        model = load_compact_forest(forest_path)
+    else:
+        model_filename = f"model_iter{config.CURRENT_ITERATION}.joblib"
+        model = load_cache(model_filename, config.CACHE_DIR)
     if model is None:
         print("Error: Trained model not found. Please run main.py first to train a model.")
         return
+    if getattr(config, 'CASCADE_INFERENCE', False):
+        cheap = load_cache(f"cascade_cheap_iter{config.CURRENT_ITERATION}.joblib", config.CACHE_DIR)
+        if cheap is None:
+            print("Cascade model not found - predicting with the full model only")
+        else:
+            tuned = load_cache(f"cascade_threshold_iter{config.CURRENT_ITERATION}.joblib", config.CACHE_DIR)
+            threshold = tuned['threshold'] if tuned is not None else config.CASCADE_THRESHOLD
+            print(f"Cascade inference with threshold {threshold:.2f}")
+            model = CascadeClassifier(cheap, model, threshold)
 
     # 1. Load Hold-out Data
     # For jumpstart, we're using dummy data. In a real scenario, you'd iterate through files.
     holdout_edf_file = os.path.join(config.HOLDOUT_DIR, "dummy_holdout.edf") # Placeholder
-    holdout_eeg_data = load_holdout_data(holdout_edf_file)
+    holdout_eeg_data, record_info = load_holdout_data(holdout_edf_file)
+    record_ids = [record_info['record_id']] * record_info['n_epochs']
 
     # 2. Preprocessing (using the same logic as training)
     preprocessed_holdout_data = None
@@ -40,10 +58,13 @@ def run_inference():
         holdout_features = load_cache(cache_filename_features_holdout, config.CACHE_DIR)
 
     if holdout_features is None:
-        holdout_features = extract_features(preprocessed_holdout_data, config)
+        holdout_features = extract_features(preprocessed_holdout_data, config, record_ids=record_ids)
         if config.USE_CACHE:
             save_cache(holdout_features, cache_filename_features_holdout, config.CACHE_DIR)
 
+    # Same columns as selected in training
+    holdout_features = apply_saved_feature_mask(holdout_features, config)
+
     # 4. Make Inference
     predictions = make_inference(model, holdout_features, config)
 
@@ -1,56 +1,78 @@
+import hashlib
+import json
+import math
+import os
+import time
+
 import numpy as np
-from sklearn.neighbors import KNeighborsClassifier
-from sklearn.svm import SVC
+from joblib import Parallel, delayed
+from sklearn.base import BaseEstimator, ClassifierMixin, clone
+from sklearn.kernel_approximation import Nystroem, RBFSampler
+from sklearn.neighbors import KNeighborsClassifier, NearestNeighbors
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import SVC, LinearSVC
+from sklearn.linear_model import SGDClassifier
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
-from sklearn.metrics import precision_score, recall_score, f1_score
+from sklearn.model_selection import GroupKFold, StratifiedKFold, KFold, ParameterGrid
 import pandas as pd
 
+# Handle both package import and standalone execution
+try:
+    from .feature_matrix import FeatureMatrix
+    from .feature_store import content_hash
+    from .metrics import classification_metrics, encode_labels
+    from .normalization import Normalizer, make_normalizer
+    from .utils import save_cache, load_cache
+except ImportError:
+    from feature_matrix import FeatureMatrix
+    from feature_store import content_hash
+    from metrics import classification_metrics, encode_labels
+    from normalization import Normalizer, make_normalizer
+    from utils import save_cache, load_cache
+
 def train_classifier(features, labels, config):
     """
     STUDENT IMPLEMENTATION AREA: Train classifier based on iteration.
 
-    This function provides a basic framework but students should enhance it:
+    The model is evaluated with k-fold cross-validation grouped by recording
+    (config.CV_FOLDS, folds fitted in parallel), then refitted on all data.
+    With config.HYPERPARAMETER_SEARCH its hyperparameters are first tuned by
+    hyperparameter_search. Students can still enhance it:
 
-    1. Implement proper cross-validation (not just train/test split)
-    2. Address class imbalance in sleep stage data
-    3. Tune hyperparameters for each classifier
-    4. Add more sophisticated evaluation metrics
-    5. Consider ensemble methods in later iterations
+    1. Address class imbalance in sleep stage data
+    2. Add more sophisticated evaluation metrics
+    3. Consider ensemble methods in later iterations
 
     Args:
-        features (np.ndarray): The input features.
+        features (FeatureMatrix or np.ndarray): The input features.
         labels (np.ndarray): The corresponding labels.
         config (module): The configuration module.
 
     Returns:
-        object: The trained classifier.
+        object: The trained classifier. When trained on a FeatureMatrix, its
+            column names are stored in model.feature_columns_ so inference can
+            select the same columns in the same order. With
+            config.FEATURE_NORMALIZATION the fitted Normalizer is stored in
+            model.normalizer_ and reapplied by inference.prepare_features.
+            Per-fold metrics are stored in model.cv_results_.
     """
     print(f"Training {config.CLASSIFIER_TYPE} classifier...")
     print(f"Features shape: {features.shape}, Labels shape: {labels.shape}")
 
+    feature_columns = None
+    record_ids = None
+    matrix = features
+    if isinstance(features, FeatureMatrix):
+        feature_columns = list(features.columns)
+        record_ids = features.record_ids
+        features = features.values
+    labels = np.asarray(labels)
+
     # Basic validation
     if features.shape[0] == 0 or features.shape[1] == 0:
         raise ValueError("No features available for training!")
 
-    # BASIC train/test split - students should implement cross-validation
-    # TODO: Students should implement k-fold cross-validation for more robust evaluation
-    # Use stratified split for realistic sleep data distribution
-    # Sleep stages are naturally imbalanced (more N2, less N1/REM)
-    try:
-        X_train, X_test, y_train, y_test = train_test_split(
-            features, labels, test_size=0.2, random_state=42, stratify=labels
-        )
-        print("Using stratified train/test split to maintain class balance")
-    except ValueError as e:
-        # Fallback for edge cases (very small datasets)
-        X_train, X_test, y_train, y_test = train_test_split(
-            features, labels, test_size=0.2, random_state=42
-        )
-        print(f"Using non-stratified split: {e}")
-    print(f"Training set: {X_train.shape[0]} samples, Test set: {X_test.shape[0]} samples")
-
     # TODO: Students should address class imbalance in sleep data:
     # - Sleep stages are not equally distributed
     # - Consider SMOTE, class weights, or other techniques
@@ -58,23 +80,229 @@ def train_classifier(features, labels, config):
     # smote = SMOTE(random_state=42)
     # X_train, y_train = smote.fit_resample(X_train, y_train)
 
-    # Select classifier based on iteration (using config parameters)
-    if config.CURRENT_ITERATION == 1:
+    params = None
+    if getattr(config, 'HYPERPARAMETER_SEARCH', False):
+        params = hyperparameter_search(matrix, labels, config)['best_params']
+    model = make_classifier(config, params=params)
+    normalizer = make_normalizer(config)
+
+    # Grouped k-fold cross-validation: every recording is scored by a model
+    # that never saw any of its epochs
+    cv_results, cv_predictions = cross_validate_classifier(model, features, labels, record_ids,
+                                                           config, normalizer)
+    print_performance_metrics(labels, cv_predictions, record_ids)
+
+    # Final model: refit on all data
+    print("Refitting on all data...")
+    if normalizer is not None:
+        features = normalizer.fit_transform(matrix)
+        if isinstance(features, FeatureMatrix):
+            features = features.values
+        print(f"Normalized features ({normalizer.method}, {normalizer.scope} statistics)")
+    model.fit(features, labels)
+
+    model.cv_results_ = cv_results
+    if feature_columns is not None:
+        model.feature_columns_ = feature_columns
+    if normalizer is not None:
+        model.normalizer_ = normalizer
+
+    return model
+
+
+CLASSIFIER_KINDS = ('knn', 'svm', 'random_forest')
+
+SVM_APPROXIMATIONS = ('nystroem', 'rff')
+
+KNN_INDEXES = ('auto', 'kd_tree', 'ball_tree', 'brute')
+
+
+def choose_knn_index(n_features):
+    """
+    Search structure for standardized features of a given dimensionality.
+
+    KD-trees prune well in low dimensions, ball trees degrade more slowly as
+    the dimension grows, and beyond that a brute-force scan is faster than
+    either tree.
+    """
+    if n_features <= 16:
+        return 'kd_tree'
+    if n_features <= 64:
+        return 'ball_tree'
+    return 'brute'
+
+
+class IndexedKNN(ClassifierMixin, BaseEstimator):
+    """
+    k-NN on standardized features with an explicit, persisted search index.
+
+    fit standardizes the features and builds the index ('auto' picks a
+    KD-tree, ball tree or brute force from the number of features, see
+    choose_knn_index). The index is part of the fitted model, so a model
+    saved with save_cache is ready to query without rebuilding it. Queries
+    run in batches of batch_size rows on n_jobs threads (tree queries release
+    the GIL, and threads share the index instead of copying it).
+
+    Attributes:
+        scaler_ (StandardScaler): Fitted standardization.
+        index_ (NearestNeighbors): Fitted search index.
+        index_algorithm_ (str): Structure used by the index.
+        classes_ (np.ndarray): Class labels.
+    """
+
+    def __init__(self, n_neighbors=5, weights='uniform', algorithm='auto', leaf_size=40,
+                 batch_size=4096, n_jobs=-1):
+        self.n_neighbors = n_neighbors
+        self.weights = weights
+        self.algorithm = algorithm
+        self.leaf_size = leaf_size
+        self.batch_size = batch_size
+        self.n_jobs = n_jobs
+
+    def fit(self, X, y):
+        if self.algorithm not in KNN_INDEXES:
+            raise ValueError(f"Unknown k-NN index: {self.algorithm}. Valid: {KNN_INDEXES}")
+        if self.weights not in ('uniform', 'distance'):
+            raise ValueError(f"Unknown k-NN weights: {self.weights}. Valid: ('uniform', 'distance')")
+        self.scaler_ = StandardScaler().fit(X)
+        self.classes_, self._codes = np.unique(y, return_inverse=True)
+        self.index_algorithm_ = choose_knn_index(X.shape[1]) if self.algorithm == 'auto' else self.algorithm
+        self.index_ = NearestNeighbors(algorithm=self.index_algorithm_, leaf_size=self.leaf_size)
+        self.index_.fit(self.scaler_.transform(X))
+        return self
+
+    def _query(self, X):
+        """Class probabilities for one batch of rows."""
+        distances, neighbors = self.index_.kneighbors(self.scaler_.transform(X), self.n_neighbors)
+        if self.weights == 'uniform':
+            weights = np.ones_like(distances)
+        else:
+            # Exact matches get all the weight, as in KNeighborsClassifier
+            with np.errstate(divide='ignore'):
+                weights = 1.0 / distances
+            exact = np.isinf(weights)
+            weights[exact.any(axis=1)] = exact[exact.any(axis=1)]
+        n_classes = len(self.classes_)
+        rows = np.repeat(np.arange(len(X)) * n_classes, self.n_neighbors)
+        votes = np.bincount(rows + self._codes[neighbors].ravel(), weights.ravel(),
+                            minlength=len(X) * n_classes).reshape(len(X), n_classes)
+        return votes / votes.sum(axis=1, keepdims=True)
+
+    def predict_proba(self, X):
+        X = np.asarray(X)
+        batches = [X[i:i + self.batch_size] for i in range(0, len(X), self.batch_size)]
+        if len(batches) <= 1 or self.n_jobs == 1:
+            parts = [self._query(batch) for batch in batches]
+        else:
+            parts = Parallel(n_jobs=self.n_jobs, prefer='threads')(delayed(self._query)(b) for b in batches)
+        return np.concatenate(parts) if parts else np.empty((0, len(self.classes_)))
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+class ApproximateKernelSVM(ClassifierMixin, BaseEstimator):
+    """
+    RBF-kernel SVM approximated by an explicit feature map and a linear SVM.
+
+    Fitting an exact SVC grows quadratically (or worse) with the number of
+    epochs; here the features are standardized, mapped to n_components
+    Nystroem ('nystroem') or random Fourier ('rff') features, and classified
+    with LinearSVC, which is linear in the number of epochs. Parameters
+    mirror SVC (C, gamma), so it works with make_classifier params and
+    hyperparameter_search.
+
+    Attributes:
+        pipeline_ (Pipeline): Fitted scaler, feature map and LinearSVC.
+        classes_ (np.ndarray): Class labels.
+    """
+
+    def __init__(self, C=1.0, gamma='scale', method='nystroem', n_components=500, random_state=None):
+        self.C = C
+        self.gamma = gamma
+        self.method = method
+        self.n_components = n_components
+        self.random_state = random_state
+
+    def fit(self, X, y):
+        if self.method not in SVM_APPROXIMATIONS:
+            raise ValueError(f"Unknown SVM approximation: {self.method}. Valid: {SVM_APPROXIMATIONS}")
+        # After standardization, SVC's gamma='scale' is 1 / n_features
+        gamma = 1.0 / X.shape[1] if self.gamma == 'scale' else self.gamma
+        n_components = min(self.n_components, len(X)) if self.method == 'nystroem' else self.n_components
+        if self.method == 'nystroem':
+            feature_map = Nystroem(gamma=gamma, n_components=n_components, random_state=self.random_state)
+        else:
+            feature_map = RBFSampler(gamma=gamma, n_components=n_components, random_state=self.random_state)
+        self.pipeline_ = make_pipeline(StandardScaler(), feature_map, LinearSVC(C=self.C))
+        self.pipeline_.fit(X, y)
+        self.classes_ = self.pipeline_.classes_
+        return self
+
+    def decision_function(self, X):
+        return self.pipeline_.decision_function(X)
+
+    def predict(self, X):
+        return self.pipeline_.predict(X)
+
+
+def default_classifier_kind(config):
+    """Classifier used by the current iteration: k-NN (1), SVM (2), Random Forest (3+)."""
+    if config.CURRENT_ITERATION not in (1, 2, 3, 4):
+        raise ValueError(f"Invalid iteration: {config.CURRENT_ITERATION}")
+    return CLASSIFIER_KINDS[min(config.CURRENT_ITERATION, 3) - 1]
+
+
+def make_classifier(config, kind=None, params=None):
+    """
+    Unfitted classifier (using config parameters).
+
+    Args:
+        config (module): The configuration module.
+        kind (str): One of CLASSIFIER_KINDS (default: the current iteration's).
+        params (dict): Hyperparameters overriding the config values (e.g.
+            from hyperparameter_search).
+
+    Returns:
+        object: A scikit-learn classifier.
+    """
+    kind = kind or default_classifier_kind(config)
+    if kind == 'knn' and getattr(config, 'KNN_INDEX', None):
+        # Standardized k-NN on an explicit search index stored with the model
+        model = IndexedKNN(
+            n_neighbors=getattr(config, 'KNN_N_NEIGHBORS', 5),
+            weights=getattr(config, 'KNN_WEIGHTS', 'uniform'),
+            algorithm=getattr(config, 'KNN_INDEX'),
+            batch_size=getattr(config, 'KNN_BATCH_SIZE', 4096),
+            n_jobs=getattr(config, 'KNN_N_JOBS', -1)
+        )
+
+    elif kind == 'knn':
         # Iteration 1: Simple k-NN
-        model = KNeighborsClassifier(n_neighbors=config.KNN_N_NEIGHBORS)
-        print(f"Using k-NN with k={config.KNN_N_NEIGHBORS}")
+        model = KNeighborsClassifier(n_neighbors=getattr(config, 'KNN_N_NEIGHBORS', 5),
+                                     weights=getattr(config, 'KNN_WEIGHTS', 'uniform'))
+
+    elif kind == 'svm' and getattr(config, 'SVM_APPROXIMATION', None):
+        # Kernel approximation + linear SVM: scales linearly with the number of epochs
+        model = ApproximateKernelSVM(
+            C=getattr(config, 'SVM_C', 1.0),
+            gamma=getattr(config, 'SVM_GAMMA', 'scale'),
+            method=getattr(config, 'SVM_APPROXIMATION'),
+            n_components=getattr(config, 'SVM_N_COMPONENTS', 500),
+            random_state=42
+        )
 
-    elif config.CURRENT_ITERATION == 2:
+    elif kind == 'svm':
         # Iteration 2: SVM
         # TODO: Students should tune hyperparameters (C, kernel, gamma)
         model = SVC(
             C=getattr(config, 'SVM_C', 1.0),
             kernel=getattr(config, 'SVM_KERNEL', 'rbf'),
+            gamma=getattr(config, 'SVM_GAMMA', 'scale'),
             random_state=42
         )
-        print(f"Using SVM with C={model.C}, kernel={model.kernel}")
 
-    elif config.CURRENT_ITERATION >= 3:
+    elif kind == 'random_forest':
         # Iteration 3+: Random Forest
         # TODO: Students should tune hyperparameters (n_estimators, max_depth, etc.)
         model = RandomForestClassifier(
@@ -84,112 +312,439 @@ def train_classifier(features, labels, config):
             random_state=42,
             n_jobs=-1  # Use all available cores
         )
-        print(f"Using Random Forest with {model.n_estimators} trees")
 
     else:
-        raise ValueError(f"Invalid iteration: {config.CURRENT_ITERATION}")
+        raise ValueError(f"Unknown classifier: {kind}. Valid: {CLASSIFIER_KINDS}")
+
+    if params:
+        model.set_params(**params)
+    if isinstance(model, IndexedKNN):
+        print(f"Using standardized k-NN with k={model.n_neighbors} ({model.algorithm} index)")
+    elif kind == 'knn':
+        print(f"Using k-NN with k={model.n_neighbors}")
+    elif isinstance(model, ApproximateKernelSVM):
+        print(f"Using linear SVM on {model.n_components} {model.method} RBF features with C={model.C}")
+    elif kind == 'svm':
+        print(f"Using SVM with C={model.C}, kernel={model.kernel}")
+    else:
+        print(f"Using Random Forest with {model.n_estimators} trees")
+    return model
 
-    # Train the model
-    print("Training model...")
-    model.fit(X_train, y_train)
 
-    # Comprehensive evaluation with detailed performance metrics
+def cross_validation_folds(labels, record_ids=None, n_splits=5):
+    """
+    Train/test index pairs for k-fold cross-validation.
+
+    With record ids the folds are grouped by recording (epochs of one night
+    are never split between training and test); otherwise they are
+    stratified by class, or plain k-fold when a class is too rare.
+
+    Args:
+        labels (np.ndarray): Class labels.
+        record_ids (np.ndarray): Record id per row (optional).
+        n_splits (int): Number of folds (reduced to the number of recordings
+            when there are fewer).
+
+    Returns:
+        list: (train_index, test_index) pairs.
+    """
+    X = np.zeros(len(labels))
+    if record_ids is not None and len(np.unique(record_ids)) >= 2:
+        n_splits = min(n_splits, len(np.unique(record_ids)))
+        print(f"Using {n_splits}-fold cross-validation grouped by recording")
+        return list(GroupKFold(n_splits=n_splits).split(X, labels, record_ids))
+    if np.unique(labels, return_counts=True)[1].min() >= n_splits:
+        print(f"Using stratified {n_splits}-fold cross-validation (no record ids)")
+        return list(StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=42).split(X, labels))
+    print(f"Using {n_splits}-fold cross-validation (no record ids, rare classes)")
+    return list(KFold(n_splits=n_splits, shuffle=True, random_state=42).split(X))
+
+
+def _evaluate_fold(model, features, labels, train, test, record_ids, normalizer):
+    """Fit one fold (normalizer fitted on its training rows only); return (metrics, predictions)."""
+    start = time.perf_counter()
+    X_train, X_test = features[train], features[test]
+    if normalizer is not None:
+        fold_normalizer = Normalizer(normalizer.method, normalizer.scope, normalizer.sketch_size)
+        train_ids = record_ids[train] if record_ids is not None else None
+        test_ids = record_ids[test] if record_ids is not None else None
+        X_train = fold_normalizer.fit_transform(X_train, train_ids)
+        X_test = fold_normalizer.transform(X_test, test_ids)
+    model.fit(X_train, labels[train])
     y_pred = model.predict(X_test)
-    overall_accuracy = accuracy_score(y_test, y_pred)
-    print(f"Overall accuracy: {overall_accuracy:.3f}")
+    true_indices, pred_indices, names = encode_labels(labels[test], y_pred)
+    scores = classification_metrics(true_indices, pred_indices, n_classes=len(names))
+    metrics = {
+        'n_train': len(train),
+        'n_test': len(test),
+        'accuracy': float(scores['accuracy']),
+        'kappa': float(scores['kappa']),
+        'macro_f1': float(scores['macro_f1']),
+        'seconds': time.perf_counter() - start,
+    }
+    return metrics, y_pred
+
+
+def cross_validate_classifier(model, features, labels, record_ids, config, normalizer=None):
+    """
+    Grouped k-fold cross-validation with the folds fitted in parallel.
 
-    # Calculate and display detailed performance metrics
-    print_performance_metrics(y_test, y_pred)
+    Folds run in joblib workers (config.CV_N_JOBS); the feature array is
+    passed whole and indexed inside each worker, so joblib shares one
+    memory-mapped copy with all of them instead of pickling a slice per
+    fold. Each fold's model runs single-threaded when folds are parallel.
 
-    # TODO: Students should add more advanced metrics:
-    # - Cohen's kappa (important for sleep scoring)
-    # - ROC-AUC for each class
-    # - Cross-validation scores
-    # - Feature importance analysis
-    print("\nTODO: Students should add Cohen's kappa and ROC-AUC metrics")
+    Args:
+        model (object): Unfitted classifier (cloned for every fold).
+        features (np.ndarray): Shape (n_samples, n_features).
+        labels (np.ndarray): Class labels.
+        record_ids (np.ndarray): Record id per row (optional; folds are
+            grouped by recording when given).
+        config (module): The configuration module (CV_FOLDS, CV_N_JOBS).
+        normalizer (Normalizer): Normalization settings, refitted on every
+            fold's training rows (optional).
 
-    return model
+    Returns:
+        tuple: (fold_metrics, predictions) - one dict per fold (n_train,
+            n_test, accuracy, kappa, macro_f1, seconds) and the out-of-fold
+            prediction for every row.
+    """
+    folds = cross_validation_folds(labels, record_ids, getattr(config, 'CV_FOLDS', 5))
+    n_jobs = getattr(config, 'CV_N_JOBS', -1)
+    fold_model = clone(model)
+    if n_jobs != 1 and 'n_jobs' in fold_model.get_params():
+        fold_model.set_params(n_jobs=1)
+
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(_evaluate_fold)(clone(fold_model), features, labels, train, test, record_ids, normalizer)
+        for train, test in folds
+    )
+
+    predictions = np.empty_like(labels)
+    fold_metrics = []
+    print(f"{'Fold':<6} {'Train':<8} {'Test':<8} {'Accuracy':<10} {'Kappa':<8} {'Macro F1':<10} {'Time (s)':<8}")
+    for i, ((metrics, y_pred), (_, test)) in enumerate(zip(results, folds)):
+        predictions[test] = y_pred
+        fold_metrics.append(dict(fold=i, **metrics))
+        print(f"{i:<6} {metrics['n_train']:<8} {metrics['n_test']:<8} {metrics['accuracy']:<10.3f} "
+              f"{metrics['kappa']:<8.3f} {metrics['macro_f1']:<10.3f} {metrics['seconds']:<8.1f}")
+    kappas = [m['kappa'] for m in fold_metrics]
+    print(f"Cross-validated kappa: {np.mean(kappas):.3f} +/- {np.std(kappas):.3f}")
+    return fold_metrics, predictions
+
+
+# -- Hyperparameter search ----------------------------------------------------
+# Successive halving: every candidate is first scored with a small budget
+# (training epochs for k-NN and SVM, trees for Random Forest), and only the
+# best 1/SEARCH_FACTOR go on to the next round with SEARCH_FACTOR times the
+# budget. Candidate/fold fits of a round run in parallel, and scores are saved
+# in CACHE_DIR after every round, so an interrupted search resumes where it
+# stopped.
+
+SEARCH_SPACES = {
+    'knn': {'n_neighbors': [3, 5, 9, 15, 25, 41], 'weights': ['uniform', 'distance']},
+    'svm': {'C': [0.1, 1.0, 10.0, 100.0], 'gamma': ['scale', 0.01, 0.1]},
+    'random_forest': {'max_depth': [None, 10, 20], 'min_samples_split': [2, 5, 10],
+                      'max_features': ['sqrt', 0.3]},
+}
+
+
+def _halving_schedule(n_candidates, min_resource, max_resource, factor):
+    """Budget of every round, ending at max_resource."""
+    n_rounds = 1 + math.ceil(math.log(max(n_candidates, 1), factor))
+    while n_rounds > 1 and max_resource / factor ** (n_rounds - 1) < min_resource:
+        n_rounds -= 1
+    return [int(max_resource / factor ** (n_rounds - 1 - i)) for i in range(n_rounds)]
+
+
+def _search_key(params):
+    return json.dumps(params, sort_keys=True, default=str)
+
+
+def hyperparameter_search(features, labels, config, kind=None, space=None):
+    """
+    Successive-halving hyperparameter search with grouped cross-validation.
 
+    Candidates are scored by mean Cohen's kappa over the same grouped folds
+    as train_classifier (cross_validation_folds). The budget is the number of
+    trees for Random Forest (SEARCH_MIN_TREES up to RF_N_ESTIMATORS) and the
+    number of training epochs per fold for k-NN and SVM (SEARCH_MIN_EPOCHS up
+    to the full fold).
 
-def print_performance_metrics(y_true, y_pred):
+    Args:
+        features (FeatureMatrix or np.ndarray): Training features.
+        labels (np.ndarray): Class labels.
+        config (module): The configuration module (SEARCH_FACTOR,
+            SEARCH_N_JOBS, CV_FOLDS, CACHE_DIR).
+        kind (str): One of CLASSIFIER_KINDS (default: the current iteration's).
+        space (dict): Parameter name -> values (default: SEARCH_SPACES[kind]).
+
+    Returns:
+        dict: 'best_params', 'best_score', and 'rounds' - one dict per round
+            (resource, candidates as (params, kappa) pairs sorted best first).
     """
-    Print comprehensive performance metrics for sleep stage classification.
+    kind = kind or default_classifier_kind(config)
+    space = space or SEARCH_SPACES[kind]
+    record_ids = features.record_ids if isinstance(features, FeatureMatrix) else None
+    values = features.values if isinstance(features, FeatureMatrix) else np.asarray(features)
+    labels = np.asarray(labels)
+    factor = getattr(config, 'SEARCH_FACTOR', 3)
+    n_jobs = getattr(config, 'SEARCH_N_JOBS', -1)
+    folds = cross_validation_folds(labels, record_ids, getattr(config, 'CV_FOLDS', 5))
+    normalizer = make_normalizer(config)
+    candidates = list(ParameterGrid(space))
+
+    if kind == 'random_forest':
+        min_resource = getattr(config, 'SEARCH_MIN_TREES', 10)
+        max_resource = getattr(config, 'RF_N_ESTIMATORS', 100)
+    else:
+        min_resource = getattr(config, 'SEARCH_MIN_EPOCHS', 1000)
+        max_resource = min(len(train) for train, _ in folds)
+    schedule = _halving_schedule(len(candidates), min_resource, max_resource, factor)
+
+    # Scores of finished rounds, keyed by data, folds and search settings
+    text = (f"{content_hash(values)}|{content_hash(labels)}|"
+            f"{content_hash(record_ids.astype(str)) if record_ids is not None else None}|"
+            f"{kind}|{_search_key(space)}|{len(folds)}|{schedule}|{getattr(config, 'FEATURE_NORMALIZATION', None)}")
+    filename = f"search_{kind}_{hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()}.joblib"
+    scores = load_cache(filename, config.CACHE_DIR) if os.path.exists(os.path.join(config.CACHE_DIR, filename)) else None
+    scores = scores or {}
+
+    base = make_classifier(config, kind)
+    if n_jobs != 1 and 'n_jobs' in base.get_params():
+        base.set_params(n_jobs=1)
+    rng = np.random.default_rng(42)
+    fold_order = [rng.permutation(train) for train, _ in folds]
+
+    print(f"Successive halving over {len(candidates)} {kind} candidates, budgets {schedule}")
+    rounds = []
+    for resource in schedule:
+        start = time.perf_counter()
+        pending = [p for p in candidates if f"{resource}|{_search_key(p)}" not in scores]
+        if pending:
+            jobs = []
+            for params in pending:
+                model = clone(base).set_params(**params)
+                if kind == 'random_forest':
+                    model.set_params(n_estimators=resource)
+                for order, (_, test) in zip(fold_order, folds):
+                    train = order if kind == 'random_forest' else np.sort(order[:resource])
+                    jobs.append(delayed(_evaluate_fold)(model, values, labels, train, test, record_ids, normalizer))
+            results = Parallel(n_jobs=n_jobs)(jobs)
+            for i, params in enumerate(pending):
+                fold_results = results[i * len(folds):(i + 1) * len(folds)]
+                scores[f"{resource}|{_search_key(params)}"] = float(np.mean([m['kappa'] for m, _ in fold_results]))
+            save_cache(scores, filename, config.CACHE_DIR)
+
+        ranked = sorted(candidates, key=lambda p: -scores[f"{resource}|{_search_key(p)}"])
+        rounds.append({'resource': resource,
+                       'candidates': [(p, scores[f"{resource}|{_search_key(p)}"]) for p in ranked]})
+        print(f"  budget {resource:>6}: {len(candidates):>3} candidates, best kappa "
+              f"{rounds[-1]['candidates'][0][1]:.4f} ({len(candidates) - len(pending)} resumed, "
+              f"{time.perf_counter() - start:.1f} s)")
+        candidates = ranked[:max(1, math.ceil(len(ranked) / factor))]
+
+    best_params, best_score = rounds[-1]['candidates'][0]
+    if kind == 'random_forest':
+        best_params = dict(best_params, n_estimators=schedule[-1])
+    print(f"Best {kind} parameters: {best_params} (kappa {best_score:.4f})")
+    return {'best_params': best_params, 'best_score': best_score, 'rounds': rounds}
+
+
+# -- Out-of-core training ---------------------------------------------------------
+# For feature sets larger than memory: (features, labels) chunks are streamed
+# from a memory-mapped FeatureMatrix file or produced recording by recording,
+# and fed to a learner with partial_fit. Only one chunk is in memory at a time.
+
+def feature_chunks(features, labels, chunk_rows=65536):
+    """
+    Yield (features, labels) row chunks.
 
-    Includes accuracy, sensitivity (recall), specificity, and F1-score for each sleep stage.
+    Args:
+        features (FeatureMatrix, np.ndarray or str): Features, or the path of
+            a FeatureMatrix file (memory-mapped, read chunk by chunk).
+        labels (np.ndarray): Class labels (may be memory-mapped, e.g. from
+            np.load(path, mmap_mode='r')).
+        chunk_rows (int): Rows per chunk.
+
+    Yields:
+        tuple: (features chunk, labels chunk).
+    """
+    if isinstance(features, (str, os.PathLike)):
+        features = FeatureMatrix.load(features, mmap=True)
+    for start in range(0, len(labels), chunk_rows):
+        yield features[start:start + chunk_rows], np.asarray(labels[start:start + chunk_rows])
+
+
+def train_incremental(chunks, config, classes=(0, 1, 2, 3, 4)):
     """
+    Train a linear classifier out of core with partial_fit.
 
-    # Sleep stage labels and names (0=Wake, 1=N1, 2=N2, 3=N3, 4=REM)
-    stage_names = ['Wake', 'N1', 'N2', 'N3', 'REM']
-    stage_labels = list(range(5))
+    The features are standardized with a StandardScaler fitted by
+    partial_fit, then fed to an SGDClassifier (config.INCREMENTAL_LOSS,
+    INCREMENTAL_ALPHA). When chunks is a callable, every call must return a
+    fresh pass over the data: the first pass fits the scaler and
+    config.INCREMENTAL_EPOCHS further passes train the classifier. A plain
+    iterable (e.g. a generator over recordings) is consumed once, updating
+    the scaler before each chunk is learned. Each chunk is shuffled before
+    partial_fit and scored before it is learned (progressive validation).
+
+    Args:
+        chunks (callable or iterable): (features, labels) pairs, e.g.
+            lambda: feature_chunks('features.fmat', labels).
+        config (module): The configuration module.
+        classes (sequence): All class labels (partial_fit needs them up front).
+
+    Returns:
+        Pipeline: Fitted scaler and classifier. FeatureMatrix chunks are
+            selected by the first chunk's column names, which are stored in
+            model.feature_columns_ for inference.
+    """
+    scaler = StandardScaler()
+    model = SGDClassifier(
+        loss=getattr(config, 'INCREMENTAL_LOSS', 'log_loss'),
+        alpha=getattr(config, 'INCREMENTAL_ALPHA', 1e-4),
+        average=True,  # Averaged SGD: stable after few passes
+        random_state=42
+    )
+    classes = np.asarray(classes)
+    rng = np.random.default_rng(42)
+    columns = []
+
+    def values_of(chunk):
+        if not isinstance(chunk, FeatureMatrix):
+            return np.asarray(chunk)
+        if not columns:
+            columns.extend(chunk.columns)
+        elif chunk.columns != columns:
+            chunk = chunk.select(columns)
+        return np.asarray(chunk.values)
+
+    if callable(chunks):
+        start = time.perf_counter()
+        n_rows = 0
+        for features, _ in chunks():
+            values = values_of(features)
+            scaler.partial_fit(values)
+            n_rows += len(values)
+        print(f"Fitted scaler on {n_rows} rows ({time.perf_counter() - start:.1f} s)")
+        passes = [chunks() for _ in range(getattr(config, 'INCREMENTAL_EPOCHS', 5))]
+    else:
+        passes = [chunks]
+
+    print(f"Training {model.loss} SGD classifier on {len(passes)} pass(es) over the chunks")
+    for epoch, data in enumerate(passes):
+        start = time.perf_counter()
+        n_rows = n_correct = n_chunks = 0
+        for features, labels in data:
+            values = values_of(features)
+            labels = np.asarray(labels)
+            if len(values) == 0:
+                continue
+            if not callable(chunks):
+                scaler.partial_fit(values)
+            values = scaler.transform(values)
+            if hasattr(model, 'coef_'):
+                n_correct += np.sum(model.predict(values) == labels)
+            order = rng.permutation(len(values))
+            model.partial_fit(values[order], labels[order], classes=classes)
+            n_rows += len(values)
+            n_chunks += 1
+        accuracy = n_correct / n_rows if n_rows else 0.0
+        print(f"  pass {epoch + 1}: {n_rows} rows in {n_chunks} chunks, "
+              f"progressive accuracy {accuracy:.3f} ({time.perf_counter() - start:.1f} s)")
+
+    pipeline = make_pipeline(scaler, model)
+    if columns:
+        pipeline.feature_columns_ = columns
+    return pipeline
+
+
+def print_performance_metrics(y_true, y_pred, record_ids=None, n_bootstrap=1000):
+    """
+    Print comprehensive performance metrics for sleep stage classification.
+
+    Includes accuracy, Cohen's kappa, sensitivity (recall), specificity, and
+    F1-score for each sleep stage, all derived from one confusion matrix
+    (see metrics.py), with bootstrap 95% confidence intervals and a
+    per-recording breakdown when record ids are given.
+
+    Args:
+        y_true (np.ndarray): True stages (0=Wake, 1=N1, 2=N2, 3=N3, 4=REM).
+            Other labels are reported as extra stages (see
+            metrics.encode_labels).
+        y_pred (np.ndarray): Predicted stages.
+        record_ids (array-like): Record id per epoch (optional).
+        n_bootstrap (int): Bootstrap replicates for the intervals (0 for none).
+
+    Returns:
+        dict: The metrics (see metrics.classification_metrics), with
+            'stage_names' giving the stage of each confusion matrix index.
+    """
+    true_indices, pred_indices, stage_names = encode_labels(y_true, y_pred)
+    metrics = classification_metrics(true_indices, pred_indices, record_ids, n_classes=len(stage_names),
+                                     n_bootstrap=n_bootstrap)
+    metrics['stage_names'] = stage_names
+    intervals = metrics.get('intervals')
+
+    def with_interval(name):
+        text = f"{metrics[name]:.3f}"
+        if intervals is not None:
+            low, high = intervals[name]
+            text += f" (95% CI {low:.3f}-{high:.3f})"
+        return text
 
     print("\n" + "="*70)
     print("SLEEP STAGE CLASSIFICATION PERFORMANCE METRICS")
     print("="*70)
 
     # Overall metrics
-    overall_accuracy = accuracy_score(y_true, y_pred)
-    macro_f1 = f1_score(y_true, y_pred, average='macro')
-    weighted_f1 = f1_score(y_true, y_pred, average='weighted')
-
-    print(f"Overall Accuracy: {overall_accuracy:.3f}")
-    print(f"Macro F1-Score: {macro_f1:.3f}")
-    print(f"Weighted F1-Score: {weighted_f1:.3f}")
+    print(f"Overall Accuracy: {with_interval('accuracy')}")
+    print(f"Cohen's Kappa: {with_interval('kappa')}")
+    print(f"Macro F1-Score: {with_interval('macro_f1')}")
+    print(f"Weighted F1-Score: {with_interval('weighted_f1')}")
 
     # Confusion Matrix
     print("\nConfusion Matrix:")
-    cm = confusion_matrix(y_true, y_pred, labels=stage_labels)
-
-    # Create a formatted confusion matrix
-    cm_df = pd.DataFrame(cm, index=stage_names, columns=stage_names)
+    cm_df = pd.DataFrame(metrics['confusion'], index=stage_names, columns=stage_names)
     print(cm_df.to_string())
 
-    # Per-class metrics
+    # Per-class metrics (per-class accuracy is the share of the stage's epochs
+    # classified correctly, i.e. its sensitivity)
     print("\nPer-Class Performance Metrics:")
     print("-" * 70)
     print(f"{'Stage':<8} {'Accuracy':<10} {'Sensitivity':<12} {'Specificity':<12} {'F1-Score':<10}")
     print("-" * 70)
-
-    # Calculate metrics for each sleep stage
     for i, stage_name in enumerate(stage_names):
-        if i in y_true:  # Only calculate if stage is present in test set
-            # Per-class accuracy (percentage of this class correctly classified)
-            class_mask = (y_true == i)
-            if np.sum(class_mask) > 0:
-                class_accuracy = np.sum((y_pred == i) & (y_true == i)) / np.sum(class_mask)
-            else:
-                class_accuracy = 0.0
-
-            # Sensitivity (Recall) - True Positive Rate
-            sensitivity = recall_score(y_true, y_pred, labels=[i], average=None, zero_division=0)[0]
-
-            # Specificity - True Negative Rate
-            tn = np.sum((y_true != i) & (y_pred != i))
-            fp = np.sum((y_true != i) & (y_pred == i))
-            specificity = tn / (tn + fp) if (tn + fp) > 0 else 0.0
-
-            # F1-Score
-            f1 = f1_score(y_true, y_pred, labels=[i], average=None, zero_division=0)[0]
-
-            print(f"{stage_name:<8} {class_accuracy:<10.3f} {sensitivity:<12.3f} {specificity:<12.3f} {f1:<10.3f}")
+        if metrics['support'][i] > 0:  # Only if stage is present in the evaluated epochs
+            sensitivity = metrics['sensitivity'][i]
+            specificity = np.nan_to_num(metrics['specificity'][i])
+            f1 = metrics['f1'][i]
+            print(f"{stage_name:<8} {sensitivity:<10.3f} {sensitivity:<12.3f} {specificity:<12.3f} {f1:<10.3f}")
         else:
             print(f"{stage_name:<8} {'N/A':<10} {'N/A':<12} {'N/A':<12} {'N/A':<10}")
-
     print("-" * 70)
 
-    # Class distribution in test set
-    print("\nClass Distribution in Test Set:")
-    unique, counts = np.unique(y_true, return_counts=True)
-    total_samples = len(y_true)
+    # Per-recording breakdown
+    if 'per_record' in metrics:
+        print("\nPer-Recording Performance:")
+        print(f"{'Record':<12} {'Epochs':<8} {'Accuracy':<10} {'Kappa':<8} {'Macro F1':<10}")
+        for record_id, record in metrics['per_record'].items():
+            print(f"{record_id:<12} {int(record['support'].sum()):<8} {record['accuracy']:<10.3f} "
+                  f"{record['kappa']:<8.3f} {record['macro_f1']:<10.3f}")
 
-    for stage_idx, count in zip(unique, counts):
-        stage_name = stage_names[stage_idx]
-        percentage = count / total_samples * 100
-        print(f"{stage_name}: {count} samples ({percentage:.1f}%)")
+    # Class distribution in evaluated epochs
+    print("\nClass Distribution in Test Set:")
+    total_samples = metrics['support'].sum()
+    for stage_name, count in zip(stage_names, metrics['support']):
+        if count > 0:
+            print(f"{stage_name}: {int(count)} samples ({count / total_samples * 100:.1f}%)")
 
     # Sleep scoring specific notes
     print("\nNotes for Sleep Scoring:")
     print("- Sensitivity = Recall = True Positive Rate (correctly identified stages)")
     print("- Specificity = True Negative Rate (correctly rejected stages)")
     print("- Sleep stage imbalance is natural (more N2, less N1/REM)")
-    print("- Consider Cohen's kappa for chance-corrected agreement")
+    print("- Cohen's kappa gives chance-corrected agreement")
     print("- Clinical focus: High sensitivity for REM and N3 stages")
+    return metrics
@@ -0,0 +1,329 @@
+"""
+Compact Forest Module
+
+This module exports a fitted RandomForestClassifier to a compact,
+memory-mappable file and predicts from it without scikit-learn objects.
+
+All trees are flattened into one array of 16-byte node records (NODE_DTYPE),
+so a step down a tree is a single gather:
+- feature (int32) and threshold (float32) of every split. Thresholds are
+  rounded down to float32, which gives the same decisions as scikit-learn's
+  float64 thresholds for the float32 inputs it compares them with;
+- left/right child indices (int32); leaves point to themselves. All rows
+  descend all trees together, one vectorized step per level, until every
+  (row, tree) pair is at a leaf;
+- a table of the distinct leaf class probability vectors (float64, so that
+  averaging them reproduces scikit-learn's probabilities bit for bit and
+  ties break the same way; most leaves are pure or share a few common
+  fractions, so the table is small) and the table row of every leaf.
+
+Splits whose two children are leaves with identical probabilities are
+pruned (repeatedly, bottom-up), which never changes a prediction.
+
+The file is a small JSON header followed by the raw arrays, so
+load_compact_forest memory-maps it in milliseconds instead of unpickling
+the estimator.
+"""
+
+import json
+import struct
+
+import numpy as np
+
+# Handle both package import and standalone execution
+try:
+    from .normalization import Normalizer
+except ImportError:
+    from normalization import Normalizer
+
+# Binary layout: magic, little-endian uint64 header length, UTF-8 JSON header,
+# then every array at a 64-byte aligned offset listed in the header.
+_MAGIC = b'SLEEPRF1'
+_ALIGNMENT = 64
+
+NODE_DTYPE = np.dtype([('feature', '<i4'), ('threshold', '<f4'), ('left', '<i4'), ('right', '<i4')])
+
+
+def _float32_floor(values):
+    """Largest float32 <= each float64 value."""
+    rounded = values.astype(np.float32)
+    above = rounded.astype(np.float64) > values
+    rounded[above] = np.nextafter(rounded[above], np.float32(-np.inf))
+    return rounded
+
+
+def _flatten_tree(tree):
+    """
+    Pruned node arrays of one fitted sklearn tree.
+
+    Returns:
+        tuple: (feature, threshold, left, right, is_leaf, values, depth) with
+            node 0 as root, values[i] the class probabilities of node i
+            (only meaningful for leaves) and depth the depth of the tree.
+    """
+    left = tree.children_left.copy()
+    right = tree.children_right.copy()
+    # scikit-learn >= 1.4 stores class fractions and predicts them as they
+    # are; older versions store counts and normalize them in predict_proba
+    value = np.ascontiguousarray(tree.value[:, 0, :])
+    if not np.allclose(value.sum(axis=1), 1.0):
+        normalizer = value.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        value = value / normalizer
+
+    # Children always have larger ids than their parent, so a descending scan
+    # collapses whole subtrees bottom-up
+    is_leaf = (left == -1).tolist()
+    left_list, right_list = left.tolist(), right.tolist()
+    for node in range(len(left) - 1, -1, -1):
+        if is_leaf[node]:
+            continue
+        a, b = left_list[node], right_list[node]
+        if is_leaf[a] and is_leaf[b] and np.array_equal(value[a], value[b]):
+            is_leaf[node] = True
+            value[node] = value[a]
+    is_leaf = np.array(is_leaf)
+
+    # Keep the nodes still reachable from the root, numbered in id order
+    reachable = np.zeros(len(left), dtype=bool)
+    depth = np.zeros(len(left), dtype=np.int64)
+    reachable[0] = True
+    for node in range(len(left)):
+        if reachable[node] and not is_leaf[node]:
+            reachable[left_list[node]] = reachable[right_list[node]] = True
+            depth[left_list[node]] = depth[right_list[node]] = depth[node] + 1
+    kept = np.flatnonzero(reachable)
+    new_id = np.full(len(left), -1, dtype=np.int64)
+    new_id[kept] = np.arange(len(kept))
+
+    leaf = is_leaf[kept]
+    own = np.arange(len(kept))
+    feature = np.where(leaf, 0, tree.feature[kept])
+    threshold = np.where(leaf, 0.0, tree.threshold[kept])
+    new_left = np.where(leaf, own, new_id[np.where(leaf, 0, left[kept])])
+    new_right = np.where(leaf, own, new_id[np.where(leaf, 0, right[kept])])
+    return feature, threshold, new_left, new_right, leaf, value[kept], int(depth[kept].max())
+
+
+class CompactForest:
+    """
+    Flattened random forest with a vectorized predictor.
+
+    Build one with CompactForest.from_estimator (or load_compact_forest);
+    predict and predict_proba match the source RandomForestClassifier.
+
+    Attributes:
+        classes_ (np.ndarray): Class labels.
+        n_features_in_ (int): Number of input features.
+        max_depth (int): Depth of the deepest (pruned) tree.
+        roots (np.ndarray): Root node index of every tree.
+        nodes (np.ndarray): Node records (NODE_DTYPE) of all trees.
+        leaf_index (np.ndarray): Row of leaf_values for every leaf node (-1 for splits).
+        leaf_values (np.ndarray): Distinct leaf class probabilities.
+        feature_columns_ (list): Training column names (None if unknown).
+        normalizer_ (Normalizer): Normalization fitted in training (or None).
+    """
+
+    _ARRAYS = ('roots', 'nodes', 'leaf_index', 'leaf_values')
+
+    def __init__(self, classes, n_features, max_depth, roots, nodes, leaf_index, leaf_values,
+                 feature_columns=None, normalizer=None):
+        self.classes_ = np.asarray(classes)
+        self.n_features_in_ = n_features
+        self.max_depth = max_depth
+        self.roots = roots
+        self.nodes = nodes
+        self.leaf_index = leaf_index
+        self.leaf_values = leaf_values
+        self.feature_columns_ = feature_columns
+        self.normalizer_ = normalizer
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.nodes)
+
+    @property
+    def threshold(self):
+        return self.nodes['threshold']
+
+    @classmethod
+    def from_estimator(cls, model):
+        """
+        Flatten a fitted RandomForestClassifier (single output).
+
+        The model's feature_columns_ and normalizer_ (set by
+        train_classifier) are carried over.
+        """
+        parts = [_flatten_tree(tree.tree_) for tree in model.estimators_]
+        sizes = np.array([len(p[0]) for p in parts])
+        offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+
+        leaf = np.concatenate([p[4] for p in parts])
+        leaf_values, inverse = np.unique(np.concatenate([p[5][p[4]] for p in parts]), axis=0,
+                                         return_inverse=True)
+        leaf_index = np.full(len(leaf), -1, dtype=np.int32)
+        leaf_index[leaf] = inverse.ravel()
+
+        nodes = np.empty(len(leaf), dtype=NODE_DTYPE)
+        nodes['feature'] = np.concatenate([p[0] for p in parts])
+        nodes['threshold'] = _float32_floor(np.concatenate([p[1] for p in parts]))
+        nodes['left'] = np.concatenate([p[2] + o for p, o in zip(parts, offsets)])
+        nodes['right'] = np.concatenate([p[3] + o for p, o in zip(parts, offsets)])
+        return cls(
+            classes=model.classes_,
+            n_features=model.n_features_in_,
+            max_depth=max(p[6] for p in parts),
+            roots=offsets.astype(np.int32),
+            nodes=nodes,
+            leaf_index=leaf_index,
+            leaf_values=leaf_values,
+            feature_columns=getattr(model, 'feature_columns_', None),
+            normalizer=getattr(model, 'normalizer_', None),
+        )
+
+    def apply(self, X):
+        """
+        Leaf reached in every tree.
+
+        Args:
+            X (np.ndarray): Shape (n_samples, n_features); compared as float32.
+
+        Returns:
+            np.ndarray: Global node index, shape (n_samples, n_trees).
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        flat = X.ravel()
+        reached = np.broadcast_to(self.roots, (len(X), self.n_trees)).ravel().copy()
+        # (row, tree) pairs not yet known to be at a leaf
+        active = np.arange(len(reached))
+        offset = (active // self.n_trees) * X.shape[1]
+        current = reached
+        for _ in range(self.max_depth + 1):
+            record = self.nodes[current]
+            split = record['left'] != current
+            if not split.all():
+                active, offset, current, record = active[split], offset[split], current[split], record[split]
+            if len(active) == 0:
+                break
+            go_left = flat[offset + record['feature']] <= record['threshold']
+            current = np.where(go_left, record['left'], record['right'])
+            reached[active] = current
+        return reached.reshape(len(X), self.n_trees)
+
+    def predict_proba(self, X, batch_size=4096):
+        """Mean leaf probabilities over the trees, in batches of batch_size rows."""
+        X = np.asarray(X)
+        proba = np.empty((len(X), len(self.classes_)))
+        for start in range(0, len(X), batch_size):
+            leaves = self.leaf_index[self.apply(X[start:start + batch_size])]
+            # Tree by tree, in the same order as scikit-learn's accumulation
+            total = np.zeros((len(leaves), len(self.classes_)))
+            for tree in range(self.n_trees):
+                total += self.leaf_values[leaves[:, tree]]
+            proba[start:start + batch_size] = total / self.n_trees
+        return proba
+
+    def predict(self, X, batch_size=4096):
+        return self.classes_[np.argmax(self.predict_proba(X, batch_size), axis=1)]
+
+    # -- Persistence -------------------------------------------------------------
+
+    def save(self, path):
+        """Write the forest to path (see load_compact_forest)."""
+        normalizer = None
+        if self.normalizer_ is not None:
+            n = self.normalizer_
+            normalizer = {'method': n.method, 'scope': n.scope, 'columns': n.columns,
+                          'center': None if n.center_ is None else np.asarray(n.center_).tolist(),
+                          'scale': None if n.scale_ is None else np.asarray(n.scale_).tolist()}
+        header = {
+            'classes': self.classes_.tolist(),
+            'n_features': self.n_features_in_,
+            'max_depth': self.max_depth,
+            'feature_columns': self.feature_columns_,
+            'normalizer': normalizer,
+            'arrays': {},
+        }
+        arrays = {name: np.ascontiguousarray(getattr(self, name)) for name in self._ARRAYS}
+
+        # The header lists the array offsets, which depend on the header size:
+        # lay out until the offsets no longer change
+        while True:
+            header_bytes = json.dumps(header).encode('utf-8')
+            offset = -(-(len(_MAGIC) + 8 + len(header_bytes)) // _ALIGNMENT) * _ALIGNMENT
+            layout = {}
+            for name, array in arrays.items():
+                dtype = array.dtype.descr if array.dtype.names else array.dtype.str
+                layout[name] = {'dtype': dtype, 'shape': list(array.shape), 'offset': offset}
+                offset += -(-array.nbytes // _ALIGNMENT) * _ALIGNMENT
+            if layout == header['arrays']:
+                break
+            header['arrays'] = layout
+
+        with open(path, 'wb') as f:
+            f.write(_MAGIC)
+            f.write(struct.pack('<Q', len(header_bytes)))
+            f.write(header_bytes)
+            for name, array in arrays.items():
+                f.write(b'\0' * (header['arrays'][name]['offset'] - f.tell()))
+                f.write(array.tobytes())
+
+
+def export_forest(model, path):
+    """
+    Save a fitted RandomForestClassifier as a compact forest file.
+
+    Returns:
+        CompactForest: The exported forest.
+    """
+    forest = CompactForest.from_estimator(model)
+    forest.save(path)
+    print(f"Exported {forest.n_trees} trees ({forest.n_nodes} nodes, "
+          f"{len(forest.leaf_values)} distinct leaf values) to {path}")
+    return forest
+
+
+def load_compact_forest(path, mmap=True):
+    """
+    Load a forest saved by export_forest.
+
+    Args:
+        path (str): File path.
+        mmap (bool): Memory-map the node arrays (read lazily) instead of
+            reading them into RAM.
+
+    Returns:
+        CompactForest: The loaded forest.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(_MAGIC)) != _MAGIC:
+            raise ValueError(f"Not a compact forest file: {path}")
+        (header_len,) = struct.unpack('<Q', f.read(8))
+        header = json.loads(f.read(header_len).decode('utf-8'))
+
+    arrays = {}
+    for name, spec in header['arrays'].items():
+        shape = tuple(spec['shape'])
+        dtype = spec['dtype']
+        dtype = np.dtype([tuple(field) for field in dtype]) if isinstance(dtype, list) else np.dtype(dtype)
+        if mmap:
+            arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=spec['offset'], shape=shape)
+        else:
+            arrays[name] = np.fromfile(path, dtype=dtype, count=int(np.prod(shape)),
+                                       offset=spec['offset']).reshape(shape)
+
+    normalizer = None
+    if header['normalizer'] is not None:
+        spec = header['normalizer']
+        normalizer = Normalizer(spec['method'], spec['scope'])
+        normalizer.columns = spec['columns']
+        if spec['center'] is not None:
+            normalizer.center_ = np.array(spec['center'])
+            normalizer.scale_ = np.array(spec['scale'])
+
+    return CompactForest(header['classes'], header['n_features'], header['max_depth'],
+                         feature_columns=header['feature_columns'], normalizer=normalizer, **arrays)
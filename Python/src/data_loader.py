@@ -13,8 +13,10 @@ from pathlib import Path
 # Handle both package import and standalone execution
 try:
     from .xml_parser import parse_xml_annotations, create_epoch_labels
+    from .normalization import update_signal_statistics
 except ImportError:
     from xml_parser import parse_xml_annotations, create_epoch_labels
+    from normalization import update_signal_statistics
 
 
 def load_training_data(edf_file_path, xml_file_path, epoch_length=30):
@@ -290,13 +292,17 @@ def _print_label_distribution(labels):
             print(f"  {stage_names[stage]}: {count} epochs ({pct:.1f}%)")
 
 
-def load_all_training_data(training_dir, epoch_length=30):
+def load_all_training_data(training_dir, epoch_length=30, signal_stats=None):
     """
     Load all training recordings from a directory.
 
     Args:
         training_dir (str): Path to directory containing EDF and XML files
         epoch_length (float): Epoch duration in seconds (default 30)
+        signal_stats (dict): If given, per-channel RunningStats for each
+            modality are updated with every recording as it is loaded (see
+            normalization.update_signal_statistics), so dataset-wide signal
+            statistics need no second pass over the data.
 
     Returns:
         tuple: (all_data, all_labels, all_record_ids, channel_info) where:
@@ -364,6 +370,9 @@ def load_all_training_data(training_dir, epoch_length=30):
 
             all_labels.append(labels)
 
+            if signal_stats is not None:
+                update_signal_statistics(signal_stats, multi_channel_data)
+
             # Track record ID for each epoch
             all_record_ids.extend([record_id] * len(labels))
 
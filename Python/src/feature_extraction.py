@@ -1,5 +1,34 @@
+import functools
+import itertools
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from multiprocessing import shared_memory
+from types import SimpleNamespace
+
 import numpy as np
 
+# Numba is optional: compiled kernels are used when it is installed
+try:
+    import numba
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+# Handle both package import and standalone execution
+try:
+    from .feature_matrix import FeatureMatrix, _factorize
+    from .feature_store import FeatureStore, content_hash
+    from .sleep_events import (continuous_signal, detect_eye_movements, detect_kcomplexes, detect_spindles,
+                               detect_twitches, events_per_epoch, rolling_rms)
+except ImportError:
+    from feature_matrix import FeatureMatrix, _factorize
+    from feature_store import FeatureStore, content_hash
+    from sleep_events import (continuous_signal, detect_eye_movements, detect_kcomplexes, detect_spindles,
+                              detect_twitches, events_per_epoch, rolling_rms)
+
+
 def extract_time_domain_features(epoch):
     """
     EXAMPLE: Extract basic time-domain features from a single epoch.
@@ -45,7 +74,7 @@ def extract_time_domain_features(epoch):
 
     return features
 
-def extract_features(data, config):
+def extract_features(data, config, record_ids=None, channel_info=None):
     """
     STUDENT IMPLEMENTATION AREA: Extract features based on current iteration.
 
@@ -60,56 +89,64 @@ def extract_features(data, config):
     Args:
         data: Either np.ndarray (single-channel) or dict (multi-channel)
         config (module): The configuration module.
+        record_ids (array-like): Record id for each epoch (optional), as returned
+            by load_all_training_data. Context features (config.CONTEXT_WINDOW)
+            do not cross recording boundaries.
+        channel_info (dict): Channel metadata from load_training_data (optional).
 
     Returns:
-        np.ndarray: A 2D array of features (n_epochs, n_features).
+        FeatureMatrix: Named features, shape (n_epochs, n_features).
     """
     print(f"Extracting features for iteration {config.CURRENT_ITERATION}...")
 
     # Detect if we have multi-channel data structure
     is_multi_channel = isinstance(data, dict) and 'eeg' in data
 
-    if is_multi_channel:
+    n_jobs = getattr(config, 'FEATURE_N_JOBS', 1)
+
+    if is_multi_channel and getattr(config, 'FEATURE_STORE_DIR', None):
+        print("Processing multi-channel data (EEG + EOG + EMG)")
+        features = extract_features_with_store(data, config, record_ids, channel_info)
+    elif is_multi_channel and n_jobs != 1:
+        print("Processing multi-channel data (EEG + EOG + EMG)")
+        features = extract_features_sharded(data, config, record_ids, channel_info, n_jobs)
+    elif is_multi_channel:
         print("Processing multi-channel data (EEG + EOG + EMG)")
-        return extract_multi_channel_features(data, config)
+        features = extract_multi_channel_features(data, config, record_ids, channel_info)
     else:
         print("Processing single-channel data (backward compatibility)")
-        return extract_single_channel_features(data, config)
+        features = extract_single_channel_features(data, config, record_ids)
 
+    if getattr(config, 'CONTEXT_WINDOW', 0) > 0:
+        features = add_context_features(features, config)
+        print(f"Added context from +/-{config.CONTEXT_WINDOW} epochs: {features.shape[1]} features")
 
-def extract_multi_channel_features(multi_channel_data, config):
+    return features
+
+
+def extract_multi_channel_features(multi_channel_data, config, record_ids=None, channel_info=None):
     """
     Extract features from multi-channel data: 2 EEG + 2 EOG + 1 EMG channels.
 
+    Each feature family listed for a modality in default_feature_families is
+    computed for all epochs and channels of that modality at once.
+
     Students should expand this significantly!
     """
     n_epochs = multi_channel_data['eeg'].shape[0]
-    all_features = []
-
-    for epoch_idx in range(n_epochs):
-        epoch_features = []
-
-        # EEG features (2 channels)
-        for ch in range(multi_channel_data['eeg'].shape[1]):
-            eeg_signal = multi_channel_data['eeg'][epoch_idx, ch, :]
-            eeg_features = extract_time_domain_features(eeg_signal)
-            epoch_features.extend(list(eeg_features.values()))
+    builder = _FeatureBuilder(n_epochs)
 
-        if config.CURRENT_ITERATION >= 3:
-            # Add EOG features (2 channels)
-            for ch in range(multi_channel_data['eog'].shape[1]):
-                eog_signal = multi_channel_data['eog'][epoch_idx, ch, :]
-                eog_features = extract_eog_features(eog_signal)
-                epoch_features.extend(list(eog_features.values()))
+    for modality, family_names in default_feature_families(config).items():
+        if modality not in multi_channel_data:
+            print(f"WARNING: No {modality.upper()} data - skipping {family_names}")
+            continue
+        x = multi_channel_data[modality]
+        fs = sampling_rate(modality, config, channel_info)
+        channel_names = channel_info.get(f'{modality}_names') if channel_info else None
+        for family_name in family_names:
+            _add_family(builder, x, modality, family_name, fs, config, channel_names, record_ids)
 
-            # Add EMG features (1 channel)
-            emg_signal = multi_channel_data['emg'][epoch_idx, 0, :]
-            emg_features = extract_emg_features(emg_signal)
-            epoch_features.extend(list(emg_features.values()))
-
-        all_features.append(epoch_features)
-
-    features = np.array(all_features)
+    features = builder.build(record_ids)
 
     if config.CURRENT_ITERATION == 1:
         expected = 2 * 3  # 2 EEG channels × 3 features each
@@ -122,18 +159,19 @@ def extract_multi_channel_features(multi_channel_data, config):
     return features
 
 
-def extract_single_channel_features(data, config):
+def extract_single_channel_features(data, config, record_ids=None):
     """
     Backward compatibility for single-channel data.
     """
+    data = np.atleast_2d(data)
+    builder = _FeatureBuilder(data.shape[0])
+
     if config.CURRENT_ITERATION == 1:
         # Iteration 1: Time-domain features (TARGET: 16 features)
         # CURRENT: Only 3 features implemented - students must add 13 more!
-        all_features = []
-        for epoch in data:
-            features = extract_time_domain_features(epoch)
-            all_features.append(list(features.values()))
-        features = np.array(all_features)
+        fs = sampling_rate('eeg', config)
+        builder.add_family('eeg', time_domain_feature_family(data[:, np.newaxis, :], fs, config))
+        features = builder.build(record_ids)
 
         print(f"WARNING: Only {features.shape[1]} features extracted, target is 16 for iteration 1")
         print("Students must implement the remaining time-domain features!")
@@ -142,14 +180,12 @@ def extract_single_channel_features(data, config):
         # TODO: Students must implement frequency-domain features
         print("TODO: Students must implement frequency-domain feature extraction")
         print("Target: ~31 features (time + frequency domain)")
-        n_epochs = data.shape[0] if len(data.shape) > 1 else 1
-        features = np.zeros((n_epochs, 0))  # Empty features - students must implement
+        features = builder.build(record_ids)  # Empty features - students must implement
 
     elif config.CURRENT_ITERATION >= 3:
         # TODO: Students must implement multi-signal features
         print("TODO: Students should use multi-channel data format for iteration 3+")
-        n_epochs = data.shape[0] if len(data.shape) > 1 else 1
-        features = np.zeros((n_epochs, 0))  # Empty features - students must implement
+        features = builder.build(record_ids)  # Empty features - students must implement
 
     else:
         raise ValueError(f"Invalid iteration: {config.CURRENT_ITERATION}")
@@ -201,3 +237,1394 @@ def extract_emg_features(emg_signal):
     # - Muscle tone quantification
 
     return features
+
+
+def time_domain_feature_family(x, fs, config):
+    """
+    Batched version of extract_time_domain_features.
+
+    Args:
+        x (np.ndarray): Epoch tensor, shape (n_epochs, n_channels, n_samples).
+        fs (float): Sampling rate in Hz.
+        config (module): The configuration module.
+
+    Returns:
+        dict: Feature name -> array of shape (n_epochs, n_channels).
+    """
+    return {
+        'mean': np.mean(x, axis=-1),
+        'median': np.median(x, axis=-1),
+        'std': np.std(x, axis=-1),
+    }
+
+
+def eog_feature_family(x, fs, config):
+    """Batched version of extract_eog_features."""
+    return {
+        'mean': np.mean(x, axis=-1),
+        'std': np.std(x, axis=-1),
+        'range': np.max(x, axis=-1) - np.min(x, axis=-1),
+    }
+
+
+def emg_feature_family(x, fs, config):
+    """Batched version of extract_emg_features."""
+    return {
+        'mean': np.mean(x, axis=-1),
+        'std': np.std(x, axis=-1),
+        'rms': np.sqrt(np.mean(x**2, axis=-1)),
+    }
+
+
+def emg_tone_feature_family(x, fs, config):
+    """
+    EMG tone from a rolling RMS envelope of the continuous signal.
+
+    The envelope (window EMG_TONE_WINDOW seconds) is computed for the whole
+    recording in O(n) from a cumulative sum and summarized per epoch:
+    - tone_min, tone_median: minimum and median of the envelope;
+    - atonia_fraction: fraction of the epoch with the envelope below
+      EMG_ATONIA_FACTOR x the recording's 10th percentile envelope;
+    - twitch_count: short bursts over the local baseline (see detect_twitches,
+      threshold EMG_TWITCH_THRESHOLD).
+
+    Returns:
+        dict: Feature name -> array of shape (n_epochs, n_channels).
+    """
+    n_epochs, n_channels, n_samples = x.shape
+    signal = continuous_signal(x)
+    envelope = rolling_rms(signal, round(getattr(config, 'EMG_TONE_WINDOW', 1.0) * fs))
+    level = getattr(config, 'EMG_ATONIA_FACTOR', 1.5) * np.percentile(envelope, 10, axis=-1)
+    # (n_epochs, n_channels, n_samples) view of the envelope
+    per_epoch = envelope.reshape(n_channels, n_epochs, n_samples).transpose(1, 0, 2)
+
+    twitches = detect_twitches(signal, fs, threshold=getattr(config, 'EMG_TWITCH_THRESHOLD', 4.0))
+    centres = (twitches['starts'] + twitches['stops']) // 2
+    twitch_count, _ = events_per_epoch(twitches['rows'], centres, twitches['amplitude'],
+                                       n_epochs, n_channels, n_samples)
+    return {
+        'tone_min': per_epoch.min(axis=-1),
+        'tone_median': np.median(per_epoch, axis=-1),
+        'atonia_fraction': np.mean(per_epoch < level[np.newaxis, :, np.newaxis], axis=-1),
+        'twitch_count': twitch_count,
+    }
+
+
+emg_tone_feature_family.continuous = True
+
+
+# -- Complexity features ------------------------------------------------------
+# Hjorth parameters, zero-crossing rate, line length, Petrosian/Katz fractal
+# dimension and peak count. These need several passes over each epoch, so they
+# have an optional Numba kernel that computes all of them in one parallel pass.
+# The NumPy fallback gives the same results (up to floating-point rounding).
+
+COMPLEXITY_FEATURES = (
+    'hjorth_activity', 'hjorth_mobility', 'hjorth_complexity', 'zero_crossing_rate',
+    'line_length', 'petrosian_fd', 'katz_fd', 'peak_count',
+)
+
+# Rows per chunk for the NumPy fallback (bounds the size of temporary arrays)
+_NUMPY_CHUNK_ROWS = 256
+
+
+def _safe_divide(a, b):
+    """Elementwise a / b, with 0 where b == 0."""
+    a, b = np.broadcast_arrays(np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64))
+    out = np.zeros(a.shape)
+    np.divide(a, b, out=out, where=b != 0)
+    return out
+
+
+def _complexity_numpy(x):
+    """NumPy implementation of the complexity features, shape (n_rows, 8)."""
+    n = x.shape[1]
+    out = np.empty((x.shape[0], len(COMPLEXITY_FEATURES)))
+    for start in range(0, x.shape[0], _NUMPY_CHUNK_ROWS):
+        rows = x[start:start + _NUMPY_CHUNK_ROWS]
+        dx = np.diff(rows, axis=1)
+        ddx = np.diff(dx, axis=1)
+        var_x = np.var(rows, axis=1)
+        var_dx = np.var(dx, axis=1)
+        var_ddx = np.var(ddx, axis=1)
+        mobility = np.sqrt(_safe_divide(var_dx, var_x))
+        complexity = _safe_divide(np.sqrt(_safe_divide(var_ddx, var_dx)), mobility)
+
+        positive = rows >= 0
+        zero_crossings = np.count_nonzero(positive[:, 1:] != positive[:, :-1], axis=1)
+
+        abs_dx = np.abs(dx)
+        line_length = np.sum(abs_dx, axis=1)
+
+        rising = dx >= 0
+        n_delta = np.count_nonzero(rising[:, 1:] != rising[:, :-1], axis=1)
+        petrosian = np.log10(n) / (np.log10(n) + np.log10(n / (n + 0.4 * n_delta)))
+
+        mean_step = line_length / (n - 1)
+        max_distance = np.max(np.abs(rows - rows[:, :1]), axis=1)
+        ratio = _safe_divide(max_distance, mean_step)
+        katz = _safe_divide(np.log10(n - 1), np.log10(np.where(ratio > 0, ratio, 1.0)))
+
+        peaks = np.count_nonzero((rows[:, 1:-1] > rows[:, :-2]) & (rows[:, 1:-1] > rows[:, 2:]), axis=1)
+
+        out[start:start + len(rows)] = np.column_stack([
+            var_x, mobility, complexity, zero_crossings / (n - 1),
+            line_length, petrosian, katz, peaks,
+        ])
+    return out
+
+
+if HAS_NUMBA:
+    @numba.njit(parallel=True, cache=True)
+    def _complexity_numba(x):
+        """Numba implementation of the complexity features, shape (n_rows, 8)."""
+        n_rows, n = x.shape
+        out = np.zeros((n_rows, 8))
+        for r in numba.prange(n_rows):
+            row = x[r]
+
+            # Pass 1: means of x, dx and ddx
+            sum_x = 0.0
+            sum_dx = 0.0
+            sum_ddx = 0.0
+            for i in range(n):
+                sum_x += row[i]
+            for i in range(n - 1):
+                sum_dx += row[i + 1] - row[i]
+            for i in range(n - 2):
+                sum_ddx += (row[i + 2] - row[i + 1]) - (row[i + 1] - row[i])
+            mean_x = sum_x / n
+            mean_dx = sum_dx / (n - 1)
+            mean_ddx = sum_ddx / (n - 2)
+
+            # Pass 2: variances, counts, line length and distances
+            ss_x = 0.0
+            ss_dx = 0.0
+            ss_ddx = 0.0
+            zero_crossings = 0
+            line_length = 0.0
+            n_delta = 0
+            max_distance = 0.0
+            peaks = 0
+            for i in range(n):
+                ss_x += (row[i] - mean_x) ** 2
+                distance = abs(row[i] - row[0])
+                if distance > max_distance:
+                    max_distance = distance
+                if i < n - 1:
+                    d1 = row[i + 1] - row[i]
+                    ss_dx += (d1 - mean_dx) ** 2
+                    line_length += abs(d1)
+                    if (row[i] >= 0) != (row[i + 1] >= 0):
+                        zero_crossings += 1
+                    if i < n - 2:
+                        d2 = row[i + 2] - row[i + 1]
+                        ss_ddx += ((d2 - d1) - mean_ddx) ** 2
+                        if (d1 >= 0) != (d2 >= 0):
+                            n_delta += 1
+                        if row[i + 1] > row[i] and row[i + 1] > row[i + 2]:
+                            peaks += 1
+
+            var_x = ss_x / n
+            var_dx = ss_dx / (n - 1)
+            var_ddx = ss_ddx / (n - 2)
+            mobility = np.sqrt(var_dx / var_x) if var_x != 0 else 0.0
+            mobility_dx = np.sqrt(var_ddx / var_dx) if var_dx != 0 else 0.0
+            complexity = mobility_dx / mobility if mobility != 0 else 0.0
+
+            petrosian = np.log10(n) / (np.log10(n) + np.log10(n / (n + 0.4 * n_delta)))
+            mean_step = line_length / (n - 1)
+            ratio = max_distance / mean_step if mean_step != 0 else 0.0
+            katz = 0.0
+            if ratio > 0 and np.log10(ratio) != 0:
+                katz = np.log10(n - 1) / np.log10(ratio)
+
+            out[r, 0] = var_x
+            out[r, 1] = mobility
+            out[r, 2] = complexity
+            out[r, 3] = zero_crossings / (n - 1)
+            out[r, 4] = line_length
+            out[r, 5] = petrosian
+            out[r, 6] = katz
+            out[r, 7] = peaks
+        return out
+
+
+def resolve_backend(backend='auto'):
+    """
+    Pick the kernel backend: 'numba' if requested or available, else 'numpy'.
+
+    Args:
+        backend (str): 'auto', 'numba' or 'numpy'.
+
+    Returns:
+        str: 'numba' or 'numpy'.
+    """
+    if backend == 'auto':
+        return 'numba' if HAS_NUMBA else 'numpy'
+    if backend == 'numba' and not HAS_NUMBA:
+        raise ImportError("FEATURE_BACKEND='numba' requires numba: pip install numba")
+    if backend not in ('numba', 'numpy'):
+        raise ValueError(f"Invalid feature backend: {backend}. Must be 'auto', 'numba' or 'numpy'.")
+    return backend
+
+
+def compute_complexity_features(x, backend='auto'):
+    """
+    Compute the complexity features for a batch of 1D signals.
+
+    Args:
+        x (np.ndarray): Signals, shape (n_rows, n_samples).
+        backend (str): 'auto', 'numba' or 'numpy'.
+
+    Returns:
+        np.ndarray: Features, shape (n_rows, len(COMPLEXITY_FEATURES)).
+    """
+    x = np.ascontiguousarray(x, dtype=np.float64)
+    if resolve_backend(backend) == 'numba':
+        return _complexity_numba(x)
+    return _complexity_numpy(x)
+
+
+def complexity_feature_family(x, fs, config):
+    """
+    Complexity features for all epochs and channels of one modality.
+
+    Uses config.FEATURE_BACKEND ('auto', 'numba' or 'numpy').
+    """
+    rows = x.reshape(-1, x.shape[-1])
+    out = compute_complexity_features(rows, getattr(config, 'FEATURE_BACKEND', 'auto'))
+    return {name: out[:, j].reshape(x.shape[:-1]) for j, name in enumerate(COMPLEXITY_FEATURES)}
+
+
+# -- Entropy features ---------------------------------------------------------
+# Permutation entropy is computed for all signals at once from ordinal
+# patterns. Sample and approximate entropy count template matches: the Numba
+# kernel sorts templates by their first value so each template is compared only
+# with the neighbours within tolerance (sorted-window search); the fallback
+# counts matches with a KD-tree. Both avoid the O(n^2) all-pairs comparison.
+
+def permutation_entropy(x, order=3, delay=1, normalize=True):
+    """
+    Permutation entropy of each row of x.
+
+    Ordinal patterns are encoded as Lehmer codes (0 .. order!-1) using
+    vectorized comparisons on strided views, then counted with one bincount.
+
+    Args:
+        x (np.ndarray): Signals, shape (n_rows, n_samples).
+        order (int): Embedding dimension (pattern length).
+        delay (int): Embedding delay in samples.
+        normalize (bool): Divide by log2(order!) so values lie in [0, 1].
+
+    Returns:
+        np.ndarray: Entropy per row, shape (n_rows,).
+    """
+    x = np.asarray(x, dtype=np.float64)
+    n_rows, n = x.shape
+    n_windows = n - (order - 1) * delay
+    if n_windows < 1:
+        raise ValueError(f"Signal too short for order={order}, delay={delay}")
+    n_patterns = math.factorial(order)
+
+    out = np.empty(n_rows)
+    for start in range(0, n_rows, _NUMPY_CHUNK_ROWS):
+        rows = x[start:start + _NUMPY_CHUNK_ROWS]
+        lagged = [rows[:, k * delay:k * delay + n_windows] for k in range(order)]
+        codes = np.zeros((len(rows), n_windows), dtype=np.int64)
+        for i in range(order):
+            digit = np.zeros((len(rows), n_windows), dtype=np.int64)
+            for j in range(i + 1, order):
+                digit += lagged[j] < lagged[i]
+            codes = codes * (order - i) + digit
+
+        codes += np.arange(len(rows))[:, np.newaxis] * n_patterns
+        counts = np.bincount(codes.ravel(), minlength=len(rows) * n_patterns)
+        p = counts.reshape(len(rows), n_patterns) / n_windows
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out[start:start + len(rows)] = -np.sum(np.where(p > 0, p * np.log2(p), 0.0), axis=1)
+
+    if normalize:
+        out /= np.log2(n_patterns)
+    return out
+
+
+def _entropy_from_counts(a, b, count_m, count_m1):
+    """Sample and approximate entropy from match counts (self-matches excluded)."""
+    n_templates = len(count_m)
+    # Without matches SampEn is undefined; report it as if one match were found
+    sample_entropy = -np.log(max(a, 1) / max(b, 1))
+    phi_m = np.mean(np.log((count_m + 1) / n_templates))
+    phi_m1 = np.mean(np.log((count_m1 + 1) / (n_templates - 1)))
+    return sample_entropy, phi_m - phi_m1
+
+
+def _sample_entropy_kdtree(x, m, tolerances):
+    """KD-tree implementation of sample/approximate entropy, shape (n_rows, 2)."""
+    from scipy.spatial import cKDTree
+
+    out = np.empty((x.shape[0], 2))
+    for idx, (row, r) in enumerate(zip(x, tolerances)):
+        templates = np.lib.stride_tricks.sliding_window_view(row, m + 1)
+        short = np.lib.stride_tricks.sliding_window_view(row, m)
+        count_m = cKDTree(short).query_ball_point(short, r, p=np.inf, return_length=True) - 1
+        tree_m1 = cKDTree(templates)
+        count_m1 = tree_m1.query_ball_point(templates, r, p=np.inf, return_length=True) - 1
+        tree_b = cKDTree(short[:-1])
+        b = (tree_b.count_neighbors(tree_b, r, p=np.inf) - len(short[:-1])) // 2
+        a = np.sum(count_m1) // 2
+        out[idx] = _entropy_from_counts(a, b, count_m.astype(np.float64), count_m1.astype(np.float64))
+    return out
+
+
+if HAS_NUMBA:
+    @numba.njit(parallel=True, cache=True)
+    def _sample_entropy_numba(x, m, tolerances):
+        """Sorted-window implementation of sample/approximate entropy, shape (n_rows, 2)."""
+        n_rows, n = x.shape
+        out = np.zeros((n_rows, 2))
+        for row_idx in numba.prange(n_rows):
+            row = x[row_idx]
+            r = tolerances[row_idx]
+            n_templates = n - m + 1
+            order = np.argsort(row[:n_templates], kind='mergesort')
+            count_m = np.zeros(n_templates)
+            count_m1 = np.zeros(n_templates - 1)
+            a = 0
+            b = 0
+            for p in range(n_templates):
+                i = order[p]
+                for q in range(p + 1, n_templates):
+                    j = order[q]
+                    if row[j] - row[i] > r:
+                        break
+                    match = True
+                    for k in range(1, m):
+                        if abs(row[i + k] - row[j + k]) > r:
+                            match = False
+                            break
+                    if not match:
+                        continue
+                    count_m[i] += 1
+                    count_m[j] += 1
+                    if i < n_templates - 1 and j < n_templates - 1:
+                        b += 1
+                        if abs(row[i + m] - row[j + m]) <= r:
+                            a += 1
+                            count_m1[i] += 1
+                            count_m1[j] += 1
+
+            out[row_idx, 0] = -np.log(max(a, 1) / max(b, 1))
+            phi_m = np.mean(np.log((count_m + 1) / n_templates))
+            phi_m1 = np.mean(np.log((count_m1 + 1) / (n_templates - 1)))
+            out[row_idx, 1] = phi_m - phi_m1
+        return out
+
+
+def compute_sample_entropy(x, m=2, r=0.2, backend='auto'):
+    """
+    Sample and approximate entropy of each row of x.
+
+    Templates match when their Chebyshev distance is <= r * std(row).
+
+    Args:
+        x (np.ndarray): Signals, shape (n_rows, n_samples).
+        m (int): Template length (embedding dimension).
+        r (float): Tolerance as a fraction of each row's standard deviation.
+        backend (str): 'auto', 'numba' (sorted-window search) or 'numpy' (KD-tree).
+
+    Returns:
+        np.ndarray: Shape (n_rows, 2): sample entropy, approximate entropy.
+    """
+    x = np.ascontiguousarray(x, dtype=np.float64)
+    tolerances = r * np.std(x, axis=1)
+    if resolve_backend(backend) == 'numba':
+        return _sample_entropy_numba(x, m, tolerances)
+    return _sample_entropy_kdtree(x, m, tolerances)
+
+
+def entropy_feature_family(x, fs, config):
+    """
+    Permutation entropy for all epochs and channels of one modality.
+
+    Uses config.ENTROPY_ORDER and config.ENTROPY_DELAY.
+    """
+    rows = x.reshape(-1, x.shape[-1])
+    pe = permutation_entropy(rows, getattr(config, 'ENTROPY_ORDER', 3), getattr(config, 'ENTROPY_DELAY', 1))
+    return {'permutation_entropy': pe.reshape(x.shape[:-1])}
+
+
+def sample_entropy_feature_family(x, fs, config):
+    """
+    Sample and approximate entropy for all epochs and channels of one modality.
+
+    Uses config.SAMPEN_M, config.SAMPEN_R and config.FEATURE_BACKEND.
+    """
+    rows = x.reshape(-1, x.shape[-1])
+    out = compute_sample_entropy(rows, getattr(config, 'SAMPEN_M', 2), getattr(config, 'SAMPEN_R', 0.2),
+                                 getattr(config, 'FEATURE_BACKEND', 'auto'))
+    return {
+        'sample_entropy': out[:, 0].reshape(x.shape[:-1]),
+        'approximate_entropy': out[:, 1].reshape(x.shape[:-1]),
+    }
+
+
+# -- Wavelet features ---------------------------------------------------------
+# Multi-level discrete wavelet transform (periodization mode, as in PyWavelets)
+# applied to all epochs and channels of a modality at once. Each level is one
+# matrix product of strided windows with the cached (lowpass, highpass) bank.
+
+# Daubechies decomposition low-pass filters (PyWavelets 'dec_lo')
+_WAVELET_LOWPASS = {
+    'db1': [0.7071067811865476, 0.7071067811865476],
+    'db2': [-0.12940952255126037, 0.2241438680420134, 0.8365163037378079, 0.48296291314453416],
+    'db3': [0.03522629188570953, -0.08544127388202666, -0.13501102001025458,
+            0.45987750211849154, 0.8068915093110925, 0.33267055295008263],
+    'db4': [-0.010597401785069032, 0.0328830116668852, 0.030841381835560764, -0.18703481171909309,
+            -0.027983769416859854, 0.6308807679298589, 0.7148465705529157, 0.2303778133088965],
+}
+_WAVELET_LOWPASS['haar'] = _WAVELET_LOWPASS['db1']
+
+
+@functools.lru_cache(maxsize=None)
+def wavelet_filter_bank(wavelet='db4'):
+    """
+    Return the (low-pass, high-pass) decomposition filters, time-reversed.
+
+    Filters come from the built-in Daubechies table, or from PyWavelets when
+    it is installed and the wavelet is not in the table. Results are cached.
+
+    Args:
+        wavelet (str): Wavelet name, e.g. 'db4'.
+
+    Returns:
+        tuple: (lowpass, highpass) np.ndarrays ready for correlation.
+    """
+    if wavelet in _WAVELET_LOWPASS:
+        lowpass = np.array(_WAVELET_LOWPASS[wavelet])
+    else:
+        try:
+            import pywt
+        except ImportError:
+            raise ValueError(f"Unknown wavelet '{wavelet}'. Built-in: {sorted(_WAVELET_LOWPASS)} "
+                             "(install PyWavelets for others)")
+        lowpass = np.array(pywt.Wavelet(wavelet).dec_lo)
+    highpass = lowpass[::-1] * (-1.0) ** np.arange(1, len(lowpass) + 1)
+    return lowpass[::-1].copy(), highpass[::-1].copy()
+
+
+def _dwt_step(x, filters):
+    """One periodized DWT level for all rows: returns (approximation, detail)."""
+    if x.shape[1] % 2:
+        x = np.concatenate([x, x[:, -1:]], axis=1)
+    n_taps = filters.shape[0]
+    n_out = x.shape[1] // 2
+    pad = n_taps // 2 - 1
+    padded = np.pad(x, ((0, 0), (pad, pad)), mode='wrap') if pad else x
+    # Every second length-n_taps window, times the stacked (lowpass, highpass) bank
+    windows = np.lib.stride_tricks.sliding_window_view(padded, n_taps, axis=1)[:, :2 * n_out:2]
+    out = windows @ filters
+    return out[..., 0], out[..., 1]
+
+
+def wavedec(x, wavelet='db4', level=5):
+    """
+    Multi-level DWT of each row of x.
+
+    Args:
+        x (np.ndarray): Signals, shape (n_rows, n_samples).
+        wavelet (str): Wavelet name.
+        level (int): Number of decomposition levels.
+
+    Returns:
+        list: [cA_level, cD_level, ..., cD1], each of shape (n_rows, n_coeffs),
+            in the same order as pywt.wavedec.
+    """
+    filters = np.column_stack(wavelet_filter_bank(wavelet))
+    approx = np.asarray(x, dtype=np.float64)
+    details = []
+    for _ in range(level):
+        approx, detail = _dwt_step(approx, filters)
+        details.append(detail)
+    return [approx] + details[::-1]
+
+
+def wavelet_feature_family(x, fs, config):
+    """
+    Wavelet energy, relative energy and entropy for all epochs and channels.
+
+    Per level (d1 = highest frequencies ... dN, and the final approximation aN):
+    energy (sum of squared coefficients) and relative energy (fraction of the
+    total). 'wavelet_entropy' is the Shannon entropy of the relative energies.
+
+    Uses config.WAVELET and config.WAVELET_LEVEL (capped by the epoch length).
+    """
+    wavelet = getattr(config, 'WAVELET', 'db4')
+    n_taps = len(wavelet_filter_bank(wavelet)[0])
+    max_level = int(np.log2(x.shape[-1] / (n_taps - 1))) if n_taps > 1 else 1
+    level = max(1, min(getattr(config, 'WAVELET_LEVEL', 5), max_level))
+
+    rows = x.reshape(-1, x.shape[-1])
+    names = [f'a{level}'] + [f'd{lvl}' for lvl in range(level, 0, -1)]
+    energy = np.empty((len(rows), level + 1))
+    for start in range(0, len(rows), _NUMPY_CHUNK_ROWS):
+        coeffs = wavedec(rows[start:start + _NUMPY_CHUNK_ROWS], wavelet, level)
+        energy[start:start + _NUMPY_CHUNK_ROWS] = np.column_stack([np.sum(c**2, axis=1) for c in coeffs])
+    relative = _safe_divide(energy, np.sum(energy, axis=1, keepdims=True))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        entropy = -np.sum(np.where(relative > 0, relative * np.log2(relative), 0.0), axis=1)
+
+    shape = x.shape[:-1]
+    features = {}
+    for j, name in enumerate(names):
+        features[f'wavelet_energy_{name}'] = energy[:, j].reshape(shape)
+    for j, name in enumerate(names):
+        features[f'wavelet_rel_energy_{name}'] = relative[:, j].reshape(shape)
+    features['wavelet_entropy'] = entropy.reshape(shape)
+    return features
+
+
+# -- Spectral features --------------------------------------------------------
+# Power spectral density per epoch, either multitaper (DPSS tapers, the
+# default) or Welch, followed by band powers and spectral summary features.
+# DPSS tapers are computed once per (n_samples, NW, K) and cached; all epochs,
+# channels and tapers of a chunk go through a single batched rfft.
+
+# Default frequency bands in Hz (override with config.SPECTRAL_BANDS)
+DEFAULT_SPECTRAL_BANDS = {
+    'delta': (0.5, 4.0),
+    'theta': (4.0, 8.0),
+    'alpha': (8.0, 12.0),
+    'sigma': (12.0, 16.0),
+    'beta': (16.0, 30.0),
+}
+
+
+@functools.lru_cache(maxsize=16)
+def dpss_tapers(n_samples, nw=4.0, n_tapers=None):
+    """
+    Return cached DPSS (Slepian) tapers, shape (n_tapers, n_samples).
+
+    Args:
+        n_samples (int): Epoch length in samples.
+        nw (float): Time-halfbandwidth product.
+        n_tapers (int): Number of tapers (default 2*NW - 1).
+
+    Returns:
+        np.ndarray: Read-only taper matrix.
+    """
+    from scipy.signal.windows import dpss
+
+    if n_tapers is None:
+        n_tapers = max(1, int(2 * nw) - 1)
+    tapers = dpss(n_samples, nw, n_tapers, sym=False)
+    tapers = np.atleast_2d(tapers)
+    tapers.setflags(write=False)
+    return tapers
+
+
+def multitaper_psd(x, fs, nw=4.0, n_tapers=None):
+    """
+    Multitaper PSD of each row of x (one-sided, density scaling).
+
+    Args:
+        x (np.ndarray): Signals, shape (n_rows, n_samples).
+        fs (float): Sampling rate in Hz.
+        nw (float): Time-halfbandwidth product.
+        n_tapers (int): Number of tapers (default 2*NW - 1).
+
+    Returns:
+        tuple: (freqs, psd) with psd of shape (n_rows, n_freqs).
+    """
+    x = np.asarray(x, dtype=np.float64)
+    n = x.shape[1]
+    tapers = dpss_tapers(n, float(nw), n_tapers)
+    freqs = np.fft.rfftfreq(n, 1.0 / fs)
+    psd = np.empty((x.shape[0], len(freqs)))
+    # Keep the (rows, tapers, samples) product near the size of one chunk of epochs
+    chunk = max(1, _NUMPY_CHUNK_ROWS // len(tapers))
+    for start in range(0, x.shape[0], chunk):
+        rows = x[start:start + chunk]
+        rows = rows - rows.mean(axis=1, keepdims=True)
+        spectra = np.fft.rfft(rows[:, np.newaxis, :] * tapers[np.newaxis, :, :], axis=-1)
+        psd[start:start + chunk] = np.mean(spectra.real**2 + spectra.imag**2, axis=1) / fs
+    # One-sided spectrum: double all bins except DC (and Nyquist for even n)
+    psd[:, 1:n - n // 2] *= 2
+    return freqs, psd
+
+
+def compute_psd(x, fs, config):
+    """
+    PSD of each row of x using config.SPECTRAL_METHOD ('multitaper' or 'welch').
+
+    Returns:
+        tuple: (freqs, psd) with psd of shape (n_rows, n_freqs).
+    """
+    method = getattr(config, 'SPECTRAL_METHOD', 'multitaper')
+    if method == 'multitaper':
+        return multitaper_psd(x, fs, getattr(config, 'MULTITAPER_NW', 4.0),
+                              getattr(config, 'MULTITAPER_TAPERS', None))
+    if method == 'welch':
+        from scipy.signal import welch
+        return welch(x, fs, nperseg=min(x.shape[-1], int(4 * fs)), axis=-1)
+    raise ValueError(f"Invalid SPECTRAL_METHOD: {method}. Must be 'multitaper' or 'welch'.")
+
+
+def spectral_features_from_psd(freqs, psd, bands):
+    """
+    Band powers and spectral summary features from a batch of PSDs.
+
+    Args:
+        freqs (np.ndarray): Frequencies in Hz, shape (n_freqs,).
+        psd (np.ndarray): PSDs, shape (n_rows, n_freqs).
+        bands (dict): Band name -> (low, high) in Hz.
+
+    Returns:
+        dict: Feature name -> array of shape (n_rows,).
+    """
+    df = freqs[1] - freqs[0]
+    total = np.sum(psd[:, 1:], axis=1) * df  # Excluding DC
+    features = {}
+    for name, (low, high) in bands.items():
+        in_band = (freqs >= low) & (freqs < high)
+        features[f'power_{name}'] = np.sum(psd[:, in_band], axis=1) * df
+    for name in bands:
+        features[f'rel_power_{name}'] = _safe_divide(features[f'power_{name}'], total)
+    features['total_power'] = total
+
+    p = _safe_divide(psd[:, 1:], np.sum(psd[:, 1:], axis=1, keepdims=True))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        entropy = -np.sum(np.where(p > 0, p * np.log2(p), 0.0), axis=1)
+    features['spectral_entropy'] = entropy / np.log2(p.shape[1])
+    features['peak_frequency'] = freqs[1:][np.argmax(psd[:, 1:], axis=1)]
+    cumulative = np.cumsum(p, axis=1)
+    edge = np.minimum(np.argmax(cumulative >= 0.95, axis=1), len(freqs) - 2)
+    features['spectral_edge_95'] = freqs[1:][edge]
+    return features
+
+
+def spectral_feature_family(x, fs, config):
+    """
+    Spectral features for all epochs and channels of one modality.
+
+    Uses config.SPECTRAL_METHOD, config.MULTITAPER_NW, config.MULTITAPER_TAPERS
+    and config.SPECTRAL_BANDS.
+    """
+    freqs, psd = compute_psd(x.reshape(-1, x.shape[-1]), fs, config)
+    bands = getattr(config, 'SPECTRAL_BANDS', None) or DEFAULT_SPECTRAL_BANDS
+    features = spectral_features_from_psd(freqs, psd, bands)
+    return {name: values.reshape(x.shape[:-1]) for name, values in features.items()}
+
+
+# -- Cross-channel features ---------------------------------------------------
+# Features of channel pairs within one modality (C3/C4 for EEG, left/right for
+# EOG). Zero-lag correlations for all pairs come from one einsum; coherence
+# comes from one multitaper cross-spectral computation per chunk of epochs,
+# shared by all pairs and bands.
+
+def channel_pairs(n_channels):
+    """All channel pairs (i, j) with i < j, in a fixed order."""
+    return list(itertools.combinations(range(n_channels), 2))
+
+
+def cross_spectral_band_matrix(x, fs, bands, nw=4.0, n_tapers=None):
+    """
+    Band-summed multitaper cross-spectral matrices for all epochs.
+
+    Args:
+        x (np.ndarray): Epoch tensor, shape (n_epochs, n_channels, n_samples).
+        fs (float): Sampling rate in Hz.
+        bands (dict): Band name -> (low, high) in Hz.
+        nw (float): Time-halfbandwidth product.
+        n_tapers (int): Number of tapers (default 2*NW - 1).
+
+    Returns:
+        np.ndarray: Complex array, shape (n_epochs, n_bands, n_channels, n_channels).
+    """
+    n_epochs, n_channels, n = x.shape
+    tapers = dpss_tapers(n, float(nw), n_tapers)
+    freqs = np.fft.rfftfreq(n, 1.0 / fs)
+    band_bins = [np.flatnonzero((freqs >= low) & (freqs < high)) for low, high in bands.values()]
+
+    csd = np.zeros((n_epochs, len(bands), n_channels, n_channels), dtype=np.complex128)
+    chunk = max(1, _NUMPY_CHUNK_ROWS // (n_channels * len(tapers)))
+    for start in range(0, n_epochs, chunk):
+        epochs = x[start:start + chunk]
+        epochs = epochs - epochs.mean(axis=-1, keepdims=True)
+        # One batched rfft for every epoch, channel and taper of the chunk
+        spectra = np.fft.rfft(epochs[:, :, np.newaxis, :] * tapers[np.newaxis, np.newaxis], axis=-1)
+        for b, bins in enumerate(band_bins):
+            if len(bins):
+                band = spectra[..., bins[0]:bins[-1] + 1].reshape(len(epochs), n_channels, -1)
+                # Sum over tapers and band bins of X_c * conj(X_d), as a batched matmul
+                csd[start:start + chunk, b] = band @ band.conj().transpose(0, 2, 1)
+    return csd
+
+
+def cross_channel_feature_family(x, fs, config):
+    """
+    Pairwise channel features for all epochs of one modality.
+
+    For each channel pair: zero-lag Pearson correlation ('correlation'; strongly
+    negative for the conjugate eye movements of REM sleep on EOG L/R) and
+    band coherence ('coherence_<band>', e.g. inter-hemispheric EEG coherence).
+
+    Uses config.MULTITAPER_NW, config.MULTITAPER_TAPERS and config.SPECTRAL_BANDS.
+
+    Returns:
+        dict: Feature name -> array of shape (n_epochs, n_pairs).
+    """
+    pairs = channel_pairs(x.shape[1])
+    if not pairs:
+        return {}
+    rows, cols = np.array(pairs).T
+
+    centered = x - x.mean(axis=-1, keepdims=True)
+    gram = np.einsum('ecn,edn->ecd', centered, centered)
+    diag = np.einsum('ecc->ec', gram)
+    features = {
+        'correlation': _safe_divide(gram[:, rows, cols], np.sqrt(diag[:, rows] * diag[:, cols])),
+    }
+
+    bands = getattr(config, 'SPECTRAL_BANDS', None) or DEFAULT_SPECTRAL_BANDS
+    csd = cross_spectral_band_matrix(x, fs, bands, getattr(config, 'MULTITAPER_NW', 4.0),
+                                     getattr(config, 'MULTITAPER_TAPERS', None))
+    auto = np.einsum('ebcc->ebc', csd).real
+    for b, name in enumerate(bands):
+        cross = csd[:, b, rows, cols]
+        features[f'coherence_{name}'] = _safe_divide(np.abs(cross)**2, auto[:, b, rows] * auto[:, b, cols])
+    return features
+
+
+# Pairwise families return one column per channel pair instead of per channel
+cross_channel_feature_family.pairwise = True
+
+
+# -- Sleep events -------------------------------------------------------------
+# Event detectors run on the continuous signal of a whole recording (see
+# sleep_events.py), so these families are marked continuous: extraction calls
+# them once per recording when record ids are known.
+
+def spindle_feature_family(x, fs, config):
+    """
+    Sleep spindles per epoch: count, density (per minute), mean duration (s)
+    and mean peak RMS amplitude.
+
+    Settings: SPINDLE_BAND, SPINDLE_THRESHOLD (multiple of the median RMS envelope).
+    """
+    n_epochs, n_channels, n_samples = x.shape
+    events = detect_spindles(continuous_signal(x), fs,
+                             band=getattr(config, 'SPINDLE_BAND', (11.0, 16.0)),
+                             threshold=getattr(config, 'SPINDLE_THRESHOLD', 2.5))
+    starts, stops = events['starts'], events['stops']
+    centres = (starts + stops) // 2
+    count, duration = events_per_epoch(events['rows'], centres, (stops - starts) / fs,
+                                       n_epochs, n_channels, n_samples)
+    _, amplitude = events_per_epoch(events['rows'], centres, events['amplitude'],
+                                    n_epochs, n_channels, n_samples)
+    return {
+        'spindle_count': count,
+        'spindle_density': count * 60.0 * fs / n_samples,
+        'spindle_duration': duration,
+        'spindle_amplitude': amplitude,
+    }
+
+
+def kcomplex_feature_family(x, fs, config):
+    """
+    K-complexes per epoch: count and mean peak-to-peak amplitude.
+
+    Settings: KCOMPLEX_BAND, KCOMPLEX_THRESHOLD (trough depth in robust standard deviations).
+    """
+    n_epochs, n_channels, n_samples = x.shape
+    events = detect_kcomplexes(continuous_signal(x), fs,
+                               band=getattr(config, 'KCOMPLEX_BAND', (0.5, 4.0)),
+                               threshold=getattr(config, 'KCOMPLEX_THRESHOLD', 4.0))
+    centres = (events['starts'] + events['stops']) // 2
+    count, amplitude = events_per_epoch(events['rows'], centres, events['amplitude'],
+                                        n_epochs, n_channels, n_samples)
+    return {'kcomplex_count': count, 'kcomplex_amplitude': amplitude}
+
+
+def eye_movement_feature_family(x, fs, config):
+    """
+    Conjugate eye movements per epoch for each EOG channel pair (left/right):
+    rapid ('rem_count', 'rem_density' per minute) and slow ('sem_count',
+    'sem_density') eye movements.
+
+    Settings: REM_BAND, REM_THRESHOLD, SEM_BAND, SEM_THRESHOLD.
+
+    Returns:
+        dict: Feature name -> array of shape (n_epochs, n_pairs).
+    """
+    n_epochs, n_channels, n_samples = x.shape
+    pairs = channel_pairs(n_channels)
+    if not pairs:
+        return {}
+    left, right = np.array(pairs).T
+    signal = continuous_signal(x)
+    kinds = {
+        'rem': dict(band=getattr(config, 'REM_BAND', (0.3, 5.0)),
+                    threshold=getattr(config, 'REM_THRESHOLD', 3.0),
+                    min_duration=0.06, max_duration=1.0),
+        'sem': dict(band=getattr(config, 'SEM_BAND', (0.1, 1.0)),
+                    threshold=getattr(config, 'SEM_THRESHOLD', 2.0),
+                    min_duration=1.0, max_duration=10.0, refractory=2.0),
+    }
+    features = {}
+    for kind, settings in kinds.items():
+        events = detect_eye_movements(signal[left], signal[right], fs, **settings)
+        centres = (events['starts'] + events['stops']) // 2
+        count, _ = events_per_epoch(events['rows'], centres, events['amplitude'],
+                                    n_epochs, len(pairs), n_samples)
+        features[f'{kind}_count'] = count
+        features[f'{kind}_density'] = count * 60.0 * fs / n_samples
+    return features
+
+
+spindle_feature_family.continuous = True
+kcomplex_feature_family.continuous = True
+eye_movement_feature_family.continuous = True
+eye_movement_feature_family.pairwise = True
+
+
+# Feature families by name. Each family maps an epoch tensor of one modality,
+# shape (n_epochs, n_channels, n_samples), to {feature_name: (n_epochs, n_channels)}.
+FEATURE_FAMILIES = {
+    'time': time_domain_feature_family,
+    'eog': eog_feature_family,
+    'emg': emg_feature_family,
+    'emg_tone': emg_tone_feature_family,
+    'complexity': complexity_feature_family,
+    'entropy': entropy_feature_family,
+    'sample_entropy': sample_entropy_feature_family,
+    'wavelet': wavelet_feature_family,
+    'spectral': spectral_feature_family,
+    'cross': cross_channel_feature_family,
+    'spindle': spindle_feature_family,
+    'kcomplex': kcomplex_feature_family,
+    'eye_movement': eye_movement_feature_family,
+}
+
+# Implementation version of each family. Bump a family's version whenever its
+# output changes, so features cached in a FeatureStore are recomputed.
+FAMILY_VERSIONS = {
+    'time': 1,
+    'eog': 1,
+    'emg': 1,
+    'emg_tone': 1,
+    'complexity': 1,
+    'entropy': 1,
+    'sample_entropy': 1,
+    'wavelet': 1,
+    'spectral': 1,
+    'cross': 1,
+    'spindle': 1,
+    'kcomplex': 1,
+    'eye_movement': 1,
+}
+
+# Config settings that change each family's output (part of the FeatureStore key)
+FAMILY_PARAMS = {
+    'entropy': ('ENTROPY_ORDER', 'ENTROPY_DELAY'),
+    'sample_entropy': ('SAMPEN_M', 'SAMPEN_R'),
+    'wavelet': ('WAVELET', 'WAVELET_LEVEL'),
+    'spectral': ('SPECTRAL_METHOD', 'MULTITAPER_NW', 'MULTITAPER_TAPERS', 'SPECTRAL_BANDS'),
+    'cross': ('MULTITAPER_NW', 'MULTITAPER_TAPERS', 'SPECTRAL_BANDS'),
+    'spindle': ('SPINDLE_BAND', 'SPINDLE_THRESHOLD'),
+    'kcomplex': ('KCOMPLEX_BAND', 'KCOMPLEX_THRESHOLD'),
+    'eye_movement': ('REM_BAND', 'REM_THRESHOLD', 'SEM_BAND', 'SEM_THRESHOLD'),
+    'emg_tone': ('EMG_TONE_WINDOW', 'EMG_ATONIA_FACTOR', 'EMG_TWITCH_THRESHOLD'),
+}
+
+# Default sampling rates (Hz) when neither config nor channel_info provides them
+DEFAULT_SAMPLING_RATES = {'eeg': 125, 'eog': 50, 'emg': 125}
+
+
+def default_feature_families(config):
+    """
+    Return the feature families used for each modality in the current iteration.
+
+    config.FEATURE_FAMILIES, if set, overrides these defaults.
+
+    Returns:
+        dict: Modality -> list of family names.
+    """
+    families = getattr(config, 'FEATURE_FAMILIES', None)
+    if families is not None:
+        return families
+
+    if config.CURRENT_ITERATION == 1:
+        return {'eeg': ['time']}
+    if config.CURRENT_ITERATION == 2:
+        return {'eeg': ['time', 'complexity', 'spectral', 'wavelet', 'spindle', 'kcomplex']}
+    return {
+        'eeg': ['time', 'complexity', 'entropy', 'spectral', 'wavelet', 'cross', 'spindle', 'kcomplex'],
+        'eog': ['eog', 'complexity', 'spectral', 'wavelet', 'cross', 'eye_movement'],
+        'emg': ['emg', 'emg_tone', 'complexity', 'entropy', 'spectral'],
+    }
+
+
+def split_continuous_families(families):
+    """
+    Separate per-epoch families from continuous (whole-recording) families.
+
+    Args:
+        families (dict): Modality -> list of family names.
+
+    Returns:
+        tuple: (per_epoch, continuous) dicts of the same form, keeping the
+            modality and family order; modalities without families are left out.
+    """
+    per_epoch, continuous = {}, {}
+    for modality, family_names in families.items():
+        for name in family_names:
+            target = continuous if getattr(FEATURE_FAMILIES.get(name), 'continuous', False) else per_epoch
+            target.setdefault(modality, []).append(name)
+    return per_epoch, continuous
+
+
+def sampling_rate(modality, config, channel_info=None):
+    """Look up the sampling rate of a modality (channel_info, then config, then defaults)."""
+    if channel_info is not None and f'{modality}_fs' in channel_info:
+        return channel_info[f'{modality}_fs']
+    return getattr(config, f'{modality.upper()}_FS', DEFAULT_SAMPLING_RATES[modality])
+
+
+def _add_family(builder, x, modality, family_name, fs, config, channel_names=None, record_ids=None):
+    """
+    Compute one feature family on an epoch tensor and add its columns to builder.
+
+    Continuous families are called once per recording (runs of equal
+    record_ids), so their signals never cross a recording boundary.
+    """
+    if family_name not in FEATURE_FAMILIES:
+        raise ValueError(f"Unknown feature family: {family_name}. Valid: {sorted(FEATURE_FAMILIES)}")
+    family = FEATURE_FAMILIES[family_name]
+    if getattr(family, 'continuous', False) and record_ids is not None:
+        parts = [family(x[start:stop], fs, config) for start, stop in plan_shards(len(x), record_ids)]
+        features = {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+    else:
+        features = family(x, fs, config)
+    if getattr(family, 'pairwise', False):
+        builder.add_pairwise_family(modality, features, x.shape[1], channel_names)
+    else:
+        builder.add_family(modality, features, channel_names)
+
+
+def compute_family_block(x, modality, family_name, fs, config, channel_names=None):
+    """
+    Compute one feature family for one modality as its own FeatureMatrix.
+
+    Args:
+        x (np.ndarray): Epoch tensor, shape (n_epochs, n_channels, n_samples).
+        modality (str): 'eeg', 'eog' or 'emg'.
+        family_name (str): Key of FEATURE_FAMILIES.
+        fs (float): Sampling rate in Hz.
+        config (module): The configuration module.
+        channel_names (list): Channel names for the metadata (optional).
+
+    Returns:
+        FeatureMatrix: The family's columns, in extract_features order.
+    """
+    builder = _FeatureBuilder(x.shape[0])
+    _add_family(builder, x, modality, family_name, fs, config, channel_names)
+    return builder.build()
+
+
+class _FeatureBuilder:
+    """Collects named feature columns for one FeatureMatrix."""
+
+    def __init__(self, n_epochs):
+        self.n_epochs = n_epochs
+        self.arrays = []
+        self.columns = []
+        self.modalities = []
+        self.channels = []
+
+    def add_family(self, modality, features, channel_names=None):
+        """
+        Add the output of one feature family, channel by channel.
+
+        Columns are named '<modality><channel index>_<feature>', e.g. 'eeg0_std'.
+        """
+        if not features:
+            return
+        n_channels = next(iter(features.values())).shape[1]
+        for ch in range(n_channels):
+            prefix = f"{modality}{ch}"
+            channel = channel_names[ch] if channel_names is not None else prefix
+            for name, values in features.items():
+                self.add_column(f"{prefix}_{name}", values[:, ch], modality, channel)
+
+    def add_pairwise_family(self, modality, features, n_channels, channel_names=None):
+        """
+        Add the output of a pairwise feature family, pair by pair.
+
+        Columns are named '<modality><i>-<modality><j>_<feature>', e.g. 'eog0-eog1_correlation'.
+        """
+        for p, (i, j) in enumerate(channel_pairs(n_channels)):
+            prefix = f"{modality}{i}-{modality}{j}"
+            channel = f"{channel_names[i]}-{channel_names[j]}" if channel_names is not None else prefix
+            for name, values in features.items():
+                self.add_column(f"{prefix}_{name}", values[:, p], modality, channel)
+
+    def add_column(self, name, values, modality, channel):
+        self.arrays.append(values)
+        self.columns.append(name)
+        self.modalities.append(modality)
+        self.channels.append(channel)
+
+    def build(self, record_ids=None):
+        return FeatureMatrix.from_columns(self.arrays, self.columns, self.modalities,
+                                          self.channels, record_ids, n_epochs=self.n_epochs)
+
+
+# -- Context features ---------------------------------------------------------
+
+CONTEXT_FEATURES = ('lag', 'mean', 'std', 'delta')
+
+
+def _record_row_groups(features):
+    """Rows of each recording, as slices when contiguous (the usual case)."""
+    if features.record_codes is None or len(features.record_names) <= 1:
+        return [slice(0, features.n_epochs)]
+    groups = []
+    for code in range(len(features.record_names)):
+        rows = np.flatnonzero(features.record_codes == code)
+        if len(rows) and rows[-1] - rows[0] + 1 == len(rows):
+            rows = slice(int(rows[0]), int(rows[-1]) + 1)
+        groups.append(rows)
+    return groups
+
+
+def context_layout(features, config):
+    """
+    Resolve the context settings for a feature matrix.
+
+    Returns:
+        tuple: (k, kinds, base_index, offsets, suffixes), or None when
+            context features are disabled.
+    """
+    k = getattr(config, 'CONTEXT_WINDOW', 0)
+    if k <= 0 or features.n_features == 0:
+        return None
+    kinds = getattr(config, 'CONTEXT_FEATURES', None) or CONTEXT_FEATURES
+    unknown = set(kinds) - set(CONTEXT_FEATURES)
+    if unknown:
+        raise ValueError(f"Unknown context features: {sorted(unknown)}. Valid: {CONTEXT_FEATURES}")
+    base_columns = getattr(config, 'CONTEXT_COLUMNS', None) or features.columns
+    base_index = features.column_index(base_columns)
+
+    # Context column layout: for each kind, one block of len(base_index) columns
+    offsets = [-lag for lag in range(k, 0, -1)] + list(range(1, k + 1))
+    suffixes = []
+    if 'lag' in kinds:
+        suffixes += [f'_prev{-o}' if o < 0 else f'_next{o}' for o in offsets]
+    if 'mean' in kinds:
+        suffixes.append(f'_ctx{k}_mean')
+    if 'std' in kinds:
+        suffixes.append(f'_ctx{k}_std')
+    if 'delta' in kinds:
+        suffixes.append('_delta')
+    return k, kinds, base_index, offsets, suffixes
+
+
+def context_blocks(padded, k, kinds, offsets):
+    """
+    Context values for consecutive epochs of one recording.
+
+    Args:
+        padded (np.ndarray): Base feature rows, shape (n + 2k, n_base), with
+            k epochs of history before and k epochs after the n target epochs.
+
+    Returns:
+        list: One (n, n_base) array per context suffix, in context_layout order.
+    """
+    # windows[t, c, w] = padded[t + w, c]: epoch t-k+w of the recording
+    windows = np.lib.stride_tricks.sliding_window_view(padded, 2 * k + 1, axis=0)
+    blocks = []
+    if 'lag' in kinds:
+        blocks += [windows[:, :, k + o] for o in offsets]
+    if 'mean' in kinds:
+        blocks.append(windows.mean(axis=-1))
+    if 'std' in kinds:
+        blocks.append(windows.std(axis=-1))
+    if 'delta' in kinds:
+        blocks.append(windows[:, :, k] - windows[:, :, k - 1])
+    return blocks
+
+
+def context_metadata(features, base_index, suffixes):
+    """Column names, modalities and channels of features followed by its context columns."""
+    base_names = [features.columns[i] for i in base_index]
+    columns = list(features.columns)
+    modalities = list(features.modalities)
+    channels = list(features.channels)
+    for suffix in suffixes:
+        columns += [name + suffix for name in base_names]
+        modalities += list(features.modalities[base_index])
+        channels += list(features.channels[base_index])
+    return columns, modalities, channels
+
+
+def add_context_features(features, config):
+    """
+    Append features from the +/-k neighbouring epochs of each epoch.
+
+    For every base column and window half-width k = config.CONTEXT_WINDOW:
+    - lag:   the value at epochs t-k .. t-1 and t+1 .. t+k ('_prev1', '_next1', ...)
+    - mean:  mean over the 2k+1 epoch window ('_ctx<k>_mean')
+    - std:   standard deviation over the window ('_ctx<k>_std')
+    - delta: change from the previous epoch ('_delta')
+
+    Windows never cross recording boundaries: each recording is edge-padded by
+    k epochs and windowed with sliding_window_view, so lags are strided views
+    of one padded block and are written straight into the output matrix.
+
+    Args:
+        features (FeatureMatrix): Per-epoch features (rows in time order
+            within each recording).
+        config (module): Uses CONTEXT_WINDOW, CONTEXT_FEATURES and
+            CONTEXT_COLUMNS (None = all columns).
+
+    Returns:
+        FeatureMatrix: The base columns followed by the context columns.
+    """
+    layout = context_layout(features, config)
+    if layout is None:
+        return features
+    k, kinds, base_index, offsets, suffixes = layout
+
+    n_base = len(base_index)
+    n_total = features.n_features + n_base * len(suffixes)
+    values = np.empty((features.n_epochs, n_total), dtype=np.float32, order='F')
+    values[:, :features.n_features] = features.values
+
+    for rows in _record_row_groups(features):
+        block = features.values[rows][:, base_index]
+        padded = np.pad(block, ((k, k), (0, 0)), mode='edge')
+        for s, block_values in enumerate(context_blocks(padded, k, kinds, offsets)):
+            start = features.n_features + s * n_base
+            values[rows, start:start + n_base] = block_values
+
+    columns, modalities, channels = context_metadata(features, base_index, suffixes)
+    return FeatureMatrix(values, columns, modalities, channels, features.record_codes,
+                         features.record_names if features.record_codes is not None else None)
+
+
+# -- Sharded extraction -------------------------------------------------------
+# Per-epoch feature families can split the epoch axis into shards (whole
+# recordings when record ids are known) processed in a pool of worker
+# processes; continuous families get one task per recording in the same pool.
+# Signal arrays are placed in shared memory once (or re-opened from their file
+# when they are already np.memmap arrays) so workers read them without
+# pickling copies; each worker returns small FeatureMatrix blocks.
+
+def _share_array(array):
+    """
+    Describe an array so a worker process can open it without copying.
+
+    Returns:
+        tuple: (spec, shm) where shm is the SharedMemory block to release
+            afterwards (None for memmaps).
+    """
+    if isinstance(array, np.memmap) and array.filename is not None and array.flags.c_contiguous:
+        spec = ('memmap', array.filename, array.offset, array.shape, array.dtype.str)
+        return spec, None
+    array = np.ascontiguousarray(array)
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    return ('shm', shm.name, 0, array.shape, array.dtype.str), shm
+
+
+def _open_shared_array(spec):
+    """Open an array described by _share_array; returns (array, handle to close)."""
+    kind, name, offset, shape, dtype = spec
+    if kind == 'memmap':
+        return np.memmap(name, dtype=dtype, mode='r', offset=offset, shape=shape), None
+    shm = shared_memory.SharedMemory(name=name)
+    return np.ndarray(shape, dtype=dtype, buffer=shm.buf), shm
+
+
+def _init_shard_worker():
+    """Keep each worker single-threaded; the pool provides the parallelism."""
+    if HAS_NUMBA:
+        numba.set_num_threads(1)
+
+
+def _extract_shard(specs, rows, config, channel_info, families):
+    """
+    Worker: compute the given feature families for rows [start, stop).
+
+    Returns:
+        list: One FeatureMatrix per (modality, family), in families order.
+    """
+    arrays, handles = {}, []
+    try:
+        for modality, spec in specs.items():
+            array, handle = _open_shared_array(spec)
+            arrays[modality] = array[rows[0]:rows[1]]
+            if handle is not None:
+                handles.append(handle)
+        blocks = []
+        for modality, family_names in families.items():
+            fs = sampling_rate(modality, config, channel_info)
+            channel_names = channel_info.get(f'{modality}_names') if channel_info else None
+            for family_name in family_names:
+                block = compute_family_block(arrays[modality], modality, family_name, fs, config, channel_names)
+                # Detach the result from shared memory before it is closed
+                blocks.append(FeatureMatrix(np.array(block.values, order='F'), block.columns,
+                                            block.modalities, block.channels))
+        return blocks
+    finally:
+        arrays.clear()
+        for handle in handles:
+            handle.close()
+
+
+def plan_shards(n_epochs, record_ids=None, n_shards=1):
+    """
+    Split the epoch axis into contiguous (start, stop) shards.
+
+    With record ids, shards are whole recordings (runs of equal ids) when
+    there are at least n_shards of them; otherwise epochs are split evenly.
+
+    Returns:
+        list: (start, stop) tuples covering range(n_epochs) in order.
+    """
+    if record_ids is not None:
+        record_ids = np.asarray(record_ids)
+        starts = np.flatnonzero(np.r_[True, record_ids[1:] != record_ids[:-1]])
+        if len(starts) >= n_shards:
+            stops = np.r_[starts[1:], n_epochs]
+            return [(int(a), int(b)) for a, b in zip(starts, stops)]
+    bounds = np.linspace(0, n_epochs, min(n_shards, n_epochs) + 1).astype(int)
+    return [(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+def extract_features_sharded(multi_channel_data, config, record_ids=None, channel_info=None, n_jobs=-1):
+    """
+    Multi-channel feature extraction distributed over a process pool.
+
+    Produces the same FeatureMatrix as extract_multi_channel_features, with
+    rows in the original epoch order.
+
+    Args:
+        multi_channel_data (dict): 'eeg', 'eog', 'emg' epoch tensors.
+        config (module): The configuration module.
+        record_ids (array-like): Record id for each epoch (optional).
+        channel_info (dict): Channel metadata (optional).
+        n_jobs (int): Number of worker processes (-1 = all cores).
+
+    Returns:
+        FeatureMatrix: Named features, shape (n_epochs, n_features).
+    """
+    n_jobs = os.cpu_count() if n_jobs in (None, -1) else n_jobs
+    n_epochs = multi_channel_data['eeg'].shape[0]
+    families = {}
+    for modality, family_names in default_feature_families(config).items():
+        if modality not in multi_channel_data:
+            print(f"WARNING: No {modality.upper()} data - skipping {family_names}")
+        elif family_names:
+            families[modality] = list(family_names)
+    # Per-epoch families are split into epoch chunks; continuous families
+    # need a whole recording, so they run as one task per recording
+    per_epoch, continuous = split_continuous_families(families)
+    epoch_shards = plan_shards(n_epochs, record_ids, n_shards=2 * n_jobs) if per_epoch else []
+    record_shards = plan_shards(n_epochs, record_ids, n_shards=1) if continuous else []
+    tasks = [(rows, per_epoch) for rows in epoch_shards] + [(rows, continuous) for rows in record_shards]
+    if not tasks:
+        return _FeatureBuilder(n_epochs).build(record_ids)
+    # Modules cannot be pickled; workers get the upper-case settings only
+    worker_config = SimpleNamespace(**{k: v for k, v in vars(config).items() if k.isupper()})
+    print(f"Extracting features in {len(tasks)} shards on {n_jobs} processes")
+
+    specs, handles = {}, []
+    try:
+        for modality, array in multi_channel_data.items():
+            specs[modality], shm = _share_array(array)
+            if shm is not None:
+                handles.append(shm)
+        # Forking after Numba/BLAS thread pools have started can deadlock, so
+        # workers start from a clean interpreter
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_shard_worker,
+                                 mp_context=multiprocessing.get_context(method)) as pool:
+            parts = list(pool.map(_extract_shard, [specs] * len(tasks), [rows for rows, _ in tasks],
+                                  [worker_config] * len(tasks), [channel_info] * len(tasks),
+                                  [names for _, names in tasks]))
+    finally:
+        for shm in handles:
+            shm.close()
+            shm.unlink()
+
+    # Stack each family's shards and put the families back in extraction order
+    stacked = {}
+    for group, group_parts in ((per_epoch, parts[:len(epoch_shards)]), (continuous, parts[len(epoch_shards):])):
+        keys = [(m, name) for m, names in group.items() for name in names]
+        for i, key in enumerate(keys):
+            stacked[key] = FeatureMatrix.concat_rows([blocks[i] for blocks in group_parts])
+    features = FeatureMatrix.concat_columns([stacked[(m, name)] for m, names in families.items()
+                                             for name in names])
+    if record_ids is not None:
+        record_names, record_codes = _factorize(record_ids)
+        features.record_codes, features.record_names = record_codes, record_names
+    return features
+
+
+# -- Feature store ------------------------------------------------------------
+
+def extract_features_with_store(multi_channel_data, config, record_ids=None, channel_info=None, store=None):
+    """
+    Multi-channel feature extraction that reuses features stored on disk.
+
+    Each (recording, modality, family) cell is loaded from the FeatureStore
+    when its content hash, family version and settings match, and computed
+    (then stored) otherwise. The result is identical to
+    extract_multi_channel_features.
+
+    Args:
+        multi_channel_data (dict): 'eeg', 'eog', 'emg' epoch tensors.
+        config (module): The configuration module (FEATURE_STORE_DIR is used
+            when store is None).
+        record_ids (array-like): Record id for each epoch (optional; without
+            it the whole input is treated as one recording).
+        channel_info (dict): Channel metadata (optional).
+        store (FeatureStore): Store to use (optional).
+
+    Returns:
+        FeatureMatrix: Named features, shape (n_epochs, n_features).
+    """
+    if store is None:
+        store = FeatureStore(config.FEATURE_STORE_DIR)
+    hits, misses = store.hits, store.misses
+    n_epochs = multi_channel_data['eeg'].shape[0]
+    families = default_feature_families(config)
+
+    per_record = []
+    for start, stop in plan_shards(n_epochs, record_ids, n_shards=1):
+        blocks = []
+        for modality, family_names in families.items():
+            if modality not in multi_channel_data:
+                continue
+            x = multi_channel_data[modality][start:stop]
+            fs = sampling_rate(modality, config, channel_info)
+            channel_names = channel_info.get(f'{modality}_names') if channel_info else None
+            record_hash = content_hash(x)
+            for family_name in family_names:
+                params = {name: getattr(config, name, None) for name in FAMILY_PARAMS.get(family_name, ())}
+                params['fs'] = fs
+                path = store.cell_path(record_hash, modality, family_name,
+                                       FAMILY_VERSIONS.get(family_name, 1), params)
+                blocks.append(store.get_or_compute(path, lambda: compute_family_block(
+                    x, modality, family_name, fs, config, channel_names)))
+        per_record.append(FeatureMatrix.concat_columns(blocks) if blocks
+                          else _FeatureBuilder(stop - start).build())
+
+    features = FeatureMatrix.concat_rows(per_record)
+    if record_ids is not None:
+        features.record_names, features.record_codes = _factorize(record_ids)
+    print(f"Feature store {store.root}: {store.hits - hits} cells loaded, "
+          f"{store.misses - misses} computed")
+    return features
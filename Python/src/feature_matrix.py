@@ -0,0 +1,396 @@
+"""
+Feature Matrix Module
+
+This module provides FeatureMatrix, a named, columnar container for the
+features produced by extract_features. Every column carries its name,
+modality ('eeg', 'eog', 'emg') and channel, and every row (epoch) carries the
+recording it came from, so feature selection, training and inference can
+match columns by name instead of by position.
+"""
+
+import json
+import struct
+
+import numpy as np
+
+# Binary layout: magic, little-endian uint64 header length, UTF-8 JSON header,
+# zero padding up to a 64-byte boundary, float32 values in column-major order,
+# then int32 record codes (one per row).
+_MAGIC = b'SLEEPFM1'
+_ALIGNMENT = 64
+
+
+def _factorize(record_ids):
+    """
+    Encode record ids as integer codes in order of first appearance.
+
+    Args:
+        record_ids (array-like): Record id for each epoch.
+
+    Returns:
+        tuple: (record_names, codes) where record_names is a list of unique
+            ids and codes is an int32 array indexing into it.
+    """
+    record_ids = np.asarray(record_ids)
+    names, first, inverse = np.unique(record_ids, return_index=True, return_inverse=True)
+    order = np.argsort(first, kind='stable')
+    remap = np.empty(len(order), dtype=np.int32)
+    remap[order] = np.arange(len(order), dtype=np.int32)
+    return [str(name) for name in names[order]], remap[inverse.ravel()]
+
+
+def record_groups(record_ids, n_rows):
+    """
+    Row indices of each recording, in order of first appearance.
+
+    Args:
+        record_ids (array-like): Record id for each row (None for one recording).
+        n_rows (int): Number of rows.
+
+    Returns:
+        list: One integer index array per recording (all rows when
+            record_ids is None).
+    """
+    if record_ids is None:
+        return [np.arange(n_rows)]
+    _, codes = _factorize(record_ids)
+    order = np.argsort(codes, kind='stable')
+    bounds = np.flatnonzero(np.diff(codes[order])) + 1
+    return np.split(order, bounds)
+
+
+def _as_slice(indices):
+    """Return an equivalent slice for evenly spaced indices, else None."""
+    if len(indices) == 0:
+        return None
+    if len(indices) == 1:
+        return slice(int(indices[0]), int(indices[0]) + 1)
+    step = int(indices[1] - indices[0])
+    if step <= 0 or not np.all(np.diff(indices) == step):
+        return None
+    return slice(int(indices[0]), int(indices[-1]) + 1, step)
+
+
+class FeatureMatrix:
+    """
+    Named, columnar feature matrix of shape (n_epochs, n_features).
+
+    Values are stored as float32 in column-major (Fortran) order, so each
+    feature column is contiguous in memory. Row slices and evenly spaced
+    column subsets are returned as views; other column subsets are copied.
+
+    The object behaves like an array for numpy and scikit-learn
+    (np.asarray(fm) returns the values), so existing code that expects a
+    plain np.ndarray keeps working.
+
+    Attributes:
+        values (np.ndarray): float32 array, shape (n_epochs, n_features).
+        columns (list): Column names, e.g. 'eeg0_mean'.
+        modalities (np.ndarray): Modality of each column ('eeg', 'eog', 'emg').
+        channels (np.ndarray): Channel name of each column.
+        record_codes (np.ndarray or None): int32 code of each row's recording.
+        record_names (list): Record id for each code.
+    """
+
+    def __init__(self, values, columns, modalities=None, channels=None,
+                 record_codes=None, record_names=None):
+        values = np.asarray(values)
+        if values.ndim != 2:
+            raise ValueError(f"FeatureMatrix values must be 2D, got shape {values.shape}")
+        if values.dtype != np.float32 or values.strides[0] != values.itemsize:
+            # Row-sliced and column-sliced views already have contiguous columns
+            values = np.asfortranarray(values, dtype=np.float32)
+
+        n_rows, n_cols = values.shape
+        columns = [str(c) for c in columns]
+        if len(columns) != n_cols:
+            raise ValueError(f"Got {len(columns)} column names for {n_cols} columns")
+        if len(set(columns)) != n_cols:
+            raise ValueError("Column names must be unique")
+
+        if modalities is None:
+            modalities = [c.split('_', 1)[0].rstrip('0123456789') for c in columns]
+        if channels is None:
+            channels = [c.split('_', 1)[0] for c in columns]
+        modalities = np.asarray(modalities, dtype=object)
+        channels = np.asarray(channels, dtype=object)
+        if len(modalities) != n_cols or len(channels) != n_cols:
+            raise ValueError("modalities and channels must have one entry per column")
+
+        if record_codes is not None:
+            record_codes = np.asarray(record_codes, dtype=np.int32)
+            if record_codes.shape != (n_rows,):
+                raise ValueError(f"record_codes must have shape ({n_rows},), got {record_codes.shape}")
+            if record_names is None:
+                raise ValueError("record_names are required when record_codes are given")
+
+        self.values = values
+        self.columns = columns
+        self.modalities = modalities
+        self.channels = channels
+        self.record_codes = record_codes
+        self.record_names = list(record_names) if record_names is not None else []
+        self._index = {name: i for i, name in enumerate(columns)}
+
+    # -- Construction ---------------------------------------------------------
+
+    @classmethod
+    def from_columns(cls, arrays, columns, modalities=None, channels=None,
+                     record_ids=None, n_epochs=None):
+        """
+        Build a FeatureMatrix from a list of 1D column arrays.
+
+        Each column is written once into a preallocated column-major buffer.
+
+        Args:
+            arrays (list): 1D arrays of length n_epochs, one per column.
+            columns (list): Column names.
+            modalities (list): Modality of each column (optional).
+            channels (list): Channel name of each column (optional).
+            record_ids (array-like): Record id for each epoch (optional).
+            n_epochs (int): Number of rows, required only when arrays is empty.
+
+        Returns:
+            FeatureMatrix: The assembled matrix.
+        """
+        if n_epochs is None:
+            if not arrays:
+                raise ValueError("n_epochs is required to build an empty FeatureMatrix")
+            n_epochs = len(arrays[0])
+        values = np.empty((n_epochs, len(arrays)), dtype=np.float32, order='F')
+        for j, column in enumerate(arrays):
+            values[:, j] = column
+
+        record_codes, record_names = None, None
+        if record_ids is not None:
+            record_names, record_codes = _factorize(record_ids)
+        return cls(values, columns, modalities, channels, record_codes, record_names)
+
+    @classmethod
+    def concat_rows(cls, matrices):
+        """
+        Stack matrices with identical columns along the epoch axis.
+
+        Record codes are remapped onto the union of record names.
+
+        Args:
+            matrices (list): FeatureMatrix objects in the desired row order.
+
+        Returns:
+            FeatureMatrix: The concatenated matrix.
+        """
+        if not matrices:
+            raise ValueError("Need at least one FeatureMatrix to concatenate")
+        first = matrices[0]
+        for fm in matrices[1:]:
+            if fm.columns != first.columns:
+                raise ValueError("Cannot concatenate FeatureMatrix objects with different columns")
+
+        n_rows = sum(fm.n_epochs for fm in matrices)
+        values = np.empty((n_rows, first.n_features), dtype=np.float32, order='F')
+        start = 0
+        for fm in matrices:
+            values[start:start + fm.n_epochs] = fm.values
+            start += fm.n_epochs
+
+        record_codes, record_names = None, None
+        if all(fm.record_codes is not None for fm in matrices):
+            record_names, record_codes = _factorize(np.concatenate([fm.record_ids for fm in matrices]))
+        return cls(values, first.columns, first.modalities, first.channels,
+                   record_codes, record_names)
+
+    @classmethod
+    def concat_columns(cls, matrices):
+        """
+        Join matrices with the same epochs side by side.
+
+        Args:
+            matrices (list): FeatureMatrix objects with equal n_epochs.
+
+        Returns:
+            FeatureMatrix: The joined matrix, keeping the first matrix's records.
+        """
+        if not matrices:
+            raise ValueError("Need at least one FeatureMatrix to concatenate")
+        first = matrices[0]
+        arrays, columns, modalities, channels = [], [], [], []
+        for fm in matrices:
+            if fm.n_epochs != first.n_epochs:
+                raise ValueError("Cannot join FeatureMatrix objects with different numbers of epochs")
+            arrays.extend(fm.values.T)
+            columns.extend(fm.columns)
+            modalities.extend(fm.modalities)
+            channels.extend(fm.channels)
+        result = cls.from_columns(arrays, columns, modalities, channels, n_epochs=first.n_epochs)
+        result.record_codes = first.record_codes
+        result.record_names = list(first.record_names)
+        return result
+
+    # -- Array protocol -------------------------------------------------------
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    @property
+    def n_epochs(self):
+        return self.values.shape[0]
+
+    @property
+    def n_features(self):
+        return self.values.shape[1]
+
+    @property
+    def record_ids(self):
+        """np.ndarray: Record id of each epoch (None if records are unknown)."""
+        if self.record_codes is None:
+            return None
+        return np.asarray(self.record_names, dtype=object)[self.record_codes]
+
+    def __len__(self):
+        return self.n_epochs
+
+    def __array__(self, dtype=None, copy=None):
+        if copy:
+            return np.array(self.values, dtype=dtype, copy=True)
+        if dtype is None:
+            return self.values
+        return self.values.astype(dtype, copy=False)
+
+    def __repr__(self):
+        return (f"FeatureMatrix({self.n_epochs} epochs x {self.n_features} features, "
+                f"{len(self.record_names)} records)")
+
+    # -- Subsetting -----------------------------------------------------------
+
+    def column_index(self, columns):
+        """
+        Resolve column names, integer indices or a boolean mask to indices.
+
+        Args:
+            columns: Column name, list of names, integer indices or boolean mask.
+
+        Returns:
+            np.ndarray: Integer column indices.
+        """
+        if isinstance(columns, str):
+            columns = [columns]
+        columns = np.asarray(columns)
+        if columns.dtype == bool:
+            if columns.shape != (self.n_features,):
+                raise ValueError(f"Boolean mask must have length {self.n_features}")
+            return np.flatnonzero(columns)
+        if columns.dtype.kind in 'iu':
+            return columns.astype(np.intp)
+        missing = [c for c in columns if c not in self._index]
+        if missing:
+            raise KeyError(f"Unknown feature columns: {missing}")
+        return np.array([self._index[c] for c in columns], dtype=np.intp)
+
+    def select(self, columns):
+        """
+        Return a FeatureMatrix with a subset of columns.
+
+        Evenly spaced column subsets (for example a contiguous block of one
+        channel's features) are views of the original values.
+
+        Args:
+            columns: Column names, integer indices or boolean mask.
+
+        Returns:
+            FeatureMatrix: The column subset, in the requested order.
+        """
+        indices = self.column_index(columns)
+        as_slice = _as_slice(indices)
+        values = self.values[:, as_slice] if as_slice is not None else self.values[:, indices]
+        return FeatureMatrix(values, [self.columns[i] for i in indices],
+                             self.modalities[indices], self.channels[indices],
+                             self.record_codes, self.record_names)
+
+    def select_modality(self, modality):
+        """Return the columns belonging to one modality ('eeg', 'eog' or 'emg')."""
+        return self.select(self.modalities == modality)
+
+    def __getitem__(self, rows):
+        """Return a FeatureMatrix with a subset of rows (a view for slices)."""
+        if isinstance(rows, (int, np.integer)):
+            rows = slice(rows, rows + 1 if rows != -1 else None)
+        record_codes = self.record_codes[rows] if self.record_codes is not None else None
+        return FeatureMatrix(self.values[rows], self.columns, self.modalities, self.channels,
+                             record_codes, self.record_names if record_codes is not None else None)
+
+    def rows_for_record(self, record_id):
+        """Return the rows of one recording."""
+        if self.record_codes is None:
+            raise ValueError("FeatureMatrix has no record ids")
+        code = self.record_names.index(str(record_id))
+        rows = np.flatnonzero(self.record_codes == code)
+        as_slice = _as_slice(rows)
+        return self[as_slice if as_slice is not None else rows]
+
+    # -- Persistence ----------------------------------------------------------
+
+    def save(self, path):
+        """
+        Save the matrix to a compact binary file.
+
+        Args:
+            path (str): Output file path (e.g. 'cache/features_iter1.fmat').
+        """
+        header = json.dumps({
+            'n_epochs': self.n_epochs,
+            'columns': self.columns,
+            'modalities': [str(m) for m in self.modalities],
+            'channels': [str(c) for c in self.channels],
+            'record_names': self.record_names,
+            'has_records': self.record_codes is not None,
+        }).encode('utf-8')
+        data_offset = len(_MAGIC) + 8 + len(header)
+        padding = (-data_offset) % _ALIGNMENT
+
+        with open(path, 'wb') as f:
+            f.write(_MAGIC)
+            f.write(struct.pack('<Q', len(header)))
+            f.write(header)
+            f.write(b'\0' * padding)
+            # The transpose of a column-major array is row-major: one write per file
+            np.asfortranarray(self.values, dtype='<f4').T.tofile(f)
+            if self.record_codes is not None:
+                self.record_codes.astype('<i4').tofile(f)
+
+    @classmethod
+    def load(cls, path, mmap=False):
+        """
+        Load a matrix saved with FeatureMatrix.save.
+
+        Args:
+            path (str): File path.
+            mmap (bool): Memory-map the values instead of reading them into RAM.
+
+        Returns:
+            FeatureMatrix: The loaded matrix.
+        """
+        with open(path, 'rb') as f:
+            if f.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError(f"Not a FeatureMatrix file: {path}")
+            (header_len,) = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(header_len).decode('utf-8'))
+
+        n_rows, n_cols = header['n_epochs'], len(header['columns'])
+        data_offset = len(_MAGIC) + 8 + header_len
+        data_offset += (-data_offset) % _ALIGNMENT
+        codes_offset = data_offset + 4 * n_rows * n_cols
+
+        if mmap:
+            values = np.memmap(path, dtype='<f4', mode='r', offset=data_offset,
+                               shape=(n_rows, n_cols), order='F')
+        else:
+            values = np.fromfile(path, dtype='<f4', count=n_rows * n_cols,
+                                 offset=data_offset).reshape(n_cols, n_rows).T
+
+        record_codes = None
+        if header['has_records']:
+            record_codes = np.fromfile(path, dtype='<i4', count=n_rows, offset=codes_offset)
+
+        return cls(values, header['columns'], header['modalities'], header['channels'],
+                   record_codes, header['record_names'] if header['has_records'] else None)
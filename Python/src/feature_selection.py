@@ -1,4 +1,24 @@
+import os
+import hashlib
+import math
+import time
+
 import numpy as np
+from joblib import Parallel, delayed
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.inspection import permutation_importance
+from sklearn.metrics import cohen_kappa_score, make_scorer
+from sklearn.model_selection import GroupKFold, StratifiedKFold
+
+# Handle both package import and standalone execution
+try:
+    from .feature_matrix import FeatureMatrix
+    from .feature_store import content_hash
+    from .utils import save_cache, load_cache
+except ImportError:
+    from feature_matrix import FeatureMatrix
+    from feature_store import content_hash
+    from utils import save_cache, load_cache
 
 def select_features(features, labels, config):
     """
@@ -19,12 +39,13 @@ def select_features(features, labels, config):
     - Tree-based feature importance
 
     Args:
-        features (np.ndarray): The input features (n_samples, n_features).
+        features (FeatureMatrix or np.ndarray): The input features (n_samples, n_features).
         labels (np.ndarray): The corresponding labels.
         config (module): The configuration module.
 
     Returns:
-        np.ndarray: The selected features (n_samples, n_selected_features).
+        Same type as features: The selected features (n_samples, n_selected_features).
+        A FeatureMatrix keeps the names of the selected columns.
     """
     print(f"Selecting features for iteration {config.CURRENT_ITERATION}...")
     print(f"Input features shape: {features.shape}")
@@ -39,25 +60,560 @@ def select_features(features, labels, config):
         selected_features = features
 
     elif config.CURRENT_ITERATION == 3:
-        # TODO: Students should implement feature selection here
-        # Target: Select ~30 best features from larger set
-        print("TODO: Students should implement feature selection for iteration 3")
-        print("Suggested: Use SelectKBest with f_classif to select ~30 features")
-        print("Example code:")
-        print("  from sklearn.feature_selection import SelectKBest, f_classif")
-        print("  selector = SelectKBest(f_classif, k=30)")
-        print("  selected_features = selector.fit_transform(features, labels)")
-
-        # Placeholder - students must replace:
-        selected_features = features  # No selection implemented yet
+        # Univariate ranking: keep the SELECTION_K best columns
+        scores = rank_features(features, labels, config)
+        score = getattr(config, 'SELECTION_SCORE', 'mutual_info')
+        threshold = getattr(config, 'SELECTION_REDUNDANCY_THRESHOLD', None)
+        if threshold:
+            # Of each highly correlated group, only the best-scoring column can be selected
+            priority = scores[score] if score in SCORE_NAMES else None
+            keep = prune_redundant_features(features, threshold, priority,
+                                            getattr(config, 'SELECTION_CHUNK_ROWS', None))
+            scores = {name: np.where(keep, scores[name], -np.inf) for name in SCORE_NAMES}
+        mask = top_k_mask(scores, getattr(config, 'SELECTION_K', 30), score)
+        save_feature_mask(features, mask, config)
+        selected_features = apply_feature_mask(features, mask)
 
     elif config.CURRENT_ITERATION == 4:
-        # TODO: Students should implement advanced feature selection
-        print("TODO: Students should implement advanced feature selection for iteration 4")
-        print("Suggested: Use more sophisticated methods like RFE or feature importance")
-
-        # Placeholder - students must replace:
-        selected_features = features  # No selection implemented yet
+        # Model-based selection with cross-validated kappa
+        threshold = getattr(config, 'SELECTION_REDUNDANCY_THRESHOLD', None)
+        keep = np.ones(features.shape[1], dtype=bool)
+        if threshold:
+            keep = prune_redundant_features(features, threshold,
+                                            chunk_rows=getattr(config, 'SELECTION_CHUNK_ROWS', None))
+        candidates = apply_feature_mask(features, keep)
+        method = getattr(config, 'SELECTION_METHOD', 'rfe')
+        if method == 'rfe':
+            selected, _ = recursive_feature_elimination(candidates, labels, config)
+        elif method == 'permutation':
+            selected, _ = permutation_importance_selection(candidates, labels, config)
+        else:
+            raise ValueError(f"Unknown selection method: {method}. Valid: ('rfe', 'permutation')")
+        mask = np.zeros(len(keep), dtype=bool)
+        mask[np.flatnonzero(keep)[selected]] = True
+        save_feature_mask(features, mask, config)
+        selected_features = apply_feature_mask(features, mask)
 
     print(f"Selected features shape: {selected_features.shape}")
     return selected_features
+
+
+def apply_feature_mask(features, mask):
+    """
+    Keep the columns selected by a boolean mask or integer indices.
+
+    Works for both FeatureMatrix (column names are kept, so inference can
+    select the same columns by name) and plain np.ndarray inputs.
+
+    Args:
+        features (FeatureMatrix or np.ndarray): The input features.
+        mask (np.ndarray): Boolean mask of length n_features, or column indices.
+
+    Returns:
+        Same type as features: The selected columns.
+    """
+    if isinstance(features, FeatureMatrix):
+        return features.select(mask)
+    return features[:, mask]
+
+
+# -- Univariate ranking ---------------------------------------------------------
+# ANOVA F, mutual information and correlation ratio for every column. F and
+# the correlation ratio need only per-class sums and sums of squares, which
+# come from one matrix product with the one-hot labels; mutual information
+# uses equal-frequency bins and one bincount per block of columns.
+
+SCORE_NAMES = ('f_score', 'mutual_info', 'correlation')
+
+_SCORE_CHUNK_COLUMNS = 64
+
+
+def _class_sums(values, labels):
+    """Per-class counts, sums and sums of squares of every column."""
+    classes, codes = np.unique(labels, return_inverse=True)
+    onehot = np.zeros((len(codes), len(classes)))
+    onehot[np.arange(len(codes)), codes] = 1.0
+    counts = onehot.sum(axis=0)
+    sums = values.T @ onehot                      # (n_features, n_classes)
+    squares = np.square(values).T @ onehot
+    return counts, sums, squares, codes
+
+
+def _equal_frequency_bins(values, n_bins, max_rows=20000):
+    """Bin index of every value, with per-column quantile edges from a row subsample."""
+    step = max(1, len(values) // max_rows)
+    edges = np.quantile(values[::step], np.linspace(0, 1, n_bins + 1)[1:-1], axis=0).T
+    bins = np.empty(values.shape, dtype=np.int64)
+    for j in range(values.shape[1]):
+        bins[:, j] = np.searchsorted(edges[j], values[:, j], side='right')
+    return bins
+
+
+def mutual_information(values, codes, n_classes, n_bins=16):
+    """
+    Mutual information (nats) between each column, binned into n_bins
+    equal-frequency bins, and the class codes.
+
+    Args:
+        values (np.ndarray): Features, shape (n_samples, n_features).
+        codes (np.ndarray): Class index of each sample (0 .. n_classes-1).
+        n_classes (int): Number of classes.
+        n_bins (int): Bins per feature.
+
+    Returns:
+        np.ndarray: Shape (n_features,).
+    """
+    n_samples, n_features = values.shape
+    scores = np.empty(n_features)
+    p_class = np.bincount(codes, minlength=n_classes) / n_samples
+    cells = n_bins * n_classes
+    for start in range(0, n_features, _SCORE_CHUNK_COLUMNS):
+        block = values[:, start:start + _SCORE_CHUNK_COLUMNS]
+        width = block.shape[1]
+        # Joint (bin, class) histogram of every column of the block in one bincount
+        index = _equal_frequency_bins(block, n_bins) * n_classes + codes[:, np.newaxis]
+        index += np.arange(width) * cells
+        joint = np.bincount(index.ravel(), minlength=width * cells).reshape(width, n_bins, n_classes) / n_samples
+        p_bin = joint.sum(axis=2, keepdims=True)
+        expected = p_bin * p_class
+        with np.errstate(divide='ignore', invalid='ignore'):
+            terms = joint * np.log(joint / expected)
+        # Empty cells give 0 * log(0) = nan and contribute nothing
+        scores[start:start + width] = np.nansum(terms, axis=(1, 2))
+    return scores
+
+
+def univariate_scores(features, labels, n_bins=16):
+    """
+    ANOVA F, binned mutual information and correlation ratio of every feature
+    with the labels.
+
+    The correlation ratio (eta) is the correlation of a feature with the
+    nominal stage labels: the square root of the between-class share of its
+    variance.
+
+    Args:
+        features (FeatureMatrix or np.ndarray): Shape (n_samples, n_features).
+        labels (np.ndarray): Class labels.
+        n_bins (int): Equal-frequency bins per feature for mutual information.
+
+    Returns:
+        dict: Score name (SCORE_NAMES) -> array of shape (n_features,).
+    """
+    values = np.asarray(features.values if isinstance(features, FeatureMatrix) else features, dtype=np.float64)
+    n_samples = len(values)
+    counts, sums, squares, codes = _class_sums(values, np.asarray(labels))
+    n_classes = len(counts)
+
+    total = sums.sum(axis=1)
+    ss_total = squares.sum(axis=1) - total**2 / n_samples
+    ss_between = (sums**2 / counts).sum(axis=1) - total**2 / n_samples
+    ss_within = np.maximum(ss_total - ss_between, 0.0)
+    df_between, df_within = n_classes - 1, n_samples - n_classes
+    with np.errstate(divide='ignore', invalid='ignore'):
+        f_score = (ss_between / df_between) / (ss_within / df_within)
+        eta = np.sqrt(np.clip(ss_between / ss_total, 0.0, 1.0))
+    # Constant columns carry no information
+    constant = ss_total <= 1e-12 * np.maximum(np.abs(total), 1.0)
+    f_score = np.where(constant, 0.0, np.nan_to_num(f_score, posinf=np.finfo(np.float64).max))
+    eta = np.where(constant, 0.0, eta)
+
+    return {
+        'f_score': f_score,
+        'mutual_info': mutual_information(values, codes, n_classes, n_bins),
+        'correlation': eta,
+    }
+
+
+def rank_features(features, labels, config):
+    """
+    univariate_scores with a disk cache keyed by a hash of the features,
+    labels and settings (config.SELECTION_CACHE, default on), so repeated runs
+    on the same feature matrix do not rescore it.
+
+    Returns:
+        dict: SCORE_NAMES -> scores, plus 'columns' (names, or None for arrays).
+    """
+    n_bins = getattr(config, 'SELECTION_MI_BINS', 16)
+    values = features.values if isinstance(features, FeatureMatrix) else np.asarray(features)
+    columns = list(features.columns) if isinstance(features, FeatureMatrix) else None
+
+    use_cache = getattr(config, 'SELECTION_CACHE', True)
+    if use_cache:
+        text = f"{content_hash(values)}|{content_hash(np.asarray(labels))}|{n_bins}|{columns}"
+        key = hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+        filename = f"feature_scores_{key}.joblib"
+        cached = load_cache(filename, config.CACHE_DIR)
+        if cached is not None:
+            return cached
+
+    scores = univariate_scores(values, labels, n_bins)
+    scores['columns'] = columns
+    if use_cache:
+        save_cache(scores, filename, config.CACHE_DIR)
+    return scores
+
+
+def top_k_mask(scores, k, score='mutual_info'):
+    """
+    Boolean mask of the k best features.
+
+    Features with a non-finite score (e.g. -inf for columns removed by
+    redundancy pruning) are never selected, so fewer than k features are
+    kept when fewer have a finite score.
+
+    Args:
+        scores (dict): From univariate_scores / rank_features.
+        k (int): Number of features to keep.
+        score (str): One of SCORE_NAMES, or 'rank' for the mean rank over all
+            of them.
+
+    Returns:
+        np.ndarray: Boolean mask of length n_features.
+    """
+    if score == 'rank':
+        ranks = [np.argsort(np.argsort(-scores[name])) for name in SCORE_NAMES]
+        order = np.argsort(np.mean(ranks, axis=0), kind='stable')
+        eligible = np.all([np.isfinite(scores[name]) for name in SCORE_NAMES], axis=0)
+    elif score in SCORE_NAMES:
+        order = np.argsort(-scores[score], kind='stable')
+        eligible = np.isfinite(scores[score])
+    else:
+        raise ValueError(f"Unknown selection score: {score}. Valid: {SCORE_NAMES + ('rank',)}")
+    order = order[eligible[order]]
+    mask = np.zeros(len(eligible), dtype=bool)
+    mask[order[:k]] = True
+    return mask
+
+
+def _mask_filename(config):
+    return f"feature_mask_iter{config.CURRENT_ITERATION}.joblib"
+
+
+def save_feature_mask(features, mask, config):
+    """Persist the selected columns (names and mask) in config.CACHE_DIR for inference."""
+    columns = list(np.asarray(features.columns)[mask]) if isinstance(features, FeatureMatrix) else None
+    save_cache({'mask': np.asarray(mask), 'columns': columns}, _mask_filename(config), config.CACHE_DIR)
+
+
+def apply_saved_feature_mask(features, config):
+    """
+    Apply the column selection saved by select_features (if any).
+
+    FeatureMatrix inputs are selected by column name, arrays by mask.
+
+    Returns:
+        Same type as features: The selected columns (unchanged if nothing was saved).
+    """
+    if not os.path.exists(os.path.join(config.CACHE_DIR, _mask_filename(config))):
+        return features
+    saved = load_cache(_mask_filename(config), config.CACHE_DIR)
+    if isinstance(features, FeatureMatrix) and saved['columns'] is not None:
+        return features.select(saved['columns'])
+    return apply_feature_mask(features, saved['mask'])
+
+
+# -- Redundancy pruning -----------------------------------------------------------
+# The feature covariance matrix is accumulated over row chunks (and can be
+# merged across recording shards), so memory-mapped matrices from
+# FeatureMatrix.load(path, mmap=True) are read chunk by chunk and never held
+# in memory as a whole; only the n_features x n_features matrix is. Unless
+# given, the chunk size follows from a byte budget for the float64 copy of a
+# chunk, so wide matrices are read in fewer rows.
+
+COVARIANCE_CHUNK_BYTES = 64 * 2**20
+
+
+def covariance_chunk_rows(n_features, chunk_bytes=COVARIANCE_CHUNK_BYTES):
+    """Rows per chunk whose float64 copy fits in chunk_bytes."""
+    return max(1, int(chunk_bytes) // (8 * max(n_features, 1)))
+
+
+class CovarianceAccumulator:
+    """
+    One-pass, mergeable covariance of the feature columns.
+
+    Uses the same pairwise (Chan et al.) update as RunningStats, with the
+    co-moment matrix in place of the per-column sum of squared deviations.
+
+    Attributes:
+        count (int): Number of rows seen.
+        mean (np.ndarray): Column means.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = None
+        self._comoment = None
+
+    def update(self, values):
+        """
+        Add a chunk of rows (n_rows, n_features).
+
+        Returns:
+            CovarianceAccumulator: self.
+        """
+        # One float64 copy per chunk, centered in place
+        centered = np.array(values, dtype=np.float64)
+        if len(centered) == 0:
+            return self
+        chunk = CovarianceAccumulator()
+        chunk.count = len(centered)
+        chunk.mean = centered.mean(axis=0)
+        centered -= chunk.mean
+        chunk._comoment = centered.T @ centered
+        return self.merge(chunk)
+
+    def merge(self, other):
+        """
+        Combine another accumulator into this one (e.g. from another shard).
+
+        Returns:
+            CovarianceAccumulator: self.
+        """
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self._comoment = other.count, other.mean.copy(), other._comoment.copy()
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self._comoment = self._comoment + other._comoment + np.outer(delta, delta) * (self.count * other.count / count)
+        self.mean = self.mean + delta * (other.count / count)
+        self.count = count
+        return self
+
+    @property
+    def covariance(self):
+        """Population covariance matrix."""
+        return self._comoment / self.count
+
+    def correlation(self):
+        """Pearson correlation matrix; constant columns are uncorrelated with everything."""
+        std = np.sqrt(np.diag(self._comoment))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = self._comoment / np.outer(std, std)
+        return np.nan_to_num(corr, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+def feature_covariance(features, chunk_rows=None):
+    """
+    Accumulate the feature covariance over row chunks.
+
+    Args:
+        features (FeatureMatrix, np.ndarray or list): A matrix (possibly
+            memory-mapped), or a list of shards with the same columns
+            (e.g. one FeatureMatrix per recording).
+        chunk_rows (int): Rows read per chunk (default: covariance_chunk_rows).
+
+    Returns:
+        CovarianceAccumulator: The accumulated statistics.
+    """
+    shards = features if isinstance(features, (list, tuple)) else [features]
+    total = CovarianceAccumulator()
+    for shard in shards:
+        values = shard.values if isinstance(shard, FeatureMatrix) else shard
+        chunk_rows = chunk_rows or covariance_chunk_rows(values.shape[1])
+        for start in range(0, len(values), chunk_rows):
+            total.update(values[start:start + chunk_rows])
+    return total
+
+
+def prune_redundant_features(features, threshold=0.95, priority=None, chunk_rows=None):
+    """
+    Greedily drop features highly correlated with an already kept one.
+
+    Columns are visited in priority order (highest first, e.g. a univariate
+    score; column order if not given). A column is kept unless its absolute
+    correlation with a kept column is at least threshold. Constant columns
+    are dropped.
+
+    Args:
+        features (FeatureMatrix, np.ndarray or list): As for feature_covariance.
+        threshold (float): Absolute correlation above which a column is redundant.
+        priority (np.ndarray): Score per column (optional).
+        chunk_rows (int): Rows read per chunk (default: covariance_chunk_rows).
+
+    Returns:
+        np.ndarray: Boolean mask of the kept columns.
+    """
+    stats = feature_covariance(features, chunk_rows)
+    corr = np.abs(stats.correlation())
+    n_features = len(corr)
+    order = np.arange(n_features) if priority is None else np.argsort(-np.asarray(priority), kind='stable')
+
+    keep = np.zeros(n_features, dtype=bool)
+    blocked = np.diag(stats.covariance) <= 0
+    for column in order:
+        if blocked[column]:
+            continue
+        keep[column] = True
+        blocked |= corr[column] >= threshold
+    print(f"Redundancy pruning (|r| >= {threshold}): kept {keep.sum()} of {n_features} features "
+          f"from {stats.count} rows")
+    return keep
+
+
+# -- Model-based selection -------------------------------------------------------
+# Recursive feature elimination and permutation importance, both scored by
+# cross-validated Cohen's kappa. Folds are split by recording when record ids
+# are known (epochs of one night are strongly correlated), and fold fits run
+# in parallel with joblib (SELECTION_N_JOBS); each forest uses one core.
+
+def _selection_folds(features, labels, config):
+    """Cross-validation folds, grouped by recording when record ids are known."""
+    n_splits = getattr(config, 'SELECTION_CV_FOLDS', 3)
+    groups = features.record_ids if isinstance(features, FeatureMatrix) else None
+    if groups is not None and len(np.unique(groups)) >= n_splits:
+        return list(GroupKFold(n_splits=n_splits).split(np.zeros(len(labels)), labels, groups))
+    splitter = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=42)
+    return list(splitter.split(np.zeros(len(labels)), labels))
+
+
+def _selection_model(config):
+    return RandomForestClassifier(
+        n_estimators=getattr(config, 'SELECTION_RF_TREES', 100),
+        max_depth=getattr(config, 'RF_MAX_DEPTH', None),
+        min_samples_split=getattr(config, 'RF_MIN_SAMPLES_SPLIT', 2),
+        random_state=42,
+        n_jobs=1,
+    )
+
+
+def _fit_fold(model, values, labels, train, test, columns):
+    """Fit on one fold; return (kappa on the held-out part, fitted model)."""
+    model.fit(values[np.ix_(train, columns)], labels[train])
+    predicted = model.predict(values[np.ix_(test, columns)])
+    return cohen_kappa_score(labels[test], predicted), model
+
+
+def _cross_validate(values, labels, folds, columns, config):
+    """Fit all folds in parallel; return (mean kappa, fitted models)."""
+    results = Parallel(n_jobs=getattr(config, 'SELECTION_N_JOBS', -1))(
+        delayed(_fit_fold)(_selection_model(config), values, labels, train, test, columns)
+        for train, test in folds
+    )
+    kappas, models = zip(*results)
+    return float(np.mean(kappas)), list(models)
+
+
+def recursive_feature_elimination(features, labels, config):
+    """
+    Recursive feature elimination with cross-validated kappa and early stopping.
+
+    Each round fits the folds in parallel on the remaining columns, averages
+    the forests' feature importances and drops the least important columns.
+    The step is a fraction of the remaining columns (SELECTION_RFE_FRACTION),
+    so early rounds remove many columns at once; it is halved after every
+    round without improvement. Elimination stops after SELECTION_PATIENCE
+    rounds without a kappa improvement, or at SELECTION_MIN_FEATURES columns.
+
+    Args:
+        features (FeatureMatrix or np.ndarray): Shape (n_samples, n_features).
+        labels (np.ndarray): Class labels.
+        config (module): The configuration module.
+
+    Returns:
+        tuple: (mask, history) - boolean mask of the best-scoring column set,
+            and one dict per round (n_features, kappa, seconds).
+    """
+    values = np.asarray(features.values if isinstance(features, FeatureMatrix) else features)
+    labels = np.asarray(labels)
+    folds = _selection_folds(features, labels, config)
+    fraction = getattr(config, 'SELECTION_RFE_FRACTION', 0.2)
+    patience = getattr(config, 'SELECTION_PATIENCE', 2)
+    min_features = getattr(config, 'SELECTION_MIN_FEATURES', 5)
+
+    remaining = np.arange(values.shape[1])
+    best_kappa, best_columns, stale = -np.inf, remaining, 0
+    history = []
+    print(f"RFE on {len(remaining)} features, {len(folds)} folds")
+    while True:
+        start = time.perf_counter()
+        kappa, models = _cross_validate(values, labels, folds, remaining, config)
+        seconds = time.perf_counter() - start
+        history.append({'n_features': len(remaining), 'kappa': kappa, 'seconds': seconds})
+        print(f"  {len(remaining):>5} features: kappa {kappa:.4f} ({seconds:.1f} s)")
+
+        if kappa > best_kappa:
+            best_kappa, best_columns, stale = kappa, remaining, 0
+        else:
+            stale += 1
+            fraction /= 2
+        if stale >= patience or len(remaining) <= min_features:
+            break
+
+        importance = np.mean([model.feature_importances_ for model in models], axis=0)
+        n_drop = min(max(1, math.ceil(fraction * len(remaining))), len(remaining) - min_features)
+        remaining = np.sort(remaining[np.argsort(importance, kind='stable')[n_drop:]])
+
+    print(f"RFE kept {len(best_columns)} features (kappa {best_kappa:.4f}, "
+          f"{sum(h['seconds'] for h in history):.1f} s total)")
+    mask = np.zeros(values.shape[1], dtype=bool)
+    mask[best_columns] = True
+    return mask, history
+
+
+def permutation_importance_selection(features, labels, config):
+    """
+    Select features by permutation importance, with early stopping.
+
+    Importances are the drop in held-out kappa when a column is shuffled,
+    averaged over the folds (SELECTION_PERMUTATION_REPEATS shuffles per
+    column, columns permuted in parallel). Growing sets of the most important
+    columns (doubling from SELECTION_MIN_FEATURES) are then scored by
+    cross-validated kappa until SELECTION_PATIENCE sets in a row bring no
+    improvement.
+
+    Args:
+        features (FeatureMatrix or np.ndarray): Shape (n_samples, n_features).
+        labels (np.ndarray): Class labels.
+        config (module): The configuration module.
+
+    Returns:
+        tuple: (mask, history) - boolean mask of the best-scoring column set,
+            and one dict per round (n_features, kappa, seconds); the first
+            round is the importance computation.
+    """
+    values = np.asarray(features.values if isinstance(features, FeatureMatrix) else features)
+    labels = np.asarray(labels)
+    folds = _selection_folds(features, labels, config)
+    n_jobs = getattr(config, 'SELECTION_N_JOBS', -1)
+    all_columns = np.arange(values.shape[1])
+
+    start = time.perf_counter()
+    _, models = _cross_validate(values, labels, folds, all_columns, config)
+    scorer = make_scorer(cohen_kappa_score)
+    importance = np.mean([
+        permutation_importance(model, values[test], labels[test], scoring=scorer,
+                               n_repeats=getattr(config, 'SELECTION_PERMUTATION_REPEATS', 3),
+                               random_state=42, n_jobs=n_jobs).importances_mean
+        for model, (_, test) in zip(models, folds)
+    ], axis=0)
+    seconds = time.perf_counter() - start
+    history = [{'n_features': len(all_columns), 'kappa': None, 'seconds': seconds}]
+    print(f"Permutation importance of {len(all_columns)} features ({seconds:.1f} s)")
+
+    order = np.argsort(-importance, kind='stable')
+    patience = getattr(config, 'SELECTION_PATIENCE', 2)
+    size = min(getattr(config, 'SELECTION_MIN_FEATURES', 5), len(order))
+    best_kappa, best_columns, stale = -np.inf, order, 0
+    while True:
+        columns = np.sort(order[:size])
+        start = time.perf_counter()
+        kappa, _ = _cross_validate(values, labels, folds, columns, config)
+        seconds = time.perf_counter() - start
+        history.append({'n_features': size, 'kappa': kappa, 'seconds': seconds})
+        print(f"  top {size:>5} features: kappa {kappa:.4f} ({seconds:.1f} s)")
+        if kappa > best_kappa:
+            best_kappa, best_columns, stale = kappa, columns, 0
+        else:
+            stale += 1
+        if stale >= patience or size == len(order):
+            break
+        size = min(2 * size, len(order))
+
+    print(f"Permutation selection kept {len(best_columns)} features (kappa {best_kappa:.4f})")
+    mask = np.zeros(values.shape[1], dtype=bool)
+    mask[best_columns] = True
+    return mask, history
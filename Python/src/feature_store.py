@@ -0,0 +1,115 @@
+"""
+Feature Store Module
+
+This module provides FeatureStore, an on-disk cache of extracted features
+that lets extract_features compute only what is missing.
+
+Features are stored per (recording, modality, feature family) "cell". A cell
+is keyed by:
+- the content hash of the recording's preprocessed signals for that modality,
+  so changed preprocessing or a re-exported recording invalidates it;
+- the family name and implementation version (FAMILY_VERSIONS in
+  feature_extraction.py), so a changed feature is recomputed;
+- a hash of the config settings the family depends on (FAMILY_PARAMS) and the
+  sampling rate.
+
+Each cell is one FeatureMatrix file (column-major float32, see
+feature_matrix.py), so adding a feature family only writes new files and
+never rewrites the existing ones.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+# Handle both package import and standalone execution
+try:
+    from .feature_matrix import FeatureMatrix
+except ImportError:
+    from feature_matrix import FeatureMatrix
+
+
+def content_hash(array):
+    """
+    Hash an array's shape, dtype and contents.
+
+    Args:
+        array (np.ndarray): e.g. one recording's EEG epochs.
+
+    Returns:
+        str: Hex digest (32 characters).
+    """
+    array = np.ascontiguousarray(array)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{array.shape}|{array.dtype.str}".encode('utf-8'))
+    digest.update(memoryview(array).cast('B'))
+    return digest.hexdigest()
+
+
+def params_hash(params):
+    """Short hash of a dict of settings (JSON-serialised with sorted keys)."""
+    text = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=6).hexdigest()
+
+
+class FeatureStore:
+    """
+    Directory of stored feature cells.
+
+    Layout: <root>/<content hash>/<modality>-<family>-v<version>-<params hash>.fmat
+
+    Attributes:
+        root (str): Store directory.
+        hits (int): Cells loaded from disk since creation.
+        misses (int): Cells computed and written since creation.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(root, exist_ok=True)
+
+    def cell_path(self, record_hash, modality, family, version, params):
+        """Path of the cell for one recording/modality/family/version/settings."""
+        filename = f"{modality}-{family}-v{version}-{params_hash(params)}.fmat"
+        return os.path.join(self.root, record_hash, filename)
+
+    def load(self, path):
+        """Return the stored FeatureMatrix at path, or None if it is missing or unreadable."""
+        if not os.path.exists(path):
+            return None
+        try:
+            return FeatureMatrix.load(path)
+        except (OSError, ValueError) as e:
+            print(f"WARNING: Ignoring unreadable feature store cell {path}: {e}")
+            return None
+
+    def save(self, path, features):
+        """Write a cell atomically (a partial file is never visible under its final name)."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        features.save(tmp_path)
+        os.replace(tmp_path, path)
+
+    def get_or_compute(self, path, compute):
+        """
+        Load a cell, or compute and store it if missing.
+
+        Args:
+            path (str): Cell path from cell_path.
+            compute (callable): Returns the cell's FeatureMatrix.
+
+        Returns:
+            FeatureMatrix: The cell.
+        """
+        features = self.load(path)
+        if features is not None:
+            self.hits += 1
+            return features
+        features = compute()
+        self.save(path, features)
+        self.misses += 1
+        return features
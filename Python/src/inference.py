@@ -1,23 +1,263 @@
 import numpy as np
 import pandas as pd
 import os
+import time
+from sklearn.ensemble import RandomForestClassifier
+
+# Handle both package import and standalone execution
+try:
+    from .classification import cross_validation_folds
+    from .feature_matrix import FeatureMatrix
+    from .metrics import confusion_matrix, encode_labels, metrics_from_confusion
+except ImportError:
+    from classification import cross_validation_folds
+    from feature_matrix import FeatureMatrix
+    from metrics import confusion_matrix, encode_labels, metrics_from_confusion
 
 def make_inference(model, holdout_data, config):
     """
     Makes predictions on the hold-out data using the trained model.
 
+    If the model was trained on a FeatureMatrix (see train_classifier), the
+    hold-out columns are selected by name in the training order, so features
+    added or reordered after training cannot silently shift the inputs.
+
     Args:
         model (object): The trained classification model.
-        holdout_data (np.ndarray): The preprocessed and feature-extracted hold-out data.
+        holdout_data (FeatureMatrix or np.ndarray): The preprocessed and
+            feature-extracted hold-out data.
         config (module): The configuration module.
 
     Returns:
         np.ndarray: Predicted labels for the hold-out data.
     """
     print("Making inference on hold-out data...")
+    holdout_data = prepare_features(model, holdout_data)
     predictions = model.predict(holdout_data)
     return predictions
 
+def prepare_features(model, features):
+    """
+    Turn features into the model's input: align the training columns
+    (align_features), then apply the normalization fitted in training
+    (model.normalizer_, if any).
+
+    Args:
+        model (object): The trained model.
+        features (FeatureMatrix or np.ndarray): The features to predict on.
+
+    Returns:
+        np.ndarray: The values to pass to model.predict.
+    """
+    values = align_features(model, features)
+    normalizer = getattr(model, 'normalizer_', None)
+    if normalizer is not None:
+        record_ids = features.record_ids if isinstance(features, FeatureMatrix) else None
+        values = normalizer.transform(values, record_ids)
+    return values
+
+def align_features(model, features):
+    """
+    Select the columns a model was trained on, in training order.
+
+    Args:
+        model (object): The trained model (may have feature_columns_).
+        features (FeatureMatrix or np.ndarray): The features to predict on.
+
+    Returns:
+        np.ndarray: The feature values to pass to model.predict.
+    """
+    feature_columns = getattr(model, 'feature_columns_', None)
+    if not isinstance(features, FeatureMatrix):
+        if feature_columns is not None and features.shape[1] != len(feature_columns):
+            raise ValueError(f"Model expects {len(feature_columns)} features, got {features.shape[1]}")
+        return features
+    if feature_columns is None:
+        return features.values
+    missing = [c for c in feature_columns if c not in features.columns]
+    if missing:
+        raise ValueError(f"Hold-out features are missing columns used in training: {missing}")
+    return features.select(feature_columns).values
+
+class CascadeClassifier:
+    """
+    Two-stage predictor: a cheap model scores every epoch, and only epochs
+    whose top class probability is below threshold are passed to the full
+    model.
+
+    Both stages take the same (prepared) feature values. The training
+    columns and normalizer of the full model are exposed, so a cascade can
+    be passed to make_inference like any trained model.
+
+    Attributes:
+        cheap (object): Fast model with predict_proba.
+        full (object): Accurate model (e.g. the Random Forest).
+        threshold (float): Minimum cheap-model confidence to skip the full model.
+        escalated_ (float): Fraction of epochs sent to the full model by the last predict.
+    """
+
+    def __init__(self, cheap, full, threshold=0.9):
+        self.cheap = cheap
+        self.full = full
+        self.threshold = threshold
+        self.classes_ = full.classes_
+        self.feature_columns_ = getattr(full, 'feature_columns_', None)
+        self.normalizer_ = getattr(full, 'normalizer_', None)
+        self.escalated_ = None
+
+    def predict(self, X):
+        proba = self.cheap.predict_proba(X)
+        predictions = self.cheap.classes_[np.argmax(proba, axis=1)]
+        uncertain = np.flatnonzero(proba.max(axis=1) < self.threshold)
+        if len(uncertain):
+            predictions[uncertain] = self.full.predict(X[uncertain])
+        self.escalated_ = len(uncertain) / len(X) if len(X) else 0.0
+        return predictions
+
+
+def build_cascade(model, features, labels, config):
+    """
+    Put a small Random Forest (config.CASCADE_CHEAP_TREES trees of depth
+    CASCADE_CHEAP_DEPTH) in front of a trained model.
+
+    Args:
+        model (object): The trained full model.
+        features (FeatureMatrix or np.ndarray): Training features (prepared
+            for the full model with prepare_features).
+        labels (np.ndarray): Training labels.
+        config (module): The configuration module (CASCADE_THRESHOLD).
+
+    Returns:
+        CascadeClassifier: The cascade.
+    """
+    values = prepare_features(model, features)
+    cheap = RandomForestClassifier(
+        n_estimators=getattr(config, 'CASCADE_CHEAP_TREES', 10),
+        max_depth=getattr(config, 'CASCADE_CHEAP_DEPTH', 8),
+        random_state=42,
+        n_jobs=-1
+    ).fit(values, labels)
+    return CascadeClassifier(cheap, model, getattr(config, 'CASCADE_THRESHOLD', 0.9))
+
+
+def _kappa(labels, *predictions):
+    """Cohen's kappa of each prediction array against labels (any class labels)."""
+    true_indices, pred_indices, names = encode_labels(labels, np.concatenate(predictions))
+    cms = [confusion_matrix(true_indices, p, len(names)) for p in np.split(pred_indices, len(predictions))]
+    return metrics_from_confusion(np.stack(cms))['kappa']
+
+
+def tune_cascade_threshold(cascade, features, labels, max_kappa_loss=0.01, thresholds=None):
+    """
+    Set the lowest threshold whose Cohen's kappa is within max_kappa_loss of
+    the full model on validation data.
+
+    Both models score the validation epochs once; every candidate threshold
+    is then evaluated by masking.
+
+    Args:
+        cascade (CascadeClassifier): The cascade to tune (threshold is updated).
+        features (FeatureMatrix or np.ndarray): Validation features.
+        labels (np.ndarray): Validation labels.
+        max_kappa_loss (float): Allowed kappa drop versus the full model.
+        thresholds (array-like): Candidates (default 0.30 to 1.00 in 0.01 steps).
+
+    Returns:
+        list: One dict per candidate (threshold, kappa, escalated).
+    """
+    values = prepare_features(cascade, features)
+    labels = np.asarray(labels)
+    proba = cascade.cheap.predict_proba(values)
+    confidence = proba.max(axis=1)
+    cheap_predictions = cascade.cheap.classes_[np.argmax(proba, axis=1)]
+    full_predictions = cascade.full.predict(values)
+
+    if thresholds is None:
+        thresholds = np.round(np.arange(0.30, 1.001, 0.01), 2)
+    escalate = confidence[np.newaxis, :] < np.asarray(thresholds, dtype=np.float64)[:, np.newaxis]
+    candidates = np.where(escalate, full_predictions, cheap_predictions)
+    full_kappa, *kappas = _kappa(labels, full_predictions, *candidates)
+    table = [{'threshold': float(threshold), 'kappa': float(kappa), 'escalated': float(mask.mean())}
+             for threshold, kappa, mask in zip(thresholds, kappas, escalate)]
+    # Past the top confidence everything is escalated, which always qualifies
+    eligible = [row for row in table if row['kappa'] >= full_kappa - max_kappa_loss]
+    best = min(eligible, key=lambda row: row['escalated']) if eligible else table[-1]
+    cascade.threshold = best['threshold']
+    print(f"Cascade threshold {best['threshold']:.2f}: kappa {best['kappa']:.3f} "
+          f"(full model {full_kappa:.3f}), {best['escalated']:.1%} of epochs escalated")
+    return table
+
+
+def compare_cascade(cascade, features, labels=None):
+    """
+    Time the cascade against full-model inference on the same epochs.
+
+    Args:
+        cascade (CascadeClassifier): The cascade.
+        features (FeatureMatrix or np.ndarray): Features to predict on.
+        labels (np.ndarray): True labels, to report Cohen's kappa (optional).
+
+    Returns:
+        dict: full_seconds, cascade_seconds, speedup, escalated, agreement
+            (fraction of epochs where both predict the same stage) and, with
+            labels, full_kappa and cascade_kappa.
+    """
+    values = prepare_features(cascade, features)
+    start = time.perf_counter()
+    full_predictions = cascade.full.predict(values)
+    full_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    cascade_predictions = cascade.predict(values)
+    cascade_seconds = time.perf_counter() - start
+
+    report = {
+        'full_seconds': full_seconds,
+        'cascade_seconds': cascade_seconds,
+        'speedup': full_seconds / cascade_seconds if cascade_seconds > 0 else float('inf'),
+        'escalated': cascade.escalated_,
+        'agreement': float(np.mean(full_predictions == cascade_predictions)),
+    }
+    kappa = ""
+    if labels is not None:
+        full_kappa, cascade_kappa = _kappa(np.asarray(labels), full_predictions, cascade_predictions)
+        report['full_kappa'], report['cascade_kappa'] = float(full_kappa), float(cascade_kappa)
+        kappa = f", kappa {cascade_kappa:.3f} vs {full_kappa:.3f} full"
+    print(f"Cascade inference: {cascade_seconds:.3f} s vs {full_seconds:.3f} s full "
+          f"({report['speedup']:.1f}x), {report['escalated']:.1%} escalated, "
+          f"{report['agreement']:.1%} agreement{kappa}")
+    return report
+
+def train_cascade(model, features, labels, config):
+    """
+    Build a cascade in front of a trained model with a validated threshold.
+
+    One fold of cross_validation_folds (grouped by recording when the
+    features carry record ids) is held out: the cheap model is fitted on
+    the other rows, and its threshold is tuned by kappa
+    (config.CASCADE_MAX_KAPPA_LOSS) and timed on the held-out rows. The
+    full model has seen those rows in training, so its held-out kappa is
+    optimistic and the tuned threshold errs towards escalating.
+
+    Args:
+        model (object): The trained full model.
+        features (FeatureMatrix or np.ndarray): Training features.
+        labels (np.ndarray): Training labels.
+        config (module): The configuration module.
+
+    Returns:
+        tuple: (cascade, report) with the compare_cascade report of the
+            held-out rows.
+    """
+    labels = np.asarray(labels)
+    record_ids = features.record_ids if isinstance(features, FeatureMatrix) else None
+    train, validation = cross_validation_folds(labels, record_ids, getattr(config, 'CV_FOLDS', 5))[0]
+    cascade = build_cascade(model, features[train], labels[train], config)
+    tune_cascade_threshold(cascade, features[validation], labels[validation],
+                           max_kappa_loss=getattr(config, 'CASCADE_MAX_KAPPA_LOSS', 0.01))
+    report = compare_cascade(cascade, features[validation], labels[validation])
+    return cascade, report
+
+
 def generate_submission_file(predictions, record_numbers, epoch_numbers, config):
     """
     Generates a submission CSV file.
@@ -0,0 +1,192 @@
+"""
+Metrics Module
+
+Sleep scoring metrics derived from a single confusion matrix.
+
+The confusion matrix is built once with one bincount; accuracy, Cohen's
+kappa and per-stage sensitivity, specificity, precision and F1 are all
+computed from its counts. metrics_from_confusion works on a stack of
+matrices, so bootstrap confidence intervals resample the confusion counts
+(one multinomial draw per replicate) and evaluate every replicate in one
+vectorized pass instead of re-scoring resampled epochs.
+"""
+
+import warnings
+
+import numpy as np
+
+# Handle both package import and standalone execution
+try:
+    from .feature_matrix import record_groups
+except ImportError:
+    from feature_matrix import record_groups
+
+# Sleep stage labels and names (0=Wake, 1=N1, 2=N2, 3=N3, 4=REM)
+STAGE_NAMES = ('Wake', 'N1', 'N2', 'N3', 'REM')
+
+
+def confusion_matrix(y_true, y_pred, n_classes=len(STAGE_NAMES)):
+    """
+    Confusion matrix of integer labels 0 .. n_classes-1.
+
+    Returns:
+        np.ndarray: Shape (n_classes, n_classes), rows are true stages and
+            columns predicted stages.
+    """
+    y_true = np.asarray(y_true, dtype=np.int64)
+    y_pred = np.asarray(y_pred, dtype=np.int64)
+    if len(y_true) and (min(y_true.min(), y_pred.min()) < 0 or max(y_true.max(), y_pred.max()) >= n_classes):
+        raise ValueError(f"Labels must be integers in 0..{n_classes - 1}")
+    counts = np.bincount(y_true * n_classes + y_pred, minlength=n_classes * n_classes)
+    return counts.reshape(n_classes, n_classes)
+
+
+def encode_labels(y_true, y_pred):
+    """
+    Map stage labels to confusion matrix indices.
+
+    Integer stages 0..4 keep their index and all five stages are always
+    included; any other label seen in y_true or y_pred (e.g. a movement
+    stage, or string labels) gets an index of its own, in sorted order.
+
+    Returns:
+        tuple: (true_indices, pred_indices, names) where names[i] is the
+            stage name of index i.
+    """
+    y_true, y_pred = np.asarray(y_true), np.asarray(y_pred)
+    classes = np.union1d(y_true, y_pred)
+    if classes.dtype.kind == 'f' and np.all(classes == np.round(classes)):
+        classes = classes.astype(np.int64)
+    if classes.dtype.kind in 'iu':
+        classes = np.union1d(np.arange(len(STAGE_NAMES)), classes)
+        names = [STAGE_NAMES[c] if 0 <= c < len(STAGE_NAMES) else str(c) for c in classes]
+    else:
+        names = [str(c) for c in classes]
+    return np.searchsorted(classes, y_true), np.searchsorted(classes, y_pred), names
+
+
+def _divide(a, b):
+    """a / b, nan where b is 0."""
+    a, b = np.broadcast_arrays(np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64))
+    return np.divide(a, b, out=np.full(a.shape, np.nan), where=b != 0)
+
+
+def metrics_from_confusion(cm):
+    """
+    All metrics of one confusion matrix or a stack of them.
+
+    Per-stage values are nan for stages without true (sensitivity) or
+    predicted (precision) epochs. Macro F1 averages the stages that occur in
+    the labels or the predictions, as scikit-learn's f1_score does.
+
+    Args:
+        cm (np.ndarray): Shape (..., n_classes, n_classes).
+
+    Returns:
+        dict: accuracy, kappa, macro_f1, weighted_f1 with shape (...), and
+            support, sensitivity, specificity, precision, f1 with shape
+            (..., n_classes).
+    """
+    cm = np.asarray(cm, dtype=np.float64)
+    n = cm.sum(axis=(-2, -1))
+    tp = np.diagonal(cm, axis1=-2, axis2=-1)
+    support = cm.sum(axis=-1)
+    predicted = cm.sum(axis=-2)
+    fp = predicted - tp
+    tn = n[..., np.newaxis] - support - fp
+
+    accuracy = _divide(tp.sum(axis=-1), n)
+    expected = _divide((support * predicted).sum(axis=-1), n**2)
+    kappa = _divide(accuracy - expected, 1.0 - expected)
+
+    sensitivity = _divide(tp, support)
+    specificity = _divide(tn, tn + fp)
+    precision = _divide(tp, predicted)
+    # F1 = 2TP / (2TP + FP + FN); 0 for stages that occur but are never hit
+    f1 = _divide(2 * tp, support + predicted)
+    present = (support + predicted) > 0
+    macro_f1 = _divide(np.where(present, f1, 0.0).sum(axis=-1), present.sum(axis=-1))
+    weighted_f1 = _divide((np.nan_to_num(f1) * support).sum(axis=-1), n)
+
+    return {
+        'accuracy': accuracy,
+        'kappa': kappa,
+        'macro_f1': macro_f1,
+        'weighted_f1': weighted_f1,
+        'support': support,
+        'sensitivity': sensitivity,
+        'specificity': specificity,
+        'precision': precision,
+        'f1': f1,
+    }
+
+
+def bootstrap_intervals(cm, n_bootstrap=1000, confidence=0.95, seed=42):
+    """
+    Percentile bootstrap confidence intervals from confusion counts.
+
+    Each replicate draws n epochs from the observed (true, predicted) cell
+    frequencies, which is the same as resampling epochs with replacement,
+    but needs one multinomial draw per replicate instead of the epochs.
+
+    Args:
+        cm (np.ndarray): Confusion matrix (n_classes, n_classes).
+        n_bootstrap (int): Number of replicates.
+        confidence (float): Interval coverage.
+        seed (int): Random seed.
+
+    Returns:
+        dict: Metric name -> (low, high) arrays, for every metric of
+            metrics_from_confusion. Replicates where a metric is undefined
+            are ignored for it.
+    """
+    cm = np.asarray(cm)
+    n = int(cm.sum())
+    rng = np.random.default_rng(seed)
+    samples = rng.multinomial(n, cm.ravel() / n, size=n_bootstrap).reshape((n_bootstrap,) + cm.shape)
+    replicates = metrics_from_confusion(samples)
+    tail = (1.0 - confidence) / 2 * 100
+    intervals = {}
+    with warnings.catch_warnings():
+        # Entries never defined (e.g. a stage without epochs) stay nan
+        warnings.simplefilter('ignore', RuntimeWarning)
+        for name, values in replicates.items():
+            low, high = np.nanpercentile(values, [tail, 100 - tail], axis=0)
+            intervals[name] = (low, high)
+    return intervals
+
+
+def classification_metrics(y_true, y_pred, record_ids=None, n_classes=len(STAGE_NAMES),
+                           n_bootstrap=0, confidence=0.95):
+    """
+    Metrics for a set of predictions, optionally per recording and with
+    bootstrap confidence intervals.
+
+    Args:
+        y_true (np.ndarray): True stages (0 .. n_classes-1).
+        y_pred (np.ndarray): Predicted stages.
+        record_ids (array-like): Record id per epoch (optional).
+        n_classes (int): Number of stages.
+        n_bootstrap (int): Bootstrap replicates (0 for no intervals).
+        confidence (float): Interval coverage.
+
+    Returns:
+        dict: 'confusion' plus the entries of metrics_from_confusion,
+            'intervals' (if n_bootstrap > 0) and 'per_record' (record id ->
+            metrics_from_confusion dict with its 'confusion'; if record_ids
+            is given).
+    """
+    y_true = np.asarray(y_true)
+    y_pred = np.asarray(y_pred)
+    cm = confusion_matrix(y_true, y_pred, n_classes)
+    result = {'confusion': cm, **metrics_from_confusion(cm)}
+    if n_bootstrap:
+        result['intervals'] = bootstrap_intervals(cm, n_bootstrap, confidence)
+    if record_ids is not None:
+        record_ids = np.asarray(record_ids)
+        result['per_record'] = {}
+        for rows in record_groups(record_ids, len(y_true)):
+            record_cm = confusion_matrix(y_true[rows], y_pred[rows], n_classes)
+            result['per_record'][str(record_ids[rows[0]])] = {'confusion': record_cm,
+                                                              **metrics_from_confusion(record_cm)}
+    return result
@@ -0,0 +1,331 @@
+"""
+Normalization Module
+
+Dataset-wide statistics and normalization for signals and features.
+
+RunningStats accumulates per-column statistics in one pass without keeping
+the data: mean and variance with Welford/Chan updates, and quantiles with a
+fixed-size weighted sample sketch. Accumulators are mergeable, so they can be
+updated recording by recording (e.g. in load_all_training_data) or in
+parallel shards and combined afterwards.
+
+Normalizer turns the statistics into a normalization stage: it is fitted in
+train_classifier (config.FEATURE_NORMALIZATION), stored on the model as
+model.normalizer_ and applied again at inference by prepare_features.
+"""
+
+import numpy as np
+
+# Handle both package import and standalone execution
+try:
+    from .feature_matrix import FeatureMatrix, record_groups
+except ImportError:
+    from feature_matrix import FeatureMatrix, record_groups
+
+
+def _weighted_quantiles(values, weights, levels):
+    """
+    Quantiles of every column of a weighted sample.
+
+    Args:
+        values (np.ndarray): Sample, shape (m, n_columns).
+        weights (np.ndarray): Weight of each sample row, shape (m,).
+        levels (np.ndarray): Quantile levels in [0, 1], shape (k,).
+
+    Returns:
+        np.ndarray: Shape (k, n_columns), linearly interpolated between the
+            weighted mid-points of the sorted sample.
+    """
+    m, n_columns = values.shape
+    levels = np.asarray(levels, dtype=np.float64)
+    if m == 1:
+        return np.repeat(values, len(levels), axis=0)
+    order = np.argsort(values, axis=0)
+    sorted_values = np.take_along_axis(values, order, axis=0)
+    w = weights[order]
+    position = (np.cumsum(w, axis=0) - w / 2) / weights.sum()
+
+    # One searchsorted for all columns: column c occupies keys [c, c + 1)
+    offsets = np.arange(n_columns)
+    keys = (position + offsets).T.ravel()
+    flat_values = sorted_values.T.ravel()
+    queries = (np.clip(levels, 0.0, 1.0 - 1e-12)[np.newaxis, :] + offsets[:, np.newaxis]).ravel()
+    first = np.repeat(offsets * m, len(levels))
+    hi = np.clip(np.searchsorted(keys, queries), first + 1, first + m - 1)
+    lo = hi - 1
+    span = keys[hi] - keys[lo]
+    frac = np.clip(np.divide(queries - keys[lo], span, out=np.zeros_like(span), where=span > 0), 0.0, 1.0)
+    result = flat_values[lo] + frac * (flat_values[hi] - flat_values[lo])
+    return result.reshape(n_columns, len(levels)).T
+
+
+class RunningStats:
+    """
+    One-pass, mergeable per-column statistics.
+
+    Values must be finite. Quantiles come from a sketch of at most
+    2 x sketch_size weighted rows per column; when it is full it is compacted
+    to sketch_size rows at evenly spaced quantile levels, so memory is fixed
+    whatever the number of rows seen.
+
+    Attributes:
+        count (int): Number of rows seen.
+        mean (np.ndarray): Column means.
+        sketch_size (int): Rows kept after each compaction.
+    """
+
+    def __init__(self, sketch_size=256):
+        self.sketch_size = sketch_size
+        self.count = 0
+        self.mean = None
+        self._m2 = None
+        self._sketch = None
+        self._weights = None
+
+    def update(self, values):
+        """
+        Add a batch of rows.
+
+        Args:
+            values (np.ndarray): Shape (n_rows, n_columns) or (n_rows,).
+
+        Returns:
+            RunningStats: self.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if values.ndim == 1:
+            values = values[:, np.newaxis]
+        if len(values) == 0:
+            return self
+        batch = RunningStats(self.sketch_size)
+        batch.count = len(values)
+        batch.mean = values.mean(axis=0)
+        batch._m2 = np.square(values - batch.mean).sum(axis=0)
+        batch._sketch = values
+        batch._weights = np.ones(len(values))
+        return self.merge(batch)
+
+    def merge(self, other):
+        """
+        Combine another accumulator into this one (e.g. from another shard).
+
+        Returns:
+            RunningStats: self.
+        """
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self._m2 = other.count, other.mean.copy(), other._m2.copy()
+            # Copy: a sketch from update() may still be the caller's buffer
+            self._sketch, self._weights = other._sketch.copy(), other._weights.copy()
+        else:
+            # Chan et al. pairwise update of the mean and sum of squared deviations
+            count = self.count + other.count
+            delta = other.mean - self.mean
+            self.mean = self.mean + delta * (other.count / count)
+            self._m2 = self._m2 + other._m2 + delta**2 * (self.count * other.count / count)
+            self.count = count
+            self._sketch = np.concatenate([self._sketch, other._sketch])
+            self._weights = np.concatenate([self._weights, other._weights])
+        if len(self._weights) > 2 * self.sketch_size:
+            self._compact()
+        return self
+
+    @classmethod
+    def combine(cls, parts):
+        """Merge a sequence of accumulators into a new one."""
+        total = cls(parts[0].sketch_size if parts else 256)
+        for part in parts:
+            total.merge(part)
+        return total
+
+    def _compact(self):
+        levels = (np.arange(self.sketch_size) + 0.5) / self.sketch_size
+        total = self._weights.sum()
+        self._sketch = _weighted_quantiles(self._sketch, self._weights, levels)
+        self._weights = np.full(self.sketch_size, total / self.sketch_size)
+
+    @property
+    def var(self):
+        """Population variance of each column."""
+        return self._m2 / self.count
+
+    @property
+    def std(self):
+        return np.sqrt(self.var)
+
+    def quantile(self, q):
+        """
+        Approximate quantiles of each column.
+
+        Args:
+            q (float or array-like): Quantile level(s) in [0, 1].
+
+        Returns:
+            np.ndarray: Shape (n_columns,) for a scalar q, else (len(q), n_columns).
+        """
+        if self.count == 0:
+            raise ValueError("No values have been added")
+        result = _weighted_quantiles(self._sketch, self._weights, np.atleast_1d(q))
+        return result[0] if np.ndim(q) == 0 else result
+
+
+def update_signal_statistics(stats, multi_channel_data):
+    """
+    Update per-channel signal statistics with one recording.
+
+    Args:
+        stats (dict): Modality -> RunningStats (missing entries are created).
+        multi_channel_data (dict): Modality -> epochs (n_epochs, n_channels, n_samples).
+
+    Returns:
+        dict: stats.
+    """
+    for modality, x in multi_channel_data.items():
+        n_channels = x.shape[1]
+        stats.setdefault(modality, RunningStats()).update(x.transpose(0, 2, 1).reshape(-1, n_channels))
+    return stats
+
+
+def normalize_signals(multi_channel_data, stats, method='zscore'):
+    """
+    Normalize each channel with dataset-wide statistics (see update_signal_statistics).
+
+    Returns:
+        dict: Modality -> normalized epochs (modalities without statistics are unchanged).
+    """
+    normalized = {}
+    for modality, x in multi_channel_data.items():
+        if modality not in stats:
+            normalized[modality] = x
+            continue
+        center, scale = location_scale(stats[modality], method)
+        normalized[modality] = (x - center[:, np.newaxis]) / scale[:, np.newaxis]
+    return normalized
+
+
+NORMALIZATION_METHODS = ('zscore', 'robust')
+
+
+def location_scale(stats, method='zscore'):
+    """
+    Centre and scale for a normalization method.
+
+    'zscore' uses the mean and standard deviation; 'robust' uses the median
+    and the interquartile range divided by 1.349 (the standard deviation for
+    normally distributed data). Zero scales are replaced by 1.
+
+    Returns:
+        tuple: (center, scale) arrays of shape (n_columns,).
+    """
+    if method == 'zscore':
+        center, scale = stats.mean, stats.std
+    elif method == 'robust':
+        q25, q50, q75 = stats.quantile([0.25, 0.5, 0.75])
+        center, scale = q50, (q75 - q25) / 1.349
+    else:
+        raise ValueError(f"Unknown normalization method: {method}. Valid: {NORMALIZATION_METHODS}")
+    return center, np.where(scale > 0, scale, 1.0)
+
+
+class Normalizer:
+    """
+    Feature normalization stage fitted on training features.
+
+    scope='dataset': centre and scale come from the training set (accumulated
+    recording by recording with RunningStats) and are reused at inference.
+    scope='recording': every recording is normalized with its own statistics,
+    at training and at inference; nothing is learned from the training set.
+
+    Attributes:
+        method (str): 'zscore' or 'robust'.
+        scope (str): 'dataset' or 'recording'.
+        columns (list): Column names seen in fit (None for plain arrays).
+        stats (RunningStats): Training statistics (dataset scope).
+        center_, scale_ (np.ndarray): Fitted parameters (dataset scope).
+    """
+
+    def __init__(self, method='zscore', scope='dataset', sketch_size=256):
+        if method not in NORMALIZATION_METHODS:
+            raise ValueError(f"Unknown normalization method: {method}. Valid: {NORMALIZATION_METHODS}")
+        if scope not in ('dataset', 'recording'):
+            raise ValueError(f"Unknown normalization scope: {scope}. Valid: ('dataset', 'recording')")
+        self.method = method
+        self.scope = scope
+        self.sketch_size = sketch_size
+        self.columns = None
+        self.stats = None
+        self.center_ = None
+        self.scale_ = None
+
+    def fit(self, features, record_ids=None):
+        """
+        Fit on training features.
+
+        Args:
+            features (FeatureMatrix or np.ndarray): Training features.
+            record_ids (array-like): Record id per row (optional; taken from
+                the FeatureMatrix when not given).
+
+        Returns:
+            Normalizer: self.
+        """
+        values, record_ids = self._unpack(features, record_ids)
+        if isinstance(features, FeatureMatrix):
+            self.columns = list(features.columns)
+        if self.scope == 'dataset':
+            parts = [RunningStats(self.sketch_size).update(values[rows])
+                     for rows in record_groups(record_ids, len(values))]
+            self.stats = RunningStats.combine(parts)
+            self.center_, self.scale_ = location_scale(self.stats, self.method)
+        return self
+
+    def transform(self, features, record_ids=None):
+        """
+        Normalize features.
+
+        Args:
+            features (FeatureMatrix or np.ndarray): Features to normalize. A
+                FeatureMatrix is reduced to the fitted columns by name; an
+                array must be in the fitted column order.
+            record_ids (array-like): Record id per row (recording scope;
+                taken from the FeatureMatrix when not given).
+
+        Returns:
+            Same type as features, normalized (FeatureMatrix values stay float32).
+        """
+        if isinstance(features, FeatureMatrix) and self.columns is not None and features.columns != self.columns:
+            features = features.select(self.columns)
+        values, record_ids = self._unpack(features, record_ids)
+        if self.scope == 'dataset':
+            if self.center_ is None:
+                raise ValueError("Normalizer is not fitted")
+            normalized = (values - self.center_) / self.scale_
+        else:
+            normalized = np.empty_like(values)
+            for rows in record_groups(record_ids, len(values)):
+                center, scale = location_scale(RunningStats(self.sketch_size).update(values[rows]), self.method)
+                normalized[rows] = (values[rows] - center) / scale
+
+        if isinstance(features, FeatureMatrix):
+            return FeatureMatrix(normalized.astype(np.float32), features.columns, features.modalities,
+                                 features.channels, features.record_codes, features.record_names)
+        return normalized
+
+    def fit_transform(self, features, record_ids=None):
+        return self.fit(features, record_ids).transform(features, record_ids)
+
+    def _unpack(self, features, record_ids):
+        if isinstance(features, FeatureMatrix):
+            if record_ids is None and features.record_codes is not None:
+                record_ids = features.record_ids
+            return np.asarray(features.values, dtype=np.float64), record_ids
+        return np.asarray(features, dtype=np.float64), record_ids
+
+
+def make_normalizer(config):
+    """Normalizer configured by config.FEATURE_NORMALIZATION (None when disabled)."""
+    method = getattr(config, 'FEATURE_NORMALIZATION', None)
+    if not method:
+        return None
+    return Normalizer(method, getattr(config, 'FEATURE_NORMALIZATION_SCOPE', 'dataset'))
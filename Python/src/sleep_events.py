@@ -0,0 +1,313 @@
+"""
+Sleep Event Detection Module
+
+Detectors for transient sleep events (sleep spindles, K-complexes, eye
+movements, EMG twitches) and the EMG tone envelope, all running on the
+continuous signal of a whole night at once instead of epoch by epoch:
+- the epochs of a recording are joined into one continuous signal per channel;
+- filtering, envelopes and thresholds are computed with whole-array NumPy and
+  SciPy operations;
+- candidate events are found as runs of a boolean mask (find_runs), with no
+  Python loop over samples or epochs;
+- events are mapped back to the epoch that contains their centre
+  (events_per_epoch), giving per-epoch counts and mean event properties.
+
+Thresholds are relative to robust statistics of the whole recording (median
+envelope, median absolute deviation), so they adapt to each recording's
+amplitude scale and do not depend on the signal units.
+"""
+
+import numpy as np
+from scipy.signal import butter, sosfiltfilt
+
+
+def continuous_signal(x):
+    """
+    Join consecutive epochs into one continuous signal per channel.
+
+    Args:
+        x (np.ndarray): Epochs, shape (n_epochs, n_channels, n_samples).
+
+    Returns:
+        np.ndarray: Shape (n_channels, n_epochs * n_samples).
+    """
+    n_epochs, n_channels, n_samples = x.shape
+    return np.ascontiguousarray(x.transpose(1, 0, 2)).reshape(n_channels, n_epochs * n_samples)
+
+
+def bandpass(signal, fs, low, high, order=4):
+    """Zero-phase Butterworth band-pass filter along the last axis."""
+    sos = butter(order, [low, high], btype='bandpass', fs=fs, output='sos')
+    return sosfiltfilt(sos, signal, axis=-1)
+
+
+def rolling_rms(signal, window):
+    """
+    Centred moving RMS along the last axis in O(n), from a cumulative sum.
+
+    Windows are truncated at the signal edges (the mean is taken over the
+    samples that exist), so the output has the same shape as the input.
+
+    Args:
+        signal (np.ndarray): Shape (..., n_samples).
+        window (int): Window length in samples.
+
+    Returns:
+        np.ndarray: RMS envelope, same shape as signal.
+    """
+    return np.sqrt(rolling_mean(np.square(signal, dtype=np.float64), window))
+
+
+def rolling_mean(signal, window):
+    """Centred moving average along the last axis in O(n) (see rolling_rms)."""
+    n = signal.shape[-1]
+    window = max(1, min(int(window), n))
+    csum = np.zeros(signal.shape[:-1] + (n + 1,), dtype=np.float64)
+    np.cumsum(signal, axis=-1, out=csum[..., 1:])
+    half = window // 2
+    starts = np.clip(np.arange(n) - half, 0, n)
+    stops = np.clip(np.arange(n) - half + window, 0, n)
+    return (csum[..., stops] - csum[..., starts]) / (stops - starts)
+
+
+def find_runs(mask, min_length=1, max_length=None):
+    """
+    Find runs of True along the last axis of a 2-D mask.
+
+    Args:
+        mask (np.ndarray): Boolean array, shape (n_rows, n_samples).
+        min_length (int): Shortest run kept, in samples.
+        max_length (int): Longest run kept, in samples (None = no limit).
+
+    Returns:
+        tuple: (rows, starts, stops) integer arrays; run i covers
+            mask[rows[i], starts[i]:stops[i]].
+    """
+    edges = np.diff(np.pad(mask, ((0, 0), (1, 1))).astype(np.int8), axis=-1)
+    # Rising and falling edges come in the same row-major order, so they pair up
+    rows, starts = np.nonzero(edges == 1)
+    _, stops = np.nonzero(edges == -1)
+    lengths = stops - starts
+    keep = lengths >= min_length
+    if max_length is not None:
+        keep &= lengths <= max_length
+    return rows[keep], starts[keep], stops[keep]
+
+
+def segment_reduce(signal, rows, starts, stops, reduce=np.maximum):
+    """
+    Reduce signal[rows[i], starts[i]:stops[i]] for every run at once.
+
+    Args:
+        signal (np.ndarray): Shape (n_rows, n_samples).
+        rows, starts, stops (np.ndarray): Runs from find_runs.
+        reduce (np.ufunc): e.g. np.maximum, np.minimum, np.add.
+
+    Returns:
+        np.ndarray: One value per run.
+    """
+    if len(rows) == 0:
+        return np.zeros(0, dtype=signal.dtype)
+    flat = signal.reshape(-1)
+    offsets = rows * signal.shape[-1]
+    # reduceat over the flattened signal; every run is non-empty
+    bounds = np.column_stack([offsets + starts, offsets + stops]).reshape(-1)
+    if bounds[-1] == flat.size:
+        flat = np.append(flat, 0)
+    return reduce.reduceat(flat, bounds)[::2]
+
+
+def events_per_epoch(rows, centres, values, n_epochs, n_channels, epoch_samples):
+    """
+    Count events per (epoch, channel) and average an event property.
+
+    Args:
+        rows (np.ndarray): Channel of each event.
+        centres (np.ndarray): Sample index of each event's centre.
+        values (np.ndarray): Property of each event (e.g. amplitude).
+        n_epochs, n_channels, epoch_samples (int): Layout of the recording.
+
+    Returns:
+        tuple: (counts, mean_values), each of shape (n_epochs, n_channels);
+            mean_values is 0 where there are no events.
+    """
+    epochs = np.minimum(centres // epoch_samples, n_epochs - 1)
+    cells = epochs * n_channels + rows
+    size = n_epochs * n_channels
+    counts = np.bincount(cells, minlength=size).reshape(n_epochs, n_channels)
+    sums = np.bincount(cells, weights=values, minlength=size).reshape(n_epochs, n_channels)
+    means = np.divide(sums, counts, out=np.zeros(sums.shape), where=counts > 0)
+    return counts.astype(np.float64), means
+
+
+def robust_scale(signal):
+    """Per-row robust standard deviation (1.4826 x median absolute deviation)."""
+    median = np.median(signal, axis=-1, keepdims=True)
+    return 1.4826 * np.median(np.abs(signal - median), axis=-1)
+
+
+def suppress_satellites(events, min_gap):
+    """
+    Of two neighbouring events on the same row that start less than min_gap
+    samples apart, keep only the one with the larger amplitude.
+
+    Band-pass filtering makes large transients ring, which shows up as
+    smaller events just before and after them.
+
+    Args:
+        events (dict): 'rows', 'starts', 'stops', 'amplitude' arrays in
+            find_runs order.
+        min_gap (int): Minimum distance between event starts, in samples.
+
+    Returns:
+        dict: The events that are kept.
+    """
+    rows, starts, amplitude = events['rows'], events['starts'], events['amplitude']
+    if len(rows) < 2:
+        return events
+    close = (rows[1:] == rows[:-1]) & (starts[1:] - starts[:-1] < min_gap)
+    smaller = np.r_[False, close & (amplitude[:-1] > amplitude[1:])]
+    smaller |= np.r_[close & (amplitude[1:] >= amplitude[:-1]), False]
+    return {name: values[~smaller] for name, values in events.items()}
+
+
+def detect_spindles(signal, fs, band=(11.0, 16.0), threshold=2.5, window=0.3,
+                    min_duration=0.5, max_duration=2.0):
+    """
+    Detect sleep spindles on continuous EEG.
+
+    A spindle is a run where the moving RMS of the sigma-band signal exceeds
+    threshold x its median over the recording, lasting min_duration to
+    max_duration seconds.
+
+    Args:
+        signal (np.ndarray): Continuous EEG, shape (n_channels, n_samples).
+        fs (float): Sampling rate in Hz.
+        band (tuple): Spindle frequency band in Hz.
+        threshold (float): Multiple of the median RMS envelope.
+        window (float): RMS window in seconds.
+        min_duration, max_duration (float): Spindle duration limits in seconds.
+
+    Returns:
+        dict: 'rows', 'starts', 'stops' (samples), 'amplitude' (peak RMS).
+    """
+    sigma = bandpass(signal, fs, *band)
+    envelope = rolling_rms(sigma, round(window * fs))
+    level = threshold * np.median(envelope, axis=-1, keepdims=True)
+    rows, starts, stops = find_runs(envelope > level, round(min_duration * fs), round(max_duration * fs))
+    amplitude = segment_reduce(envelope, rows, starts, stops, np.maximum)
+    return {'rows': rows, 'starts': starts, 'stops': stops, 'amplitude': amplitude}
+
+
+def detect_kcomplexes(signal, fs, band=(0.5, 4.0), threshold=4.0, min_duration=0.25,
+                      max_duration=1.0, rebound=1.0):
+    """
+    Detect K-complexes on continuous EEG.
+
+    A K-complex is a sharp negative wave of the low-frequency signal below
+    -threshold x its robust standard deviation (lasting min_duration to
+    max_duration seconds), followed within rebound seconds of the end of the
+    negative wave by a positive deflection, with a peak-to-peak amplitude of at least
+    2 x threshold robust standard deviations.
+
+    Args:
+        signal (np.ndarray): Continuous EEG, shape (n_channels, n_samples).
+        fs (float): Sampling rate in Hz.
+        band (tuple): K-complex frequency band in Hz.
+        threshold (float): Trough depth in robust standard deviations.
+        min_duration, max_duration (float): Limits of the negative wave in seconds.
+        rebound (float): Window after the negative wave searched for the positive peak, in seconds.
+
+    Returns:
+        dict: 'rows', 'starts', 'stops' (samples), 'amplitude' (peak-to-peak).
+    """
+    slow = bandpass(signal, fs, *band)
+    scale = robust_scale(slow)[:, np.newaxis]
+    rows, starts, stops = find_runs(slow < -threshold * scale, round(min_duration * fs), round(max_duration * fs))
+    empty = {'rows': rows, 'starts': starts, 'stops': stops, 'amplitude': np.zeros(0)}
+    if len(rows) == 0:
+        return empty
+
+    trough = segment_reduce(slow, rows, starts, stops, np.minimum)
+    # Positive peak in the rebound window after each negative wave
+    n_rebound = max(1, round(rebound * fs))
+    index = np.minimum(stops[:, np.newaxis] + np.arange(n_rebound), slow.shape[-1] - 1)
+    peak = slow[rows[:, np.newaxis], index].max(axis=1)
+    amplitude = peak - trough
+    keep = amplitude >= 2 * threshold * scale[rows, 0]
+    events = {'rows': rows[keep], 'starts': starts[keep], 'stops': stops[keep], 'amplitude': amplitude[keep]}
+    # Filter ringing around a large K-complex gives smaller satellite waves
+    return suppress_satellites(events, 2 * n_rebound)
+
+
+def detect_eye_movements(left, right, fs, band=(0.3, 5.0), threshold=3.0,
+                         min_duration=0.06, max_duration=1.0, refractory=0.3):
+    """
+    Detect conjugate eye movements on continuous left/right EOG.
+
+    The eyes move together, so an eye movement deflects the two EOG channels
+    in opposite directions. An event is a run where the velocity (first
+    difference of the band-passed signal) of both channels exceeds threshold
+    x its robust standard deviation with opposite signs, lasting min_duration
+    to max_duration seconds. Same-polarity deflections (EEG or movement
+    artifacts reaching both electrodes) are ignored.
+
+    With the defaults this detects rapid eye movements; slow eye movements use
+    a lower band and longer durations (see eye_movement_feature_family).
+
+    Args:
+        left, right (np.ndarray): Continuous EOG, shape (n_rows, n_samples),
+            e.g. one row per channel pair.
+        fs (float): Sampling rate in Hz.
+        band (tuple): Band-pass applied before differentiation, in Hz.
+        threshold (float): Velocity threshold in robust standard deviations.
+        min_duration, max_duration (float): Event duration limits in seconds.
+        refractory (float): Of events starting closer than this (seconds),
+            only the largest is kept (filter ringing, see suppress_satellites).
+
+    Returns:
+        dict: 'rows', 'starts', 'stops' (samples), 'amplitude' (peak velocity
+            of the left-right derivation, signal units per second).
+    """
+    eog = bandpass(np.stack([left, right]), fs, *band)
+    velocity = np.diff(eog, axis=-1, prepend=eog[..., :1]) * fs
+    z = velocity / np.maximum(robust_scale(velocity), np.finfo(float).tiny)[..., np.newaxis]
+    mask = (np.abs(z[0]) > threshold) & (np.abs(z[1]) > threshold) & (z[0] * z[1] < 0)
+    rows, starts, stops = find_runs(mask, max(1, round(min_duration * fs)), round(max_duration * fs))
+    amplitude = segment_reduce(np.abs(velocity[0] - velocity[1]), rows, starts, stops, np.maximum)
+    events = {'rows': rows, 'starts': starts, 'stops': stops, 'amplitude': amplitude}
+    return suppress_satellites(events, round(refractory * fs))
+
+
+def detect_twitches(signal, fs, window=0.1, baseline=5.0, threshold=4.0,
+                    min_duration=0.05, max_duration=0.5, refractory=0.25):
+    """
+    Detect muscle twitches on continuous EMG.
+
+    A twitch is a brief burst where the short-window RMS exceeds threshold x
+    the RMS over a longer baseline window around it, lasting min_duration to
+    max_duration seconds. Both envelopes are cumulative-sum moving RMS, so the
+    detector is O(n) whatever the window lengths.
+
+    Args:
+        signal (np.ndarray): Continuous EMG, shape (n_channels, n_samples).
+        fs (float): Sampling rate in Hz.
+        window (float): Burst RMS window in seconds.
+        baseline (float): Baseline RMS window in seconds.
+        threshold (float): Burst/baseline RMS ratio.
+        min_duration, max_duration (float): Twitch duration limits in seconds.
+        refractory (float): Of twitches starting closer than this (seconds),
+            only the largest is kept.
+
+    Returns:
+        dict: 'rows', 'starts', 'stops' (samples), 'amplitude' (peak
+            burst/baseline ratio).
+    """
+    ratio = rolling_rms(signal, round(window * fs))
+    base = rolling_rms(signal, round(baseline * fs))
+    np.divide(ratio, base, out=ratio, where=base > 0)
+    rows, starts, stops = find_runs(ratio > threshold, max(1, round(min_duration * fs)),
+                                    round(max_duration * fs))
+    amplitude = segment_reduce(ratio, rows, starts, stops, np.maximum)
+    events = {'rows': rows, 'starts': starts, 'stops': stops, 'amplitude': amplitude}
+    return suppress_satellites(events, round(refractory * fs))
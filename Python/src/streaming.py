@@ -0,0 +1,252 @@
+"""
+Streaming Feature Extraction Module
+
+This module provides StreamingFeatureExtractor, which turns a live stream of
+raw samples into one feature row per completed 30 s epoch (e.g. for bedside
+monitoring).
+
+Rows are computed with the same feature families as extract_features and,
+for per-epoch families, are identical to the batch result for the same
+recording:
+- raw samples are collected in a fixed-size buffer per modality until every
+  modality has a complete epoch;
+- with context features (config.CONTEXT_WINDOW = k), the row of epoch t
+  depends on epochs t+1 .. t+k, so it is emitted once epoch t+k is complete
+  (or by flush() at the end of the recording). Only the last 2k base rows are
+  kept in memory.
+
+A Normalizer fitted with dataset-wide statistics (normalization.py) can be
+applied to the emitted rows; per-recording normalization needs the whole
+recording and is not available while streaming.
+
+Continuous families (sleep event detectors and the EMG tone envelope) set
+thresholds from statistics of the whole night, which do not exist yet while
+it is being recorded. The extractor refuses them unless allow_continuous=True,
+in which case they only see the epochs completed by each push and their
+columns differ from the batch result; all other columns still match.
+"""
+
+import warnings
+
+import numpy as np
+
+# Handle both package import and standalone execution
+try:
+    from .feature_matrix import FeatureMatrix
+    from .feature_extraction import (_FeatureBuilder, _add_family, context_blocks, context_layout,
+                                     context_metadata, default_feature_families, sampling_rate,
+                                     split_continuous_families)
+except ImportError:
+    from feature_matrix import FeatureMatrix
+    from feature_extraction import (_FeatureBuilder, _add_family, context_blocks, context_layout,
+                                    context_metadata, default_feature_families, sampling_rate,
+                                    split_continuous_families)
+
+
+class StreamingFeatureExtractor:
+    """
+    Stateful, incremental version of extract_features for one recording.
+
+    Usage:
+        extractor = StreamingFeatureExtractor(config, channel_info)
+        for blocks in stream:                  # {'eeg': (2, n), 'eog': (2, m), ...}
+            rows = extractor.push(blocks)      # FeatureMatrix, 0 or more rows
+        rows = extractor.flush()               # remaining rows at the end
+
+    Attributes:
+        modalities (list): Modalities expected in every block.
+        epoch_samples (dict): Samples per epoch for each modality.
+        n_emitted (int): Feature rows emitted so far.
+    """
+
+    def __init__(self, config, channel_info=None, record_id=None, normalizer=None, allow_continuous=False):
+        """
+        Args:
+            config (module): The configuration module (feature families,
+                sampling rates and context settings as for extract_features).
+            channel_info (dict): Channel metadata, e.g. from load_training_data
+                (optional; provides '<modality>_fs', '<modality>_names' and
+                'epoch_length').
+            record_id (str): Record id attached to emitted rows (optional).
+            normalizer (Normalizer): Fitted dataset-scope normalizer applied
+                to emitted rows (optional; e.g. model.normalizer_).
+            allow_continuous (bool): Compute continuous families on each push
+                instead of raising; their columns then differ from the batch
+                path (a warning is issued).
+
+        Raises:
+            ValueError: If continuous families are configured and
+                allow_continuous is False, or for a recording-scope normalizer.
+        """
+        if normalizer is not None and normalizer.scope != 'dataset':
+            raise ValueError("Streaming extraction needs a normalizer fitted with scope='dataset'")
+        self.families = default_feature_families(config)
+        _, continuous = split_continuous_families(self.families)
+        if continuous and not allow_continuous:
+            raise ValueError(f"Continuous feature families {continuous} need the whole recording and "
+                             "cannot be streamed exactly; set config.FEATURE_FAMILIES without them "
+                             "or pass allow_continuous=True for approximate columns")
+        if continuous:
+            warnings.warn(f"Continuous feature families {continuous} are computed per push; "
+                          "their columns will differ from batch extraction", UserWarning)
+        self.config = config
+        self.normalizer = normalizer
+        self.channel_info = channel_info
+        self.record_id = record_id
+        self.modalities = list(self.families)
+        epoch_length = channel_info.get('epoch_length', 30) if channel_info else 30
+        self.fs = {m: sampling_rate(m, config, channel_info) for m in self.modalities}
+        self.epoch_samples = {m: int(round(self.fs[m] * epoch_length)) for m in self.modalities}
+        self.reset()
+
+    def reset(self):
+        """Forget all buffered samples and rows (start a new recording)."""
+        self._partial = {m: None for m in self.modalities}  # (n_channels, epoch_samples) buffer
+        self._fill = {m: 0 for m in self.modalities}
+        self._complete = {m: [] for m in self.modalities}   # completed epoch tensors
+        self._tail = None      # last base rows still needed for context
+        self._layout = None
+        self._metadata = None
+        self.n_emitted = 0
+
+    @property
+    def context_window(self):
+        return max(getattr(self.config, 'CONTEXT_WINDOW', 0), 0)
+
+    def push(self, blocks):
+        """
+        Ingest new raw samples.
+
+        Args:
+            blocks (dict): Modality -> array of shape (n_channels, n_new_samples).
+                Blocks can be any length; modalities may arrive at different
+                rates, an epoch is processed once all of them have it.
+
+        Returns:
+            FeatureMatrix: Rows for the epochs whose features became final
+                (possibly 0 rows).
+        """
+        for modality in self.modalities:
+            if modality in blocks:
+                self._ingest(modality, np.asarray(blocks[modality]))
+
+        n_ready = min(sum(len(e) for e in self._complete[m]) for m in self.modalities)
+        if n_ready == 0:
+            return self._emit_rows(None)
+        epochs = {m: self._take_epochs(m, n_ready) for m in self.modalities}
+        return self._emit_rows(self._base_features(epochs))
+
+    def flush(self):
+        """
+        End the recording: emit the rows still waiting for future context
+        (edge-padded like the batch path) and reset the extractor.
+
+        Incomplete trailing epochs are dropped, as in the data loader.
+
+        Returns:
+            FeatureMatrix: The remaining rows.
+        """
+        k = self.context_window
+        if self._tail is None or k == 0:
+            rows = self._emit_rows(None)
+        else:
+            padded = np.concatenate([self._tail, np.repeat(self._tail[-1:], k, axis=0)])
+            rows = self._context_rows(padded, len(self._tail) - k)
+        self.reset()
+        return rows
+
+    # -- Raw sample buffering --------------------------------------------------
+
+    def _ingest(self, modality, block):
+        """Append samples to a modality's epoch buffer, moving out completed epochs."""
+        n_channels, n_new = block.shape
+        length = self.epoch_samples[modality]
+        if self._partial[modality] is None:
+            self._partial[modality] = np.empty((n_channels, length), dtype=block.dtype)
+        partial = self._partial[modality]
+        fill = self._fill[modality]
+
+        n_epochs = (fill + n_new) // length
+        if n_epochs == 0:
+            partial[:, fill:fill + n_new] = block
+            self._fill[modality] = fill + n_new
+            return
+
+        epochs = np.empty((n_epochs, n_channels, length), dtype=partial.dtype)
+        head = length - fill
+        epochs[0, :, :fill] = partial[:, :fill]
+        epochs[0, :, fill:] = block[:, :head]
+        body_end = head + (n_epochs - 1) * length
+        epochs[1:] = block[:, head:body_end].reshape(n_channels, n_epochs - 1, length).transpose(1, 0, 2)
+        rest = n_new - body_end
+        partial[:, :rest] = block[:, body_end:]
+        self._fill[modality] = rest
+        self._complete[modality].append(epochs)
+
+    def _take_epochs(self, modality, n):
+        """Remove and return the first n completed epochs of a modality."""
+        epochs = np.concatenate(self._complete[modality])
+        self._complete[modality] = [epochs[n:]] if len(epochs) > n else []
+        return epochs[:n]
+
+    # -- Features ----------------------------------------------------------------
+
+    def _base_features(self, epochs):
+        """Feature families for a batch of completed epochs (as in extract_multi_channel_features)."""
+        builder = _FeatureBuilder(len(next(iter(epochs.values()))))
+        for modality, family_names in self.families.items():
+            names = self.channel_info.get(f'{modality}_names') if self.channel_info else None
+            for family_name in family_names:
+                _add_family(builder, epochs[modality], modality, family_name,
+                            self.fs[modality], self.config, names)
+        features = builder.build()
+
+        if self._metadata is None:
+            self._layout = context_layout(features, self.config)
+            if self._layout is None:
+                self._metadata = (features.columns, features.modalities, features.channels)
+            else:
+                self._metadata = context_metadata(features, self._layout[2], self._layout[4])
+        return features.values
+
+    def _emit_rows(self, rows):
+        """Route new base rows through the context window and wrap the final rows."""
+        if rows is None:
+            return self._wrap(None)
+        k = self.context_window
+        if k == 0 or self._layout is None:
+            return self._wrap(rows)
+
+        if self._tail is None:
+            # Edge padding before the first epoch, as in add_context_features
+            self._tail = np.repeat(rows[:1], k, axis=0)
+        sequence = np.concatenate([self._tail, rows])
+        n_final = len(sequence) - 2 * k
+        if n_final <= 0:
+            self._tail = sequence
+            return self._wrap(None)
+        self._tail = sequence[n_final:]
+        return self._context_rows(sequence, n_final)
+
+    def _context_rows(self, sequence, n_final):
+        """Rows for the n_final epochs after the first k rows of sequence."""
+        k, kinds, base_index, offsets, _ = self._layout
+        padded = sequence[:n_final + 2 * k][:, base_index]
+        blocks = context_blocks(padded, k, kinds, offsets)
+        return self._wrap(np.concatenate([sequence[k:k + n_final]] + blocks, axis=1))
+
+    def _wrap(self, values):
+        """FeatureMatrix of emitted rows (0 rows if values is None)."""
+        n_columns = len(self._metadata[0]) if self._metadata is not None else 0
+        if values is None:
+            values = np.empty((0, n_columns), dtype=np.float32)
+        columns, modalities, channels = self._metadata if self._metadata is not None else ([], [], [])
+        record_codes = record_names = None
+        if self.record_id is not None:
+            record_codes = np.zeros(len(values), dtype=np.int32)
+            record_names = [self.record_id]
+        self.n_emitted += len(values)
+        rows = FeatureMatrix(values, columns, modalities, channels, record_codes, record_names)
+        if self.normalizer is not None and len(values):
+            rows = self.normalizer.transform(rows)
+        return rows
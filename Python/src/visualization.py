@@ -3,6 +3,12 @@ import numpy as np
 from sklearn.metrics import confusion_matrix, ConfusionMatrixDisplay
 import xml.etree.ElementTree as ET
 
+# Handle both package import and standalone execution
+try:
+    from .inference import prepare_features
+except ImportError:
+    from inference import prepare_features
+
 # Try to import MNE for EDF reading (more lenient than pyedflib)
 try:
     import mne
@@ -297,5 +303,5 @@ def visualize_results(model, features, labels, config):
     print("Visualizing results...")
     # TODO: Add more visualizations as needed (e.g., feature importance).
     class_names = ['Wake', 'N1', 'N2', 'N3', 'REM']
-    y_pred = model.predict(features)
+    y_pred = model.predict(prepare_features(model, features))
     plot_confusion_matrix(labels, y_pred, class_names)
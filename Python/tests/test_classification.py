@@ -0,0 +1,167 @@
+import numpy as np
+import pytest
+from types import SimpleNamespace
+from sklearn.model_selection import ParameterGrid
+from sklearn.linear_model import SGDClassifier
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+from src.classification import (SEARCH_SPACES, ApproximateKernelSVM, cross_validation_folds, feature_chunks,
+                                hyperparameter_search, make_classifier, train_classifier, train_incremental)
+from src.feature_matrix import FeatureMatrix
+from src.utils import save_cache, load_cache
+
+
+def _features(n_records=6, n_per_record=60, seed=0):
+    rng = np.random.default_rng(seed)
+    n = n_records * n_per_record
+    labels = rng.integers(0, 3, n)
+    values = np.column_stack([labels + rng.standard_normal(n) * 0.5, rng.standard_normal((n, 3))])
+    record_ids = np.repeat([f'R{i}' for i in range(n_records)], n_per_record)
+    features = FeatureMatrix.from_columns(list(values.T), ['a', 'b', 'c', 'd'], ['eeg'] * 4, ['C3'] * 4,
+                                          record_ids, n_epochs=n)
+    return features, labels
+
+
+def _config(**overrides):
+    settings = dict(CURRENT_ITERATION=3, CLASSIFIER_TYPE='random_forest', RF_N_ESTIMATORS=20,
+                    RF_MAX_DEPTH=5, CV_FOLDS=3, CV_N_JOBS=1)
+    settings.update(overrides)
+    return SimpleNamespace(**settings)
+
+
+def test_folds_never_split_a_recording():
+    features, labels = _features()
+    folds = cross_validation_folds(labels, features.record_ids, n_splits=4)
+
+    assert len(folds) == 4
+    tested = np.concatenate([test for _, test in folds])
+    assert np.array_equal(np.sort(tested), np.arange(len(labels)))
+    for train, test in folds:
+        assert not set(features.record_ids[train]) & set(features.record_ids[test])
+
+
+def test_train_classifier_reports_folds_and_refits_on_all_data():
+    features, labels = _features()
+    model = train_classifier(features, labels, _config())
+
+    assert [m['fold'] for m in model.cv_results_] == [0, 1, 2]
+    assert sum(m['n_test'] for m in model.cv_results_) == len(labels)
+    assert all(m['kappa'] > 0.5 for m in model.cv_results_)
+    reference = make_classifier(_config()).fit(features.values, labels)
+    np.testing.assert_array_equal(model.predict(features.values), reference.predict(features.values))
+
+
+def test_parallel_folds_match_sequential():
+    features, labels = _features()
+    sequential = train_classifier(features, labels, _config(CV_N_JOBS=1)).cv_results_
+    parallel = train_classifier(features, labels, _config(CV_N_JOBS=2)).cv_results_
+    for a, b in zip(sequential, parallel):
+        assert (a['accuracy'], a['kappa']) == (b['accuracy'], b['kappa'])
+
+
+@pytest.mark.parametrize("kind, space", [
+    ('random_forest', {'max_depth': [1, 6], 'min_samples_split': [2, 20]}),
+    ('knn', {'n_neighbors': [1, 15, 45]}),
+])
+def test_successive_halving_search_resumes(tmp_path, kind, space, capsys):
+    features, labels = _features()
+    config = _config(CACHE_DIR=str(tmp_path), SEARCH_FACTOR=2, SEARCH_N_JOBS=1,
+                     SEARCH_MIN_TREES=5, SEARCH_MIN_EPOCHS=50)
+    result = hyperparameter_search(features, labels, config, kind=kind, space=space)
+
+    sizes = [len(r['candidates']) for r in result['rounds']]
+    assert sizes[0] == len(ParameterGrid(space)) and sizes == sorted(sizes, reverse=True)
+    budgets = [r['resource'] for r in result['rounds']]
+    assert budgets == sorted(budgets) and budgets[-1] == (20 if kind == 'random_forest' else 240)
+    assert result['best_score'] == result['rounds'][-1]['candidates'][0][1]
+    if kind == 'random_forest':
+        assert result['best_params']['max_depth'] == 6 and result['best_params']['n_estimators'] == 20
+
+    capsys.readouterr()
+    assert hyperparameter_search(features, labels, config, kind=kind, space=space) == result
+    assert 'resumed' in capsys.readouterr().out
+    assert len(list(tmp_path.glob(f'search_{kind}_*.joblib'))) == 1
+
+
+def test_train_classifier_uses_searched_parameters(tmp_path):
+    features, labels = _features()
+    config = _config(CACHE_DIR=str(tmp_path), HYPERPARAMETER_SEARCH=True, SEARCH_FACTOR=3,
+                     SEARCH_N_JOBS=1, SEARCH_MIN_TREES=5)
+    model = train_classifier(features, labels, config)
+    assert model.max_depth in SEARCH_SPACES['random_forest']['max_depth']
+    assert model.n_estimators == 20
+
+
+@pytest.mark.parametrize("method", ['nystroem', 'rff'])
+def test_approximate_svm_matches_exact_svm(method):
+    rng = np.random.default_rng(5)
+    n = 3000
+    X = rng.standard_normal((n, 4)) * [1.0, 100.0, 0.01, 1.0]
+    labels = ((X[:, 0] ** 2 + (X[:, 1] / 100) ** 2) > 1.4).astype(int)   # not linearly separable
+    config = _config(CURRENT_ITERATION=2, SVM_C=10.0, SVM_APPROXIMATION=method, SVM_N_COMPONENTS=300)
+
+    model = make_classifier(config)
+    assert isinstance(model, ApproximateKernelSVM)
+    model.fit(X[:2000], labels[:2000])
+    exact = make_pipeline(StandardScaler(), make_classifier(_config(CURRENT_ITERATION=2, SVM_C=10.0)))
+    exact.fit(X[:2000], labels[:2000])
+
+    approx_accuracy = np.mean(model.predict(X[2000:]) == labels[2000:])
+    exact_accuracy = np.mean(exact.predict(X[2000:]) == labels[2000:])
+    assert approx_accuracy > 0.9 and approx_accuracy > exact_accuracy - 0.03
+    assert model.decision_function(X[:5]).shape == (5,)
+    # Search parameters apply directly
+    assert make_classifier(config, params={'C': 0.5, 'gamma': 0.1}).get_params()['gamma'] == 0.1
+
+
+@pytest.mark.parametrize("n_features, expected", [(4, 'kd_tree'), (40, 'ball_tree'), (100, 'brute')])
+def test_indexed_knn_matches_standardized_knn(n_features, expected, tmp_path):
+    rng = np.random.default_rng(6)
+    X = rng.standard_normal((1500, n_features)) * rng.uniform(0.1, 50, n_features)
+    labels = (X[:, 0] / X[:, 0].std() + rng.standard_normal(1500) > 0).astype(int) + (X[:, 1] > 0)
+    config = _config(CURRENT_ITERATION=1, KNN_N_NEIGHBORS=7, KNN_INDEX='auto', KNN_BATCH_SIZE=128, KNN_N_JOBS=2)
+
+    for weights in ('uniform', 'distance'):
+        model = make_classifier(config, params={'weights': weights}).fit(X[:1000], labels[:1000])
+        assert model.index_algorithm_ == expected
+        reference = make_pipeline(StandardScaler(), KNeighborsClassifier(n_neighbors=7, weights=weights))
+        reference.fit(X[:1000], labels[:1000])
+        np.testing.assert_allclose(model.predict_proba(X[1000:]), reference.predict_proba(X[1000:]))
+        np.testing.assert_array_equal(model.predict(X[:1000]), reference.predict(X[:1000]))
+
+    # The index is saved with the model and queried without refitting
+    save_cache(model, 'knn.joblib', str(tmp_path))
+    loaded = load_cache('knn.joblib', str(tmp_path))
+    assert loaded.index_ is not model.index_
+    np.testing.assert_array_equal(loaded.set_params(n_jobs=1, batch_size=10 ** 6).predict(X[1000:]),
+                                  model.predict(X[1000:]))
+
+
+def test_incremental_training_from_memmapped_file(tmp_path):
+    features, labels = _features(n_records=10, n_per_record=200)
+    path = tmp_path / 'features.fmat'
+    features.save(path)
+    config = _config(INCREMENTAL_EPOCHS=3)
+
+    model = train_incremental(lambda: feature_chunks(str(path), labels, chunk_rows=300), config, classes=[0, 1, 2])
+    assert model.feature_columns_ == features.columns
+    batch = make_pipeline(StandardScaler(), SGDClassifier(loss='log_loss', random_state=42))
+    batch.fit(features.values, labels)
+    assert np.mean(model.predict(features.values) == labels) > np.mean(batch.predict(features.values) == labels) - 0.05
+
+
+def test_incremental_training_from_recording_iterator():
+    features, labels = _features(n_records=10, n_per_record=200)
+
+    def recordings():
+        for record_id in features.record_names:
+            rows = features.record_ids == record_id
+            # Column order may differ between recordings; chunks are matched by name
+            yield features[np.flatnonzero(rows)].select(features.columns[::-1]), labels[rows]
+
+    model = train_incremental(recordings(), _config(), classes=[0, 1, 2])
+    assert model.feature_columns_ == features.columns[::-1]
+    holdout = features.select(features.columns[::-1]).values
+    assert np.mean(model.predict(holdout) == labels) > 0.6
@@ -0,0 +1,61 @@
+import time
+
+import numpy as np
+from types import SimpleNamespace
+from sklearn.ensemble import RandomForestClassifier
+
+from src.classification import train_classifier
+from src.compact_forest import CompactForest, export_forest, load_compact_forest
+from src.feature_matrix import FeatureMatrix
+from src.inference import make_inference
+
+
+def _data(n=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    # Quantized columns put many values exactly on split thresholds' neighbours
+    X = np.column_stack([rng.integers(0, 20, n) / 7.0, rng.standard_normal((n, 5)) * 1e3,
+                         rng.standard_normal(n).astype(np.float32)])
+    labels = (X[:, 0] > 1.3).astype(int) + (X[:, 1] > 0) + (X[:, 6] > 0.5) + rng.integers(0, 2, n)
+    return X, labels
+
+
+def test_compact_forest_predicts_identically(tmp_path):
+    X, labels = _data()
+    model = RandomForestClassifier(n_estimators=30, min_samples_leaf=2, random_state=0).fit(X[:2000], labels[:2000])
+    path = tmp_path / 'model.forest'
+    forest = export_forest(model, path)
+
+    assert forest.n_nodes < sum(tree.tree_.node_count for tree in model.estimators_)
+    for loaded in (forest, load_compact_forest(path), load_compact_forest(path, mmap=False)):
+        assert isinstance(loaded.threshold, np.ndarray) and loaded.threshold.dtype == np.float32
+        np.testing.assert_array_equal(loaded.classes_, model.classes_)
+        np.testing.assert_array_equal(loaded.predict(X, batch_size=700), model.predict(X))
+        np.testing.assert_array_equal(loaded.predict_proba(X), model.predict_proba(X))
+
+
+def test_pruning_collapses_equal_leaves():
+    X = np.arange(40, dtype=float)[:, np.newaxis]
+    labels = (X[:, 0] >= 20).astype(int)
+    model = RandomForestClassifier(n_estimators=1, bootstrap=False, random_state=0).fit(X, labels)
+    forest = CompactForest.from_estimator(model)
+    assert forest.n_nodes == 3 and forest.max_depth == 1
+
+
+def test_inference_with_compact_forest(tmp_path):
+    X, labels = _data()
+    record_ids = np.repeat(['R0', 'R1', 'R2'], 1000)
+    names = [f'f{i}' for i in range(X.shape[1])]
+    features = FeatureMatrix.from_columns(list(X.T), names, ['eeg'] * len(names), ['C3'] * len(names),
+                                          record_ids, n_epochs=len(X))
+    config = SimpleNamespace(CURRENT_ITERATION=3, CLASSIFIER_TYPE='random_forest', RF_N_ESTIMATORS=20,
+                             CV_FOLDS=3, CV_N_JOBS=1, FEATURE_NORMALIZATION='zscore')
+    model = train_classifier(features, labels, config)
+    export_forest(model, tmp_path / 'model.forest')
+
+    start = time.perf_counter()
+    forest = load_compact_forest(tmp_path / 'model.forest')
+    assert time.perf_counter() - start < 0.5
+    assert forest.feature_columns_ == names
+    # Columns are selected by name and normalized as in training
+    holdout = features.select(names[::-1])
+    np.testing.assert_array_equal(make_inference(forest, holdout, config), make_inference(model, holdout, config))
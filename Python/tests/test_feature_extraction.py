@@ -0,0 +1,214 @@
+import numpy as np
+import pytest
+from types import SimpleNamespace
+
+from src import feature_extraction as fe
+from src.feature_matrix import FeatureMatrix
+
+
+def _signals(n_rows=8, n_samples=3750, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.standard_normal((n_rows, n_samples))
+    x[0] = 0.0  # Flat epoch: ratios must not produce NaN
+    return x
+
+
+def test_complexity_numpy_matches_definitions():
+    x = _signals()
+    out = fe.compute_complexity_features(x, 'numpy')
+    assert out.shape == (len(x), len(fe.COMPLEXITY_FEATURES))
+    assert np.all(np.isfinite(out))
+
+    row = x[3]
+    dx = np.diff(row)
+    mobility = np.sqrt(np.var(dx) / np.var(row))
+    assert out[3, 0] == pytest.approx(np.var(row))
+    assert out[3, 1] == pytest.approx(mobility)
+    assert out[3, 2] == pytest.approx(np.sqrt(np.var(np.diff(dx)) / np.var(dx)) / mobility)
+    assert out[3, 4] == pytest.approx(np.sum(np.abs(dx)))
+    assert out[3, 7] == np.sum((row[1:-1] > row[:-2]) & (row[1:-1] > row[2:]))
+
+
+@pytest.mark.skipif(not fe.HAS_NUMBA, reason="numba not installed")
+def test_complexity_numba_matches_numpy():
+    x = _signals(n_rows=32)
+    np.testing.assert_allclose(fe.compute_complexity_features(x, 'numba'),
+                               fe.compute_complexity_features(x, 'numpy'), rtol=1e-10, atol=1e-12)
+
+
+def test_complexity_family_is_batched_over_channels():
+    x = _signals(n_rows=12).reshape(4, 3, -1)
+    features = fe.complexity_feature_family(x, 125, SimpleNamespace(FEATURE_BACKEND='numpy'))
+    assert set(features) == set(fe.COMPLEXITY_FEATURES)
+    assert features['line_length'].shape == (4, 3)
+    assert features['line_length'][1, 2] == pytest.approx(np.sum(np.abs(np.diff(x[1, 2]))))
+
+
+def _sample_entropy_brute_force(row, m, r):
+    """O(n^2) sample entropy reference (Chebyshev distance, self-matches excluded)."""
+    n_templates = len(row) - m
+    templates = np.array([row[i:i + m + 1] for i in range(n_templates)])
+    dist_m = np.max(np.abs(templates[:, None, :m] - templates[None, :, :m]), axis=2)
+    dist_m1 = np.max(np.abs(templates[:, None, :] - templates[None, :, :]), axis=2)
+    b = (np.sum(dist_m <= r) - n_templates) / 2
+    a = (np.sum(dist_m1 <= r) - n_templates) / 2
+    return -np.log(a / b)
+
+
+def _approximate_entropy_brute_force(row, m, r):
+    def phi(length):
+        templates = np.array([row[i:i + length] for i in range(len(row) - length + 1)])
+        dist = np.max(np.abs(templates[:, None, :] - templates[None, :, :]), axis=2)
+        return np.mean(np.log(np.mean(dist <= r, axis=1)))
+    return phi(m) - phi(m + 1)
+
+
+def test_permutation_entropy():
+    x = _signals(n_rows=4, n_samples=2000)
+    x[1] = np.arange(2000)  # Monotonic: a single ordinal pattern
+    pe = fe.permutation_entropy(x, order=3, delay=1)
+    assert pe[1] == pytest.approx(0.0)
+    assert 0.95 < pe[2] <= 1.0  # White noise: near-uniform patterns
+
+    # Reference: count argsort patterns directly
+    windows = np.lib.stride_tricks.sliding_window_view(x[3], 4)[::1]
+    _, counts = np.unique(np.argsort(windows, axis=1, kind='stable'), axis=0, return_counts=True)
+    p = counts / counts.sum()
+    expected = -np.sum(p * np.log2(p)) / np.log2(24)
+    assert fe.permutation_entropy(x[3:4], order=4)[0] == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('backend', ['numpy', pytest.param('numba', marks=pytest.mark.skipif(
+    not fe.HAS_NUMBA, reason="numba not installed"))])
+def test_sample_entropy_matches_brute_force(backend):
+    x = _signals(n_rows=3, n_samples=300, seed=1)[1:]
+    out = fe.compute_sample_entropy(x, m=2, r=0.2, backend=backend)
+    for row, (sampen, apen) in zip(x, out):
+        assert sampen == pytest.approx(_sample_entropy_brute_force(row, 2, 0.2 * np.std(row)))
+        assert apen == pytest.approx(_approximate_entropy_brute_force(row, 2, 0.2 * np.std(row)))
+    np.testing.assert_allclose(out, fe.compute_sample_entropy(x, m=2, r=0.2, backend='numpy'))
+
+
+def test_wavedec_is_orthogonal_and_batched():
+    x = _signals(n_rows=6, n_samples=3750)
+    coeffs = fe.wavedec(x, 'db4', level=5)
+    assert [c.shape[1] for c in coeffs] == [118, 118, 235, 469, 938, 1875]
+    # Periodized orthogonal DWT preserves energy (3750 is even at level 1 only,
+    # so compare on a power-of-two length)
+    y = x[:, :2048]
+    energy = sum(np.sum(c**2, axis=1) for c in fe.wavedec(y, 'db4', level=5))
+    np.testing.assert_allclose(energy, np.sum(y**2, axis=1))
+    np.testing.assert_allclose(fe.wavedec(x[2:3], 'db4', 5)[3], coeffs[3][2:3])
+
+
+def test_wavedec_matches_pywavelets():
+    pywt = pytest.importorskip('pywt')
+    x = _signals(n_rows=3, n_samples=1500)
+    for ours, ref in zip(fe.wavedec(x, 'db2', 4), pywt.wavedec(x, 'db2', mode='periodization', level=4)):
+        np.testing.assert_allclose(ours, ref, atol=1e-12)
+
+
+def test_wavelet_family_relative_energies_sum_to_one():
+    x = _signals(n_rows=8, n_samples=3750).reshape(4, 2, -1)
+    features = fe.wavelet_feature_family(x, 125, SimpleNamespace(WAVELET='db4', WAVELET_LEVEL=5))
+    relative = sum(v for k, v in features.items() if k.startswith('wavelet_rel_energy_'))
+    np.testing.assert_allclose(relative[1:], 1.0)  # Row 0 is flat
+    assert features['wavelet_entropy'].shape == (4, 2)
+
+
+def test_dpss_tapers_are_cached():
+    first = fe.dpss_tapers(3750, 4.0, None)
+    assert first.shape == (7, 3750)
+    assert fe.dpss_tapers(3750, 4.0, None) is first
+
+
+def test_multitaper_psd_preserves_power_and_finds_peak():
+    fs = 125
+    t = np.arange(3750) / fs
+    rng = np.random.default_rng(2)
+    x = np.sin(2 * np.pi * 10 * t) + 0.1 * rng.standard_normal((4, 3750))
+    freqs, psd = fe.multitaper_psd(x, fs)
+    assert psd.shape == (4, len(freqs))
+    np.testing.assert_allclose(np.sum(psd, axis=1) * (freqs[1] - freqs[0]), np.var(x, axis=1), rtol=0.02)
+
+    for method in ('multitaper', 'welch'):
+        features = fe.spectral_feature_family(x[:, np.newaxis, :], fs, SimpleNamespace(SPECTRAL_METHOD=method))
+        np.testing.assert_allclose(features['peak_frequency'], 10.0, atol=0.3)
+        assert np.all(features['rel_power_alpha'] > 0.9)
+
+
+def test_context_features_respect_recording_boundaries():
+    values = np.arange(10, dtype=np.float32)[:, None] * np.array([[1.0, 10.0]], dtype=np.float32)
+    features = FeatureMatrix.from_columns(list(values.T), ['eeg0_a', 'eeg0_b'],
+                                          record_ids=['R1'] * 4 + ['R2'] * 6)
+    context = fe.add_context_features(features, SimpleNamespace(CONTEXT_WINDOW=1))
+
+    assert context.columns[:2] == ['eeg0_a', 'eeg0_b']
+    assert context.n_features == 2 + 2 * 5
+    prev = context.select('eeg0_a_prev1').values[:, 0]
+    nxt = context.select('eeg0_a_next1').values[:, 0]
+    # Edges of each recording repeat the boundary epoch instead of crossing it
+    np.testing.assert_array_equal(prev, [0, 0, 1, 2, 4, 4, 5, 6, 7, 8])
+    np.testing.assert_array_equal(nxt, [1, 2, 3, 3, 5, 6, 7, 8, 9, 9])
+    np.testing.assert_allclose(context.select('eeg0_b_ctx1_mean').values[5, 0], 50.0)
+    np.testing.assert_array_equal(context.select('eeg0_a_delta').values[:, 0],
+                                  [0, 1, 1, 1, 0, 1, 1, 1, 1, 1])
+    assert context.record_names == ['R1', 'R2']
+
+
+def test_cross_channel_family_correlation_and_coherence():
+    rng = np.random.default_rng(3)
+    left = rng.standard_normal((6, 1500))
+    x = np.stack([left, -left + 0.5 * rng.standard_normal((6, 1500)), left], axis=1)
+    features = fe.cross_channel_feature_family(x, 50, SimpleNamespace())
+
+    assert fe.channel_pairs(3) == [(0, 1), (0, 2), (1, 2)]
+    assert features['correlation'].shape == (6, 3)
+    expected = [np.corrcoef(x[e, 0], x[e, 1])[0, 1] for e in range(6)]
+    np.testing.assert_allclose(features['correlation'][:, 0], expected)
+    np.testing.assert_allclose(features['correlation'][:, 1], 1.0)
+    np.testing.assert_allclose(features['coherence_alpha'][:, 1], 1.0)
+    assert np.all(features['coherence_alpha'][:, 0] < 0.95)
+
+
+def test_cross_channel_columns_are_named_by_pair():
+    rng = np.random.default_rng(4)
+    data = {'eeg': rng.standard_normal((5, 2, 3750)), 'eog': rng.standard_normal((5, 2, 1500))}
+    config = SimpleNamespace(CURRENT_ITERATION=3, FEATURE_FAMILIES={'eog': ['cross']})
+    features = fe.extract_features(data, config, channel_info={'eog_names': ['EOG(L)', 'EOG(R)']})
+    assert features.columns[0] == 'eog0-eog1_correlation'
+    assert set(features.channels) == {'EOG(L)-EOG(R)'}
+
+
+def test_plan_shards_follows_recordings():
+    record_ids = ['R1'] * 3 + ['R2'] * 4 + ['R3'] * 2
+    assert fe.plan_shards(9, record_ids, n_shards=2) == [(0, 3), (3, 7), (7, 9)]
+    assert fe.plan_shards(9, record_ids, n_shards=4) == [(0, 2), (2, 4), (4, 6), (6, 9)]
+    assert fe.plan_shards(9, None, n_shards=3) == [(0, 3), (3, 6), (6, 9)]
+
+
+@pytest.mark.parametrize("record_ids", [['R1'] * 5 + ['R2'] * 7, None])
+def test_sharded_extraction_matches_in_process(record_ids):
+    rng = np.random.default_rng(5)
+    data = {
+        'eeg': rng.standard_normal((12, 2, 3750)),
+        'eog': rng.standard_normal((12, 2, 1500)),
+        'emg': rng.standard_normal((12, 1, 3750)),
+    }
+    # Continuous families run once per recording, between per-epoch families
+    families = {'eeg': ['time', 'spindle', 'wavelet'], 'eog': ['eog', 'cross'], 'emg': ['emg_tone', 'emg']}
+    serial = fe.extract_features(data, SimpleNamespace(CURRENT_ITERATION=3, FEATURE_FAMILIES=families),
+                                 record_ids=record_ids)
+    sharded = fe.extract_features(data, SimpleNamespace(CURRENT_ITERATION=3, FEATURE_FAMILIES=families,
+                                                        FEATURE_N_JOBS=2), record_ids=record_ids)
+    assert sharded.columns == serial.columns
+    np.testing.assert_array_equal(sharded.values, serial.values)
+    if record_ids is not None:
+        np.testing.assert_array_equal(sharded.record_ids, serial.record_ids)
+
+
+def test_split_continuous_families_keeps_order():
+    per_epoch, continuous = fe.split_continuous_families(
+        {'eeg': ['time', 'spindle', 'kcomplex'], 'emg': ['emg']})
+    assert per_epoch == {'eeg': ['time'], 'emg': ['emg']}
+    assert continuous == {'eeg': ['spindle', 'kcomplex']}
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+from types import SimpleNamespace
+from sklearn.neighbors import KNeighborsClassifier
+
+from src.feature_matrix import FeatureMatrix, record_groups
+from src.feature_extraction import extract_features
+from src.feature_selection import apply_feature_mask
+from src.inference import align_features
+
+
+BASIC_CONFIG = SimpleNamespace(
+    CURRENT_ITERATION=3,
+    FEATURE_FAMILIES={'eeg': ['time'], 'eog': ['eog'], 'emg': ['emg']},
+)
+
+
+def _multi_channel_data(n_epochs=12):
+    rng = np.random.default_rng(0)
+    return {
+        'eeg': rng.standard_normal((n_epochs, 2, 3750)),
+        'eog': rng.standard_normal((n_epochs, 2, 1500)),
+        'emg': rng.standard_normal((n_epochs, 1, 3750)),
+    }
+
+
+def test_extract_features_returns_named_matrix():
+    data = _multi_channel_data()
+    record_ids = ['R1'] * 6 + ['R2'] * 6
+    features = extract_features(data, BASIC_CONFIG, record_ids=record_ids)
+
+    assert isinstance(features, FeatureMatrix)
+    assert features.shape == (12, 2 * 3 + 2 * 3 + 3)
+    assert features.values.dtype == np.float32
+    assert features.values.flags.f_contiguous
+    assert features.columns[:3] == ['eeg0_mean', 'eeg0_median', 'eeg0_std']
+    assert 'emg0_rms' in features.columns
+    assert set(features.modalities) == {'eeg', 'eog', 'emg'}
+    assert features.record_names == ['R1', 'R2']
+    np.testing.assert_allclose(features.select('eeg1_std').values[:, 0],
+                               data['eeg'][:, 1].std(axis=1), rtol=1e-6)
+
+
+def test_subsetting_is_zero_copy():
+    data = _multi_channel_data()
+    features = extract_features(data, BASIC_CONFIG)
+
+    eeg = features.select_modality('eeg')
+    assert np.shares_memory(eeg.values, features.values)
+    rows = features[2:8]
+    assert rows.shape == (6, features.n_features)
+    assert np.shares_memory(rows.values, features.values)
+
+
+def test_save_load_roundtrip(tmp_path):
+    features = extract_features(_multi_channel_data(), BASIC_CONFIG,
+                                record_ids=['R2'] * 4 + ['R1'] * 8)
+    path = tmp_path / 'features.fmat'
+    features.save(path)
+
+    for mmap in (False, True):
+        loaded = FeatureMatrix.load(path, mmap=mmap)
+        np.testing.assert_array_equal(loaded.values, features.values)
+        assert loaded.columns == features.columns
+        assert list(loaded.channels) == list(features.channels)
+        assert loaded.record_names == ['R2', 'R1']
+        np.testing.assert_array_equal(loaded.record_ids, features.record_ids)
+
+
+def test_inference_selects_training_columns_by_name():
+    features = extract_features(_multi_channel_data(), BASIC_CONFIG)
+    labels = np.arange(features.n_epochs) % 2
+    selected = apply_feature_mask(features, np.array([c.endswith('_std') for c in features.columns]))
+
+    model = KNeighborsClassifier(n_neighbors=1).fit(selected.values, labels)
+    model.feature_columns_ = selected.columns
+
+    aligned = align_features(model, features)
+    np.testing.assert_array_equal(aligned, selected.values)
+
+    model.feature_columns_ = selected.columns + ['eeg0_missing']
+    with pytest.raises(ValueError):
+        align_features(model, features)
+
+
+def test_record_groups_in_order_of_appearance():
+    groups = record_groups(['R2', 'R1', 'R2', 'R3', 'R1'], 5)
+    assert [g.tolist() for g in groups] == [[0, 2], [1, 4], [3]]
+    assert [g.tolist() for g in record_groups(None, 3)] == [[0, 1, 2]]
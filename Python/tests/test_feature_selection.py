@@ -0,0 +1,161 @@
+import numpy as np
+from types import SimpleNamespace
+from sklearn.feature_selection import f_classif
+from sklearn.metrics import mutual_info_score
+
+from src.feature_matrix import FeatureMatrix
+from src import feature_selection as fs
+
+
+def _named_features(n_samples=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    labels = rng.integers(0, 5, n_samples)
+    columns = {
+        'informative': labels + rng.standard_normal(n_samples) * 0.5,
+        'weak': (labels == 4) * 0.3 + rng.standard_normal(n_samples),
+        'noise': rng.standard_normal(n_samples),
+        'constant': np.ones(n_samples),
+    }
+    features = FeatureMatrix.from_columns(list(columns.values()), list(columns), ['eeg'] * 4, ['C3'] * 4,
+                                          None, n_epochs=n_samples)
+    return features, labels
+
+
+def test_univariate_scores_match_reference():
+    features, labels = _named_features()
+    scores = fs.univariate_scores(features, labels, n_bins=8)
+    values = features.values.astype(np.float64)
+
+    f_ref, _ = f_classif(values[:, :3], labels)
+    np.testing.assert_allclose(scores['f_score'][:3], f_ref, rtol=1e-6)
+    assert scores['f_score'][3] == 0 and scores['correlation'][3] == 0
+
+    bins = fs._equal_frequency_bins(values[:, :3], 8)
+    mi_ref = [mutual_info_score(bins[:, j], labels) for j in range(3)]
+    np.testing.assert_allclose(scores['mutual_info'][:3], mi_ref, rtol=1e-9)
+
+    for name in fs.SCORE_NAMES:
+        assert scores[name][0] > scores[name][1] > scores[name][2]
+
+
+def test_selection_is_cached_and_persisted_for_inference(tmp_path):
+    features, labels = _named_features()
+    config = SimpleNamespace(CURRENT_ITERATION=3, CACHE_DIR=str(tmp_path), SELECTION_K=2, SELECTION_SCORE='rank')
+
+    selected = fs.select_features(features, labels, config)
+    assert selected.columns == ['informative', 'weak']
+    assert len(list(tmp_path.glob('feature_scores_*.joblib'))) == 1
+
+    # Same matrix and labels: scores come from the cache
+    cached = fs.rank_features(features, labels, config)
+    np.testing.assert_array_equal(cached['mutual_info'], fs.univariate_scores(features, labels)['mutual_info'])
+
+    holdout = features.select(['noise', 'weak', 'constant', 'informative'])
+    assert fs.apply_saved_feature_mask(holdout, config).columns == ['informative', 'weak']
+
+
+def _selection_config(tmp_path, method):
+    return SimpleNamespace(CURRENT_ITERATION=4, CACHE_DIR=str(tmp_path), SELECTION_METHOD=method,
+                           SELECTION_CV_FOLDS=3, SELECTION_N_JOBS=1, SELECTION_RF_TREES=20,
+                           SELECTION_MIN_FEATURES=2, SELECTION_PATIENCE=2, SELECTION_PERMUTATION_REPEATS=2)
+
+
+def _wide_features(n_samples=600, n_noise=18, seed=1):
+    rng = np.random.default_rng(seed)
+    labels = rng.integers(0, 3, n_samples)
+    values = np.column_stack([labels + rng.standard_normal(n_samples) * 0.3,
+                              (labels == 2) + rng.standard_normal(n_samples) * 0.3,
+                              rng.standard_normal((n_samples, n_noise))])
+    names = ['good0', 'good1'] + [f'noise{i}' for i in range(n_noise)]
+    record_ids = np.repeat([f'R{i}' for i in range(6)], n_samples // 6)
+    features = FeatureMatrix.from_columns(list(values.T), names, ['eeg'] * len(names), ['C3'] * len(names),
+                                          record_ids, n_epochs=n_samples)
+    return features, labels
+
+
+def test_rfe_keeps_informative_features_and_stops_early(tmp_path):
+    features, labels = _wide_features()
+    mask, history = fs.recursive_feature_elimination(features, labels, _selection_config(tmp_path, 'rfe'))
+
+    assert mask[:2].all() and mask.sum() < features.n_features
+    sizes = [h['n_features'] for h in history]
+    assert sizes[0] == 20 and sizes == sorted(sizes, reverse=True)
+    assert all(h['seconds'] >= 0 and -1 <= h['kappa'] <= 1 for h in history)
+
+
+def test_permutation_selection(tmp_path):
+    features, labels = _wide_features()
+    config = _selection_config(tmp_path, 'permutation')
+    selected = fs.select_features(features, labels, config)
+
+    assert {'good0', 'good1'} <= set(selected.columns)
+    assert selected.n_features < features.n_features
+    assert fs.apply_saved_feature_mask(features, config).columns == selected.columns
+
+
+def test_covariance_accumulates_over_chunks_and_shards():
+    rng = np.random.default_rng(3)
+    values = rng.standard_normal((1000, 6)) @ rng.standard_normal((6, 6)) + 5
+    expected = np.cov(values, rowvar=False, bias=True)
+
+    np.testing.assert_allclose(fs.feature_covariance(values, chunk_rows=97).covariance, expected, atol=1e-10)
+    shards = [values[:300], values[300:310], values[310:]]
+    stats = fs.feature_covariance(shards, chunk_rows=128)
+    assert stats.count == 1000
+    np.testing.assert_allclose(stats.covariance, expected, atol=1e-10)
+    np.testing.assert_allclose(stats.correlation(), np.corrcoef(values, rowvar=False), atol=1e-10)
+
+    # Default chunks come from the byte budget; the input is centered in a copy
+    original = values.copy()
+    assert fs.covariance_chunk_rows(1270) == 64 * 2**20 // (8 * 1270)
+    np.testing.assert_allclose(fs.feature_covariance(values).covariance, expected, atol=1e-10)
+    np.testing.assert_array_equal(values, original)
+
+
+def test_prune_redundant_features_on_memmapped_matrix(tmp_path):
+    rng = np.random.default_rng(4)
+    base = rng.standard_normal((5000, 3))
+    columns = [base[:, 0], base[:, 1], 2 * base[:, 0] + 0.01 * rng.standard_normal(5000),
+               base[:, 2], -base[:, 1], np.ones(5000)]
+    names = ['a', 'b', 'a_copy', 'c', 'b_neg', 'const']
+    features = FeatureMatrix.from_columns(columns, names, ['eeg'] * 6, ['C3'] * 6, None, n_epochs=5000)
+    features.save(tmp_path / 'features.fmat')
+    mapped = FeatureMatrix.load(tmp_path / 'features.fmat', mmap=True)
+
+    keep = fs.prune_redundant_features(mapped, threshold=0.9, chunk_rows=512)
+    assert [n for n, k in zip(names, keep) if k] == ['a', 'b', 'c']
+
+    # Priority decides which member of a correlated group survives
+    keep = fs.prune_redundant_features(mapped, 0.9, priority=np.array([0, 0, 1, 0, 1, 0]), chunk_rows=512)
+    assert [n for n, k in zip(names, keep) if k] == ['a_copy', 'c', 'b_neg']
+
+
+def test_selection_skips_redundant_columns(tmp_path):
+    features, labels = _wide_features()
+    values = np.column_stack([features.values, features.select('good0').values * 3])
+    names = features.columns + ['good0_copy']
+    duplicated = FeatureMatrix.from_columns(list(values.T), names, ['eeg'] * len(names), ['C3'] * len(names),
+                                            features.record_ids, n_epochs=len(values))
+    config = SimpleNamespace(CURRENT_ITERATION=3, CACHE_DIR=str(tmp_path), SELECTION_K=2,
+                             SELECTION_SCORE='f_score', SELECTION_REDUNDANCY_THRESHOLD=0.95)
+    selected = fs.select_features(duplicated, labels, config)
+    assert sorted(selected.columns) in (['good0', 'good1'], ['good0_copy', 'good1'])
+
+
+def test_pruned_columns_stay_out_when_k_exceeds_kept(tmp_path):
+    features, labels = _wide_features()
+    values = np.column_stack([features.values, features.select('good0').values * 3])
+    names = features.columns + ['good0_copy']
+    duplicated = FeatureMatrix.from_columns(list(values.T), names, ['eeg'] * len(names), ['C3'] * len(names),
+                                            features.record_ids, n_epochs=len(values))
+    config = SimpleNamespace(CURRENT_ITERATION=3, CACHE_DIR=str(tmp_path), SELECTION_K=len(names) + 5,
+                             SELECTION_SCORE='rank', SELECTION_REDUNDANCY_THRESHOLD=0.95)
+    selected = fs.select_features(duplicated, labels, config)
+    assert len(selected.columns) == len(names) - 1
+    assert not {'good0', 'good0_copy'} <= set(selected.columns)
+
+
+def test_top_k_mask_skips_non_finite_scores():
+    scores = {name: np.array([3.0, -np.inf, 1.0, 2.0]) for name in fs.SCORE_NAMES}
+    np.testing.assert_array_equal(fs.top_k_mask(scores, 10, 'f_score'), [True, False, True, True])
+    np.testing.assert_array_equal(fs.top_k_mask(scores, 2, 'rank'), [True, False, False, True])
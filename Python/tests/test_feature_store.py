@@ -0,0 +1,71 @@
+import numpy as np
+from types import SimpleNamespace
+
+from src import feature_extraction as fe
+from src.feature_extraction import extract_features, extract_features_with_store
+from src.feature_store import FeatureStore, content_hash
+
+
+def _config(store_dir, **overrides):
+    settings = dict(
+        CURRENT_ITERATION=3,
+        FEATURE_FAMILIES={'eeg': ['time', 'complexity'], 'eog': ['eog'], 'emg': ['emg']},
+        FEATURE_STORE_DIR=str(store_dir),
+    )
+    settings.update(overrides)
+    return SimpleNamespace(**settings)
+
+
+def _multi_channel_data(n_epochs=10, seed=0):
+    rng = np.random.default_rng(seed)
+    return {
+        'eeg': rng.standard_normal((n_epochs, 2, 3750)),
+        'eog': rng.standard_normal((n_epochs, 2, 1500)),
+        'emg': rng.standard_normal((n_epochs, 1, 3750)),
+    }
+
+
+def test_store_matches_direct_extraction_and_is_reused(tmp_path):
+    data = _multi_channel_data()
+    record_ids = ['R1'] * 4 + ['R2'] * 6
+    config = _config(tmp_path)
+
+    direct = extract_features(data, _config(tmp_path, FEATURE_STORE_DIR=None), record_ids=record_ids)
+    store = FeatureStore(tmp_path)
+    first = extract_features_with_store(data, config, record_ids, store=store)
+    assert (store.hits, store.misses) == (0, 2 * 4)
+
+    second = extract_features_with_store(data, config, record_ids, store=store)
+    assert (store.hits, store.misses) == (2 * 4, 2 * 4)
+
+    for features in (first, second):
+        assert features.columns == direct.columns
+        assert features.record_names == ['R1', 'R2']
+        np.testing.assert_array_equal(features.values, direct.values)
+        np.testing.assert_array_equal(features.record_ids, direct.record_ids)
+
+
+def test_only_missing_cells_are_computed(tmp_path, monkeypatch):
+    data = _multi_channel_data()
+    store = FeatureStore(tmp_path)
+    extract_features_with_store(data, _config(tmp_path), store=store)
+    assert store.misses == 4
+
+    # A new family only computes its own cells
+    families = {'eeg': ['time', 'complexity', 'spectral'], 'eog': ['eog'], 'emg': ['emg']}
+    extract_features_with_store(data, _config(tmp_path, FEATURE_FAMILIES=families), store=store)
+    assert store.misses == 5
+
+    # Bumping a family's version or changing its settings recomputes only that family
+    monkeypatch.setitem(fe.FAMILY_VERSIONS, 'complexity', fe.FAMILY_VERSIONS['complexity'] + 1)
+    extract_features_with_store(data, _config(tmp_path, FEATURE_FAMILIES=families), store=store)
+    assert store.misses == 6
+    extract_features_with_store(data, _config(tmp_path, FEATURE_FAMILIES=families, MULTITAPER_NW=3.0),
+                                store=store)
+    assert store.misses == 7
+
+    # Changed signals get a new content hash
+    changed = dict(data, eog=data['eog'] + 1.0)
+    assert content_hash(changed['eog']) != content_hash(data['eog'])
+    extract_features_with_store(changed, _config(tmp_path, FEATURE_FAMILIES=families), store=store)
+    assert store.misses == 8
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from types import SimpleNamespace
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import cohen_kappa_score
+
+from src.feature_matrix import FeatureMatrix
+from src.inference import build_cascade, compare_cascade, make_inference, train_cascade, tune_cascade_threshold
+
+
+def _features(n=4000, seed=0):
+    rng = np.random.default_rng(seed)
+    labels = rng.integers(0, 5, n)
+    values = np.column_stack([labels + rng.standard_normal(n) * 0.25, rng.standard_normal((n, 7))])
+    names = [f'f{i}' for i in range(values.shape[1])]
+    features = FeatureMatrix.from_columns(list(values.T), names, ['eeg'] * len(names), ['C3'] * len(names),
+                                          None, n_epochs=n)
+    return features, labels
+
+
+def _cascade():
+    features, labels = _features()
+    full = RandomForestClassifier(n_estimators=100, random_state=0).fit(features.values[:3000], labels[:3000])
+    full.feature_columns_ = features.columns
+    config = SimpleNamespace(CASCADE_THRESHOLD=0.9, CASCADE_CHEAP_TREES=10, CASCADE_CHEAP_DEPTH=8)
+    return build_cascade(full, features[:3000], labels[:3000], config), features, labels
+
+
+def test_cascade_threshold_extremes():
+    cascade, features, labels = _cascade()
+    holdout = features[3000:]
+
+    cascade.threshold = 0.0
+    np.testing.assert_array_equal(make_inference(cascade, holdout, None), cascade.cheap.predict(holdout.values))
+    assert cascade.escalated_ == 0.0
+    cascade.threshold = 1.01
+    np.testing.assert_array_equal(make_inference(cascade, holdout, None), cascade.full.predict(holdout.values))
+    assert cascade.escalated_ == 1.0
+
+
+def test_tuned_cascade_keeps_kappa_and_escalates_a_fraction():
+    cascade, features, labels = _cascade()
+    validation, holdout = features[3000:3500], features[3500:]
+
+    table = tune_cascade_threshold(cascade, validation, labels[3000:3500], max_kappa_loss=0.01)
+    assert len(table) == 71 and cascade.threshold in [row['threshold'] for row in table]
+    row = table[[r['threshold'] for r in table].index(cascade.threshold)]
+    predictions = np.where(cascade.cheap.predict_proba(validation.values).max(axis=1) < cascade.threshold,
+                           cascade.full.predict(validation.values), cascade.cheap.predict(validation.values))
+    assert row['kappa'] == pytest.approx(cohen_kappa_score(labels[3000:3500], predictions))
+
+    report = compare_cascade(cascade, holdout, labels[3500:])
+    assert 0.0 < report['escalated'] < 0.8
+    assert report['agreement'] > 0.95
+    assert report['full_kappa'] == pytest.approx(cohen_kappa_score(labels[3500:],
+                                                                   cascade.full.predict(holdout.values)))
+    assert report['cascade_kappa'] > report['full_kappa'] - 0.04
+
+
+def test_train_cascade_holds_out_a_recording():
+    features, labels = _features()
+    features.record_names, features.record_codes = ['R1', 'R2', 'R3', 'R4'], np.repeat(np.arange(4, dtype=np.int32), 1000)
+    full = RandomForestClassifier(n_estimators=50, random_state=0).fit(features.values, labels)
+    full.feature_columns_ = features.columns
+    config = SimpleNamespace(CV_FOLDS=4, CASCADE_THRESHOLD=0.9, CASCADE_CHEAP_TREES=10, CASCADE_CHEAP_DEPTH=8,
+                             CASCADE_MAX_KAPPA_LOSS=0.02)
+
+    cascade, report = train_cascade(full, features, labels, config)
+    # Bootstrap weights sum to the training set size: one recording is held out
+    assert cascade.cheap.estimators_[0].tree_.weighted_n_node_samples[0] == 3000
+    assert 0.3 <= cascade.threshold <= 1.0
+    assert {'speedup', 'escalated', 'full_kappa', 'cascade_kappa'} <= set(report)
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+from sklearn.metrics import (accuracy_score, cohen_kappa_score, confusion_matrix as sk_confusion_matrix,
+                             f1_score, precision_score, recall_score)
+
+from src.classification import print_performance_metrics
+from src.metrics import (bootstrap_intervals, classification_metrics, confusion_matrix, encode_labels,
+                         metrics_from_confusion)
+
+
+def _predictions(n=2000, seed=0, classes=(0, 1, 2, 3, 4)):
+    rng = np.random.default_rng(seed)
+    y_true = rng.choice(classes, n, p=np.linspace(1, 2, len(classes)) / np.linspace(1, 2, len(classes)).sum())
+    y_pred = np.where(rng.random(n) < 0.7, y_true, rng.choice(classes, n))
+    return y_true, y_pred
+
+
+@pytest.mark.parametrize("classes", [(0, 1, 2, 3, 4), (0, 2, 4)])
+def test_metrics_match_sklearn(classes):
+    y_true, y_pred = _predictions(classes=classes)
+    y_pred[:5] = 1   # a stage predicted but absent from the labels
+    m = classification_metrics(y_true, y_pred)
+
+    np.testing.assert_array_equal(m['confusion'], sk_confusion_matrix(y_true, y_pred, labels=range(5)))
+    assert m['accuracy'] == pytest.approx(accuracy_score(y_true, y_pred))
+    assert m['kappa'] == pytest.approx(cohen_kappa_score(y_true, y_pred))
+    assert m['macro_f1'] == pytest.approx(f1_score(y_true, y_pred, average='macro'))
+    assert m['weighted_f1'] == pytest.approx(f1_score(y_true, y_pred, average='weighted'))
+    present = m['support'] > 0
+    np.testing.assert_allclose(m['sensitivity'][present],
+                               recall_score(y_true, y_pred, labels=np.flatnonzero(present), average=None))
+    np.testing.assert_allclose(np.nan_to_num(m['precision']),
+                               precision_score(y_true, y_pred, labels=range(5), average=None, zero_division=0))
+    assert np.isnan(m['sensitivity'][~present]).all()
+
+
+def test_stacked_confusion_matrices_and_bootstrap():
+    y_true, y_pred = _predictions()
+    cm = confusion_matrix(y_true, y_pred)
+    stacked = metrics_from_confusion(np.stack([cm, 2 * cm, cm.T]))
+    assert stacked['kappa'].shape == (3,) and stacked['f1'].shape == (3, 5)
+    assert stacked['kappa'][0] == pytest.approx(stacked['kappa'][1])
+    np.testing.assert_allclose(stacked['sensitivity'][2], metrics_from_confusion(cm)['precision'])
+
+    small = bootstrap_intervals(cm, n_bootstrap=2000)
+    large = bootstrap_intervals(cm * 16, n_bootstrap=2000)
+    kappa = metrics_from_confusion(cm)['kappa']
+    assert small['kappa'][0] < kappa < small['kappa'][1]
+    # Interval width shrinks like 1/sqrt(n)
+    width = lambda ci: ci['kappa'][1] - ci['kappa'][0]
+    assert width(large) == pytest.approx(width(small) / 4, rel=0.2)
+    # Standard error of accuracy matches the binomial formula
+    accuracy = metrics_from_confusion(cm)['accuracy']
+    assert width(small) > 0 and (small['accuracy'][1] - small['accuracy'][0]) == pytest.approx(
+        2 * 1.96 * np.sqrt(accuracy * (1 - accuracy) / cm.sum()), rel=0.15)
+
+
+def test_per_record_breakdown(capsys):
+    y_true, y_pred = _predictions(n=300)
+    record_ids = np.repeat(['R2', 'R1', 'R3'], 100)
+    y_pred[100:200] = y_true[100:200]
+
+    metrics = print_performance_metrics(y_true, y_pred, record_ids, n_bootstrap=200)
+    assert list(metrics['per_record']) == ['R2', 'R1', 'R3']
+    assert metrics['per_record']['R1']['accuracy'] == 1.0
+    np.testing.assert_array_equal(sum(r['confusion'] for r in metrics['per_record'].values()), metrics['confusion'])
+    out = capsys.readouterr().out
+    assert "Cohen's Kappa" in out and '95% CI' in out and 'Per-Recording Performance' in out
+
+
+def test_labels_outside_the_five_stages_are_reported(capsys):
+    y_true = np.array([0, 1, 2, 5, 5, 4])
+    y_pred = np.array([0, 1, 5, 5, 2, 4])
+    metrics = print_performance_metrics(y_true, y_pred, n_bootstrap=0)
+    assert metrics['stage_names'] == ['Wake', 'N1', 'N2', 'N3', 'REM', '5']
+    assert metrics['confusion'].shape == (6, 6)
+    assert metrics['kappa'] == pytest.approx(cohen_kappa_score(y_true, y_pred))
+    assert 'REM' in capsys.readouterr().out
+
+    true_indices, pred_indices, names = encode_labels(['W', 'R', 'W'], ['W', 'W', 'N2'])
+    assert names == ['N2', 'R', 'W']
+    np.testing.assert_array_equal(true_indices, [2, 1, 2])
+    np.testing.assert_array_equal(pred_indices, [2, 2, 0])
+    with pytest.raises(ValueError):
+        confusion_matrix([0, 5], [0, 1])
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+from types import SimpleNamespace
+
+from src.classification import train_classifier
+from src.feature_matrix import FeatureMatrix
+from src.inference import make_inference, prepare_features
+from src.normalization import Normalizer, RunningStats, normalize_signals, update_signal_statistics
+
+
+def test_merged_running_stats_match_full_data():
+    rng = np.random.default_rng(0)
+    x = np.column_stack([rng.standard_normal(20000) * 5 + 3, rng.exponential(size=20000)])
+
+    shards = [RunningStats().update(chunk) for chunk in np.array_split(x, 13)]
+    stats = RunningStats.combine(shards)
+
+    assert stats.count == len(x)
+    np.testing.assert_allclose(stats.mean, x.mean(axis=0))
+    np.testing.assert_allclose(stats.var, x.var(axis=0))
+    levels = [0.1, 0.25, 0.5, 0.75, 0.9]
+    np.testing.assert_allclose(stats.quantile(levels), np.quantile(x, levels, axis=0), atol=0.05)
+    np.testing.assert_allclose(stats.quantile(0.5), np.median(x, axis=0), atol=0.02)
+
+
+def test_running_stats_do_not_alias_the_input_buffer():
+    rng = np.random.default_rng(1)
+    buffer = rng.standard_normal((100, 2))
+    stats = RunningStats().update(buffer)
+    expected = stats.quantile([0.1, 0.5, 0.9]).copy()
+    buffer[:] = 1000.0   # e.g. a chunked loader reusing its buffer
+    np.testing.assert_array_equal(stats.quantile([0.1, 0.5, 0.9]), expected)
+
+
+def test_signal_statistics_per_channel():
+    rng = np.random.default_rng(1)
+    recordings = [{'eeg': rng.standard_normal((4, 2, 100)) * [[2.0], [0.5]] + 1.0} for _ in range(3)]
+    stats = {}
+    for data in recordings:
+        update_signal_statistics(stats, data)
+
+    eeg = np.concatenate([d['eeg'] for d in recordings])
+    np.testing.assert_allclose(stats['eeg'].mean, eeg.mean(axis=(0, 2)))
+    normalized = normalize_signals({'eeg': eeg}, stats)['eeg']
+    np.testing.assert_allclose(normalized.mean(axis=(0, 2)), 0, atol=1e-12)
+    np.testing.assert_allclose(normalized.std(axis=(0, 2)), 1)
+
+
+def _features(n_per_record=50, offsets=(0.0, 10.0), seed=2):
+    rng = np.random.default_rng(seed)
+    values = np.concatenate([rng.standard_normal((n_per_record, 3)) + offset for offset in offsets])
+    record_ids = np.repeat([f'R{i}' for i in range(len(offsets))], n_per_record)
+    return FeatureMatrix.from_columns(list(values.T), ['a', 'b', 'c'], ['eeg'] * 3, ['C3'] * 3,
+                                      record_ids, n_epochs=len(values))
+
+
+@pytest.mark.parametrize("method", ["zscore", "robust"])
+def test_normalizer_scopes(method):
+    features = _features()
+
+    dataset = Normalizer(method, 'dataset').fit_transform(features)
+    assert isinstance(dataset, FeatureMatrix) and dataset.columns == features.columns
+    assert abs(np.median(dataset.values)) < 0.5
+    # Dataset scope keeps the offset between recordings, recording scope removes it
+    assert np.mean(dataset.values[50:]) - np.mean(dataset.values[:50]) > 1
+    recording = Normalizer(method, 'recording').fit_transform(features)
+    assert abs(np.mean(recording.values[50:]) - np.mean(recording.values[:50])) < 0.2
+
+
+def test_inference_reuses_training_normalization():
+    config = SimpleNamespace(CURRENT_ITERATION=1, CLASSIFIER_TYPE='knn', KNN_N_NEIGHBORS=3,
+                             FEATURE_NORMALIZATION='zscore', FEATURE_NORMALIZATION_SCOPE='dataset')
+    features = _features(n_per_record=40)
+    labels = np.repeat([0, 1], 40)
+    model = train_classifier(features, labels, config)
+
+    assert model.normalizer_.columns == ['a', 'b', 'c']
+    holdout = features[:10]
+    expected = (holdout.values - model.normalizer_.center_) / model.normalizer_.scale_
+    np.testing.assert_allclose(prepare_features(model, holdout), expected)
+    np.testing.assert_array_equal(make_inference(model, holdout, config), model.predict(expected))
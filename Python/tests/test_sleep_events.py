@@ -0,0 +1,121 @@
+import numpy as np
+from types import SimpleNamespace
+
+from src import feature_extraction as fe
+from src import sleep_events as se
+
+FS = 125
+
+
+def _night(n_epochs=20, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.standard_normal((2, n_epochs * 30 * FS))
+
+
+def _add_spindle(signal, channel, second):
+    t = np.arange(FS) / FS
+    start = int(second * FS)
+    signal[channel, start:start + FS] += 6 * np.sin(2 * np.pi * 13 * t) * np.hanning(FS)
+
+
+def _add_kcomplex(signal, channel, second):
+    t = np.arange(int(1.5 * FS)) / FS
+    wave = -12 * np.sin(np.pi * t / 0.5) * (t < 0.5) + 8 * np.sin(np.pi * (t - 0.5) / 0.8) * ((t >= 0.5) & (t < 1.3))
+    start = int(second * FS)
+    signal[channel, start:start + len(wave)] += wave
+
+
+def test_find_runs_and_rolling_rms():
+    mask = np.array([[0, 1, 1, 0, 1, 1, 1], [1, 0, 0, 0, 0, 1, 1]], dtype=bool)
+    rows, starts, stops = se.find_runs(mask, min_length=2)
+    np.testing.assert_array_equal(rows, [0, 0, 1])
+    np.testing.assert_array_equal(starts, [1, 4, 5])
+    np.testing.assert_array_equal(stops, [3, 7, 7])
+
+    x = np.random.default_rng(1).standard_normal((2, 50))
+    window = 5
+    naive = np.array([[np.sqrt(np.mean(row[max(0, i - 2):i + 3] ** 2)) for i in range(50)] for row in x])
+    np.testing.assert_allclose(se.rolling_rms(x, window), naive)
+    np.testing.assert_allclose(se.segment_reduce(x, rows, starts, stops, np.maximum),
+                               [x[r, a:b].max() for r, a, b in zip(rows, starts, stops)])
+
+
+def test_detectors_find_synthetic_events():
+    signal = _night()
+    for second in (50, 200, 500):
+        _add_spindle(signal, 0, second)
+    for second in (55, 300):
+        _add_kcomplex(signal, 1, second)
+
+    spindles = se.detect_spindles(signal, FS)
+    np.testing.assert_array_equal(spindles['rows'], [0, 0, 0])
+    np.testing.assert_allclose(spindles['starts'] / FS, [50, 200, 500], atol=0.2)
+
+    kcomplexes = se.detect_kcomplexes(signal, FS)
+    np.testing.assert_array_equal(kcomplexes['rows'], [1, 1])
+    np.testing.assert_allclose(kcomplexes['starts'] / FS, [55, 300], atol=0.2)
+
+
+def test_event_families_per_epoch_and_per_recording():
+    signal = _night()
+    _add_spindle(signal, 0, 200)       # epoch 6
+    _add_kcomplex(signal, 1, 300)      # epoch 10
+    x = signal.reshape(2, 20, 30 * FS).transpose(1, 0, 2)
+    config = SimpleNamespace(CURRENT_ITERATION=3, FEATURE_FAMILIES={'eeg': ['spindle', 'kcomplex']})
+
+    features = fe.extract_features({'eeg': x}, config, record_ids=['R1'] * 10 + ['R2'] * 10)
+    spindles = features.select(['eeg0_spindle_count', 'eeg1_spindle_count']).values
+    assert spindles.sum() == 1 and spindles[6, 0] == 1
+    assert features.select('eeg0_spindle_density').values[6, 0] == 2.0  # per minute
+    kcomplexes = features.select('eeg1_kcomplex_count').values[:, 0]
+    assert kcomplexes.sum() == 1 and kcomplexes[10] == 1
+
+    # Each recording is detected separately (thresholds are per recording)
+    second = fe.extract_features({'eeg': x[10:]}, config)
+    np.testing.assert_array_equal(features[10:].values, second.values)
+
+
+def _add_eye_movement(eog, second, sign_right, fs=50, amplitude=5.0):
+    """Look away and back: a smoothed step of 0.6 s on the left channel, mirrored on the right."""
+    ramp = (1 - np.cos(np.linspace(0, np.pi, int(0.1 * fs)))) / 2
+    shape = np.r_[ramp, np.ones(int(0.4 * fs)), ramp[::-1]] * amplitude
+    start = int(second * fs)
+    eog[0, start:start + len(shape)] += shape
+    eog[1, start:start + len(shape)] += sign_right * shape
+
+
+def test_eye_movements_need_opposite_polarity():
+    fs = 50
+    eog = np.random.default_rng(0).standard_normal((2, 20 * 30 * fs)) * 0.2
+    _add_eye_movement(eog, 100, -1)
+    _add_eye_movement(eog, 400, -1)
+    _add_eye_movement(eog, 250, +1)    # same polarity on both channels: not an eye movement
+
+    events = se.detect_eye_movements(eog[:1], eog[1:], fs)
+    # Each look away and back is two movements, around 100 s and 400 s only
+    np.testing.assert_allclose(events['starts'] / fs, [100, 100.5, 400, 400.5], atol=0.1)
+
+    x = eog.reshape(2, 20, 30 * fs).transpose(1, 0, 2)
+    config = SimpleNamespace(CURRENT_ITERATION=3, FEATURE_FAMILIES={'eog': ['eye_movement']},
+                             EOG_FS=fs)
+    features = fe.extract_features({'eeg': np.zeros((20, 1, 10)), 'eog': x}, config)
+    rem = features.select('eog0-eog1_rem_count').values[:, 0]
+    np.testing.assert_array_equal(np.flatnonzero(rem), [3, 13])
+    assert rem[3] == 2
+    assert features.select('eog0-eog1_rem_density').values[3, 0] == 4.0  # per minute
+
+
+def test_emg_tone_atonia_and_twitches():
+    rng = np.random.default_rng(0)
+    emg = rng.standard_normal((1, 20 * 30 * FS))
+    emg[0, 5 * 30 * FS:8 * 30 * FS] *= 0.2          # atonia in epochs 5-7
+    for second in (160, 200):                        # twitches in epochs 5 and 6
+        emg[0, second * FS:second * FS + 15] += rng.standard_normal(15) * 2
+    x = emg.reshape(1, 20, 30 * FS).transpose(1, 0, 2)
+
+    features = fe.emg_tone_feature_family(x, FS, SimpleNamespace())
+    atonia = features['atonia_fraction'][:, 0]
+    assert np.all(atonia[5:8] > 0.9)
+    assert np.all(np.delete(atonia, [5, 6, 7]) < 0.05)
+    np.testing.assert_allclose(features['tone_median'][5:8, 0], 0.2, atol=0.02)
+    np.testing.assert_array_equal(np.flatnonzero(features['twitch_count'][:, 0]), [5, 6])
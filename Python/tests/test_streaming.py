@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+from types import SimpleNamespace
+
+from src.feature_extraction import default_feature_families, extract_features, split_continuous_families
+from src.feature_matrix import FeatureMatrix
+from src.streaming import StreamingFeatureExtractor
+
+SAMPLING_RATES = {'eeg': 125, 'eog': 50, 'emg': 125}
+
+
+def _multi_channel_data(n_epochs, seed=0):
+    rng = np.random.default_rng(seed)
+    return {
+        'eeg': rng.standard_normal((n_epochs, 2, 3750)),
+        'eog': rng.standard_normal((n_epochs, 2, 1500)),
+        'emg': rng.standard_normal((n_epochs, 1, 3750)),
+    }
+
+
+def _stream(extractor, data, seed=1):
+    """Feed epochs as continuous signals in blocks of random duration."""
+    rng = np.random.default_rng(seed)
+    continuous = {m: x.transpose(1, 0, 2).reshape(x.shape[1], -1) for m, x in data.items()}
+    duration = 30 * data['eeg'].shape[0]
+    outputs, t = [], 0.0
+    while t < duration:
+        stop = min(t + rng.uniform(1, 45), duration)
+        blocks = {m: x[:, int(t * SAMPLING_RATES[m]):int(stop * SAMPLING_RATES[m])]
+                  for m, x in continuous.items()}
+        outputs.append(extractor.push(blocks))
+        t = stop
+    outputs.append(extractor.flush())
+    return FeatureMatrix.concat_rows([rows for rows in outputs if len(rows)])
+
+
+@pytest.mark.parametrize("n_epochs,context_window", [(8, 0), (8, 2), (2, 3)])
+def test_streaming_matches_batch(n_epochs, context_window):
+    config = SimpleNamespace(
+        CURRENT_ITERATION=3,
+        FEATURE_FAMILIES={'eeg': ['time', 'complexity', 'spectral'], 'eog': ['eog', 'cross'], 'emg': ['emg']},
+        CONTEXT_WINDOW=context_window,
+    )
+    data = _multi_channel_data(n_epochs)
+    batch = extract_features(data, config, record_ids=['R1'] * n_epochs)
+
+    extractor = StreamingFeatureExtractor(config, record_id='R1')
+    streamed = _stream(extractor, data)
+
+    assert streamed.columns == batch.columns
+    assert streamed.record_names == ['R1']
+    np.testing.assert_array_equal(streamed.values, batch.values)
+    assert extractor.n_emitted == 0  # flush() resets for the next recording
+
+
+def test_rows_wait_for_future_context():
+    config = SimpleNamespace(CURRENT_ITERATION=1, CONTEXT_WINDOW=2)
+    data = _multi_channel_data(4)
+    extractor = StreamingFeatureExtractor(config)
+
+    emitted = [len(extractor.push({'eeg': data['eeg'][i]})) for i in range(4)]
+    assert emitted == [0, 0, 1, 1]
+    assert len(extractor.flush()) == 2
+
+
+def test_streaming_applies_dataset_normalizer():
+    from src.normalization import Normalizer
+
+    config = SimpleNamespace(CURRENT_ITERATION=1, CONTEXT_WINDOW=1)
+    data = _multi_channel_data(6)
+    batch = extract_features({'eeg': data['eeg']}, config)
+    normalizer = Normalizer('zscore').fit(batch)
+
+    extractor = StreamingFeatureExtractor(config, normalizer=normalizer)
+    streamed = _stream(extractor, {'eeg': data['eeg']})
+    np.testing.assert_allclose(streamed.values, normalizer.transform(batch).values, rtol=1e-6)
+
+    with pytest.raises(ValueError):
+        StreamingFeatureExtractor(config, normalizer=Normalizer('zscore', 'recording'))
+
+
+def test_default_families_refuse_continuous_or_match_batch():
+    config = SimpleNamespace(CURRENT_ITERATION=3)
+    with pytest.raises(ValueError, match='Continuous'):
+        StreamingFeatureExtractor(config)
+
+    data = _multi_channel_data(6)
+    batch = extract_features(data, config, record_ids=['R1'] * 6)
+    with pytest.warns(UserWarning):
+        extractor = StreamingFeatureExtractor(config, record_id='R1', allow_continuous=True)
+    streamed = _stream(extractor, data)
+    assert streamed.columns == batch.columns
+
+    # Every column of the per-epoch default families is identical to batch
+    per_epoch, _ = split_continuous_families(default_feature_families(config))
+    exact = extract_features(data, SimpleNamespace(CURRENT_ITERATION=3, FEATURE_FAMILIES=per_epoch)).columns
+    assert 0 < len(exact) < len(batch.columns)
+    np.testing.assert_array_equal(streamed.select(exact).values, batch.select(exact).values)